@@ -0,0 +1,287 @@
+"""Declarative alarm rules evaluated against live_data samples.
+
+A factory's rules live in its own database under /alarm_rules (a list, or
+an object keyed by rule id); factories without one get DEFAULT_RULES, which
+reproduce the thresholds the tracker always used. A rule looks like:
+
+    {
+        "id": "pressure_low",
+        "source": "System Pressure",          # pump_name on the history event
+        "metric": "pressure",                 # analytics_series metric or a raw field
+        "type": "threshold",                  # or "rate" (change per minute)
+        "below": 4.15, "above": null,         # either or both
+        "hysteresis": 0.05,                   # clears only at below + 0.05 / above - 0.05
+        "min_duration": 30,                   # seconds the breach must last before alarming
+        "default": 0,                         # value used when the sample lacks the metric
+        "details_key": "pressure",            # the value's key in the event details
+        "details": {"threshold": 4.15},       # optional extra fields copied into every event
+        "alarm_message": "Low Pressure Detected: {value} Bar",
+        "clear_message": "Pressure Normal: {value} Bar"
+    }
+
+Messages may use {value}, {rate}, {direction} ("Low"/"High") and {threshold}.
+{value} is the reading as sampled; {rate} (rate rules only) is rounded to
+three decimals, and the details carry the same number the message shows.
+The metric's fields are tried in order and a zero/empty reading falls
+through to the next one, like the `a or b or 0` the tracker used to do.
+A missing metric with no "default" leaves the rule's state unchanged.
+
+RuleEngine keeps one small state per rule and evaluates every rule in a
+single pass per sample (evaluate), or one rule at a time down whole columns
+of samples (evaluate_columns, fed from sample_store), which is what replays
+use: a day of 10 s samples is a few tens of thousands of comparisons.
+"""
+import analytics_series
+
+# Configuration
+RULE_TYPES = ('threshold', 'rate')
+
+DEFAULT_RULES = [
+    {"id": "tank_low", "source": "Water Tank", "metric": "waterLevel", "below": 95, "default": 0,
+     "details_key": "level", "details": {"threshold": 95},
+     "alarm_message": "Critical Level Detected: {value}%", "clear_message": "Level Restored to Normal: {value}%"},
+    {"id": "diesel_low", "source": "Diesel Tank", "metric": "dieselLevel", "below": 95, "default": 0,
+     "details_key": "level",
+     "alarm_message": "Critical Level Detected: {value}%", "clear_message": "Level Restored to Normal: {value}%"},
+    {"id": "battery_range", "source": "Battery System", "metric": "batteryVolts", "below": 11.8, "above": 14.2,
+     "default": 0, "details_key": "voltage",
+     "alarm_message": "{direction} Voltage: {value}V", "clear_message": "Voltage Normal: {value}V"},
+    {"id": "pressure_low", "source": "System Pressure", "metric": "pressure", "below": 4.15, "default": 0,
+     "details_key": "pressure",
+     "alarm_message": "Low Pressure Detected: {value} Bar", "clear_message": "Pressure Normal: {value} Bar"},
+]
+
+
+def validate_rule(rule):
+    """Normalized copy of one rule definition. Raises ValueError if it is unusable."""
+    if not isinstance(rule, dict):
+        raise ValueError("Rule must be an object")
+    rule_id = rule.get('id')
+    if not rule_id or not isinstance(rule_id, str):
+        raise ValueError("Rule needs an id")
+    rule_type = rule.get('type', 'threshold')
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"{rule_id}: unknown type {rule_type!r}")
+    if not rule.get('metric'):
+        raise ValueError(f"{rule_id}: missing metric")
+
+    def number(name, default=None):
+        value = rule.get(name, default)
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{rule_id}: {name} must be a number")
+
+    below, above = number('below'), number('above')
+    if below is None and above is None:
+        raise ValueError(f"{rule_id}: needs below and/or above")
+
+    details = rule.get('details') or {}
+    if not isinstance(details, dict):
+        raise ValueError(f"{rule_id}: details must be an object")
+
+    metric = rule['metric']
+    return {
+        'id': rule_id,
+        'type': rule_type,
+        'metric': metric,
+        'fields': analytics_series.METRIC_FIELDS.get(metric, (metric,)),
+        'source': rule.get('source') or metric,
+        'below': below,
+        'above': above,
+        'hysteresis': abs(number('hysteresis', 0)),
+        'min_duration_ms': int(number('min_duration', 0) * 1000),
+        'default': number('default'),
+        'event_type': rule.get('event_type', 'ALARM'),
+        'details_key': rule.get('details_key') or ('rate' if rule_type == 'rate' else 'value'),
+        'details': details,
+        'alarm_message': rule.get('alarm_message') or f"{rule.get('source') or metric}: {{direction}} {{value}}",
+        'clear_message': rule.get('clear_message') or f"{rule.get('source') or metric}: back to normal ({{value}})",
+    }
+
+
+def parse_rules(raw):
+    """Validated rules from a stored /alarm_rules node; invalid entries are logged and skipped."""
+    if isinstance(raw, dict):
+        items = [dict(v, id=v.get('id', k)) if isinstance(v, dict) else v for k, v in raw.items()]
+    elif isinstance(raw, list):
+        items = [r for r in raw if r is not None]  # RTDB turns removed list slots into nulls
+    else:
+        items = []
+    rules = []
+    for item in items:
+        try:
+            rules.append(validate_rule(item))
+        except ValueError as e:
+            print(f"Skipping alarm rule: {e}")
+    return rules
+
+
+def load_rules(client):
+    """The factory's rules, or DEFAULT_RULES when it has none stored."""
+    raw = client.get_json('alarm_rules')
+    if raw:
+        return parse_rules(raw)
+    return parse_rules(DEFAULT_RULES)
+
+
+def _fmt(value):
+    return round(value, 3) if value is not None else None
+
+
+class RuleEngine:
+    """Runs a set of rules over samples, remembering each rule's alarm state.
+
+    Every rule starts out normal, so a breach present at start-up alarms
+    on the first sample (same as the tracker always did).
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        self.states = {}
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        """Swaps in new rules; a rule whose definition didn't change keeps its state."""
+        old = {r['id']: r for r in self.rules}
+        states = {}
+        for rule in rules:
+            prev = old.get(rule['id'])
+            if prev == rule and rule['id'] in self.states:
+                states[rule['id']] = self.states[rule['id']]
+            else:
+                states[rule['id']] = self._new_state()
+        self.rules = list(rules)
+        self.states = states
+
+    @staticmethod
+    def _new_state():
+        # active: alarm raised; since: when the current breach/recovery started;
+        # prev_ts/prev_value: last sample, for rate rules
+        return {'active': False, 'since': None, 'prev_ts': None, 'prev_value': None}
+
+    def active(self):
+        """Ids of rules currently in alarm."""
+        return [rule_id for rule_id, s in self.states.items() if s['active']]
+
+    def get_state(self):
+        """Per-rule state as a JSON-safe list (rule ids may not be valid RTDB keys)."""
+        return [dict(state, id=rule_id) for rule_id, state in self.states.items()]
+
+    def load_state(self, saved):
+        """Restores get_state() output; entries for rules that no longer exist are ignored."""
+        for item in saved or []:
+            if isinstance(item, dict) and item.get('id') in self.states:
+                state = self._new_state()
+                state.update({k: v for k, v in item.items() if k in state})
+                self.states[item['id']] = state
+
+    # --- EVALUATION ---
+
+    def evaluate(self, ts, entry):
+        """All rules against one sample. Returns [(source, event_type, message, details), ...]."""
+        events = []
+        for rule in self.rules:
+            value = None
+            for field in rule['fields']:
+                try:
+                    value = float(entry.get(field))
+                except (TypeError, ValueError):
+                    continue
+                if value:
+                    break  # 0 falls through to the next field, as `or` did
+            if value is None:
+                value = rule['default']
+            if value is None:
+                continue
+            event = self._step(rule, self.states[rule['id']], ts, value)
+            if event:
+                events.append(event)
+        return events
+
+    def evaluate_columns(self, ts_column, columns):
+        """Every rule down whole columns of samples (e.g. a sample_store segment).
+
+        columns maps metric name -> sequence of floats (NaN = missing),
+        parallel to ts_column. Rules whose metric isn't among the columns
+        are skipped. Returns [(ts, (source, event_type, message, details)), ...]
+        in time order.
+        """
+        events = []
+        for rule in self.rules:
+            column = columns.get(rule['metric'])
+            if column is None:
+                continue
+            state = self.states[rule['id']]
+            step = self._step
+            default = rule['default']
+            for ts, value in zip(ts_column, column):
+                if value != value:  # NaN: no reading
+                    if default is None:
+                        continue
+                    value = default
+                event = step(rule, state, ts, value)
+                if event:
+                    events.append((ts, event))
+        events.sort(key=lambda e: e[0])
+        return events
+
+    def _step(self, rule, state, ts, value):
+        if rule['type'] == 'rate':
+            prev_ts, prev_value = state['prev_ts'], state['prev_value']
+            state['prev_ts'], state['prev_value'] = ts, value
+            if prev_ts is None or ts <= prev_ts:
+                return None
+            measured = (value - prev_value) * 60000.0 / (ts - prev_ts)  # per minute
+        else:
+            measured = value
+
+        below, above, hyst = rule['below'], rule['above'], rule['hysteresis']
+        if state['active']:
+            # Recovery has to clear the hysteresis band, not just the threshold
+            changing = (below is None or measured >= below + hyst) and (above is None or measured <= above - hyst)
+        else:
+            changing = (below is not None and measured < below) or (above is not None and measured > above)
+
+        if not changing:
+            state['since'] = None
+            return None
+        if state['since'] is None:
+            state['since'] = ts
+        if not state['active'] and ts - state['since'] < rule['min_duration_ms']:
+            return None
+
+        state['active'] = not state['active']
+        state['since'] = None
+        return self._event(rule, value, measured, state['active'])
+
+    def _event(self, rule, value, measured, raised):
+        threshold = rule['below'] if rule['below'] is not None and measured < rule['below'] else rule['above']
+        direction = 'Low' if rule['below'] is not None and measured < rule['below'] else 'High'
+        text = rule['alarm_message'] if raised else rule['clear_message']
+        # Readings go out exactly as sampled (the old checks printed the raw
+        # float); only a computed rate is rounded, in the message and details alike
+        rate = _fmt(measured) if rule['type'] == 'rate' else None
+        try:
+            message = text.format(value=value, rate=rate, direction=direction, threshold=threshold)
+        except (KeyError, IndexError, ValueError):
+            message = text
+        details = dict(rule['details'])
+        details[rule['details_key']] = rate if rule['type'] == 'rate' else value
+        return (rule['source'], rule['event_type'] if raised else 'STATUS_CHANGE', message, details)
+
+
+def replay(rules, store, factory, start_ms, end_ms):
+    """Runs rules over stored samples in [start_ms, end_ms) from a fresh state.
+
+    Returns [(ts, (source, event_type, message, details)), ...]. Segments
+    are evaluated column-wise straight off the memory maps.
+    """
+    engine = RuleEngine(rules)
+    metrics = sorted({r['metric'] for r in rules if r['metric'] in analytics_series.METRIC_FIELDS})
+    events = []
+    for view in store.segments(factory, start_ms, end_ms, metrics):
+        events.extend(engine.evaluate_columns(view.columns['ts'], view.columns))
+    return events
@@ -0,0 +1,204 @@
+import datetime
+import math
+import os
+
+import cache_backend
+import firebase_client
+
+# Configuration
+# Devices write naive local timestamps ("DD-MM-YYYY HH:mm:ss"); this is the
+# plant's UTC offset used to place them on the timeline (default IST).
+DATA_UTC_OFFSET_MINUTES = int(os.environ.get('DATA_UTC_OFFSET_MINUTES', 330))
+SERIES_CACHE_TTL = 60  # Seconds
+SERIES_PAGE_SIZE = 5000  # Raw live_data entries per Firebase read in the fallback
+SERIES_MAX_BUCKETS = 2000
+
+# Metric name -> raw field names, same fallbacks as dashboard.js / HistoryTracker
+METRIC_FIELDS = {
+    'pressure': ('pressure',),
+    'waterLevel': ('waterLevel', 'tankLevel', 'tank_level'),
+    'dieselLevel': ('dieselLevel', 'diesel_level'),
+    'batteryVolts': ('batteryVolts', 'batteryVoltage', 'battery_voltage'),
+}
+
+BUCKETS = {
+    '1m': 60, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '6h': 21600, '12h': 43200, '1d': 86400,
+}
+
+SERIES_CACHE = cache_backend.MemoryCache(ttl=SERIES_CACHE_TTL, max_entries=256)
+
+_DURATION_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(text):
+    """'24h' -> 86400. Raises ValueError on anything else."""
+    text = (text or '').strip()
+    if len(text) < 2 or text[-1] not in _DURATION_UNITS or not text[:-1].isdigit():
+        raise ValueError(f"Invalid duration: {text!r}")
+    return int(text[:-1]) * _DURATION_UNITS[text[-1]]
+
+
+def parse_sample_time(entry):
+    """Returns the sample's epoch milliseconds, or None if it has no usable time."""
+    value = entry.get('lastUpdated')
+    if isinstance(value, (int, float)):
+        # Already epoch (seconds or ms)
+        return int(value if value > 1e11 else value * 1000)
+    if not isinstance(value, str) or not value:
+        return None
+
+    value = value.strip()
+    dt = None
+    for fmt in ('%d-%m-%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S'):
+        try:
+            dt = datetime.datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    if dt is None:
+        try:
+            dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone(datetime.timedelta(minutes=DATA_UTC_OFFSET_MINUTES)))
+    return int(dt.timestamp() * 1000)
+
+
+def metric_value(entry, metric):
+    for field in METRIC_FIELDS[metric]:
+        if entry.get(field) is not None:
+            try:
+                return float(entry[field])
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def bucket_window(bucket_seconds, range_seconds, now_ms):
+    """Returns (start_ms, bucket_ms, count) aligned to local bucket boundaries.
+
+    The last bucket is the one containing now, matching the old browser
+    behaviour (e.g. 24 hourly buckets ending with the current hour).
+    """
+    bucket_ms = bucket_seconds * 1000
+    offset_ms = DATA_UTC_OFFSET_MINUTES * 60000
+    count = max(1, math.ceil(range_seconds / bucket_seconds))
+    current = (now_ms + offset_ms) // bucket_ms * bucket_ms - offset_ms
+    return current - (count - 1) * bucket_ms, bucket_ms, count
+
+
+def aggregate(entries, metrics, start_ms, bucket_ms, count):
+    """Buckets raw entries into per-metric min/avg/max/count columns.
+
+    Single pass over the samples: each sample's bucket index is computed
+    once and every metric column is updated in place.
+    """
+    inf = float('inf')
+    mins = {m: [inf] * count for m in metrics}
+    maxs = {m: [-inf] * count for m in metrics}
+    sums = {m: [0.0] * count for m in metrics}
+    counts = {m: [0] * count for m in metrics}
+
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        t = parse_sample_time(entry)
+        if t is None:
+            continue
+        idx = (t - start_ms) // bucket_ms
+        if idx < 0 or idx >= count:
+            continue
+        for m in metrics:
+            v = metric_value(entry, m)
+            if v is None:
+                continue
+            sums[m][idx] += v
+            counts[m][idx] += 1
+            if v < mins[m][idx]:
+                mins[m][idx] = v
+            if v > maxs[m][idx]:
+                maxs[m][idx] = v
+
+    series = {}
+    for m in metrics:
+        c = counts[m]
+        series[m] = {
+            'min': [round(mins[m][i], 3) if c[i] else None for i in range(count)],
+            'avg': [round(sums[m][i] / c[i], 3) if c[i] else None for i in range(count)],
+            'max': [round(maxs[m][i], 3) if c[i] else None for i in range(count)],
+            'count': c,
+        }
+    return series
+
+
+def fetch_entries(base_url, start_ms, end_ms, page_size=SERIES_PAGE_SIZE):
+    """Raw live_data entries keyed in [start_ms, end_ms), read page by page.
+
+    Keys are push IDs, so the range is a key range and every sample in it
+    is read however many there are. A generator: aggregate() folds each
+    page in as it arrives.
+    """
+    client = firebase_client.get_client(base_url)
+    start_key = firebase_client.push_id_prefix(start_ms)
+    end_key = firebase_client.push_id_prefix(end_ms)
+    for _, entry in client.iter_children('live_data', start_key, end_key, page_size):
+        yield entry
+
+
+def build_series(base_url, metrics, bucket, range_text, now_ms):
+    bucket_seconds = BUCKETS[bucket]
+    range_seconds = parse_duration(range_text)
+    start_ms, bucket_ms, count = bucket_window(bucket_seconds, range_seconds, now_ms)
+
+    # Rollups maintained by HistoryTracker make this O(buckets). Next best is
+    # the local columnar sample store (no download / JSON parsing); raw
+    # live_data from Firebase is the last resort.
+    series = None
+    try:
+        import rollup_store  # Imported here: rollup_store itself imports this module
+        store = rollup_store.get_store()
+        series = store.series(base_url, metrics, start_ms, bucket_ms, count, now_ms)
+    except Exception as e:
+        # e.g. read-only filesystem on serverless hosts
+        print(f"Rollup store unavailable: {e}")
+    if series is None:
+        try:
+            import sample_store  # Same circular import as rollup_store
+            samples = sample_store.get_store()
+            if samples.covers(base_url, start_ms, start_ms + bucket_ms * count, now_ms):
+                series = samples.series(base_url, metrics, start_ms, bucket_ms, count)
+        except Exception as e:
+            print(f"Sample store unavailable: {e}")
+    if series is None:
+        series = aggregate(fetch_entries(base_url, start_ms, start_ms + bucket_ms * count), metrics, start_ms, bucket_ms, count)
+
+    return {
+        'bucket': bucket,
+        'range': range_text,
+        'start': start_ms,
+        'bucket_ms': bucket_ms,
+        't': [start_ms + i * bucket_ms for i in range(count)],
+        'series': series,
+    }
+
+
+def get_series(base_url, metrics, bucket, range_text, now_ms):
+    """Validated, cached entry point used by /api/analytics/series.
+
+    Raises ValueError for bad parameters.
+    """
+    unknown = [m for m in metrics if m not in METRIC_FIELDS]
+    if not metrics or unknown:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown) or '(none)'}")
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    if parse_duration(range_text) / BUCKETS[bucket] > SERIES_MAX_BUCKETS:
+        raise ValueError("Too many buckets for this range")
+
+    cache_key = f"{base_url}|{','.join(metrics)}|{bucket}|{range_text}"
+    return SERIES_CACHE.get_or_load(
+        cache_key, lambda: build_series(base_url, metrics, bucket, range_text, now_ms)
+    )
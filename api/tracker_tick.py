@@ -0,0 +1,11 @@
+import sys
+import os
+
+# Add parent directory to path so imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker_tick import wsgi_app
+
+# Cron entry point for /internal/tracker/tick (see vercel.json). Kept apart
+# from api/index.py so a cold start loads the tracker only, not the dashboard.
+app = wsgi_app
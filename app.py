@@ -1,58 +1,125 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, g, has_request_context, render_template, request, redirect, url_for, flash, session
 from datetime import timedelta
-import requests
 import json
 import os
 import uuid
 import functools
+import heapq
 import auth_db
+import firebase_client
+import live_snapshot
+import page_cache
+import static_assets
 import time
+from concurrent.futures import Future
+
+# Feature modules (alarm_rules, analytics_series, exporter, history_index,
+# history_retention, live_stream) are imported inside the routes that use
+# them: on serverless every cold start pays for whatever is imported here,
+# and most invocations only render a page or read live_data.
+# bench_startup.py fails if one of them creeps back in.
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'eagle_ai_super_secret_key_8822')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+# Content-hashed static URLs + precompressed variants (see static_assets.py)
+static_assets.init_app(app)
+
+# Background threads and long-lived responses don't survive between
+# serverless invocations (Vercel/Lambda).
+IS_SERVERLESS = os.environ.get('VERCEL', False) or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', False)
+
+# --- LIVE STREAM ---
+# /api/live_stream needs a long-running process (the upstream Channel thread
+# outlives requests) and cooperative or threaded workers (a sync worker is
+# tied up for as long as a tab stays open). Elsewhere the dashboard polls
+# /api/live_data. LIVE_STREAM=1/0 overrides the choice.
+LIVE_STREAM_ENABLED = os.environ.get(
+    'LIVE_STREAM',
+    '0' if IS_SERVERLESS or os.environ.get('GUNICORN_WORKER_CLASS') == 'sync' else '1'
+) not in ('0', 'false', 'no')
+app.jinja_env.globals['live_stream_enabled'] = LIVE_STREAM_ENABLED
 
 # --- FIREBASE CONFIGURATION ---
 # Default/Fallback URL (can be used for unassigned admins or initial setup)
-DEFAULT_FIREBASE_URL = "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app"
+DEFAULT_FIREBASE_URL = os.environ.get('FIREBASE_DB_URL', "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app")
 
 def get_current_factory_url():
     """Returns the Firebase URL for the current session context."""
     return session.get('factory_url', DEFAULT_FIREBASE_URL)
 
-# --- HELPER FUNCTIONS ---
-def fb_get(path):
+def get_current_client():
+    """Pooled Firebase client for the current session context."""
+    return firebase_client.get_client(get_current_factory_url())
+
+# --- REQUEST-SCOPED FETCHES ---
+# Reads started with fetch_async() run concurrently on firebase_client's
+# fetch pool and are memoized in `g` for the rest of the request, so a route
+# can kick off everything it needs up front and pay roughly one round-trip.
+def fetch_async(key, fn, *args):
+    """Starts fn(*args) once per request under `key`; returns its Future."""
+    fetches = g.setdefault('fetches', {})
+    future = fetches.get(key)
+    if future is None:
+        future = fetches[key] = firebase_client.submit(fn, *args)
+    return future
+
+def _forget_fetches(base_url):
+    # A write makes memoized reads of that database stale
+    fetches = g.get('fetches')
+    if fetches:
+        for key in [k for k in fetches if k[0] == 'fb' and k[1] == base_url]:
+            del fetches[key]
+
+def _fb_read(client, path):
     try:
-        base_url = get_current_factory_url()
-        response = requests.get(f"{base_url}/{path}.json")
-        return response.json()
+        return client.get(path).json()
     except: return None
 
+def fb_prefetch(*paths):
+    """Starts fb_get() reads for paths without waiting for them."""
+    client = get_current_client()  # Resolved here: pool threads have no session
+    for path in paths:
+        fetch_async(('fb', client.base_url, path), _fb_read, client, path)
+
+# --- HELPER FUNCTIONS ---
+def fb_get(path):
+    client = get_current_client()
+    if not has_request_context():
+        return _fb_read(client, path)
+    key = ('fb', client.base_url, path)
+    fetches = g.setdefault('fetches', {})
+    if key not in fetches:
+        # Nothing prefetched: read inline rather than hopping to the pool
+        fetches[key] = Future()
+        fetches[key].set_result(_fb_read(client, path))
+    return fetches[key].result()
+
 def fb_update(path, data):
     try:
-        base_url = get_current_factory_url()
-        requests.patch(f"{base_url}/{path}.json", json=data)
+        _forget_fetches(get_current_client().base_url)
+        get_current_client().patch(path, data)
         return True
     except: return False
 
 def fb_push(path, data):
     try:
-        base_url = get_current_factory_url()
-        requests.post(f"{base_url}/{path}.json", json=data)
+        _forget_fetches(get_current_client().base_url)
+        get_current_client().post(path, data)
         return True
     except: return False
 
 def fb_delete(path):
     try:
-        base_url = get_current_factory_url()
-        requests.delete(f"{base_url}/{path}.json")
+        _forget_fetches(get_current_client().base_url)
+        get_current_client().delete(path)
         return True
     except: return False
 
 def fb_put(path, data):
     try:
-        base_url = get_current_factory_url()
-        requests.put(f"{base_url}/{path}.json", json=data)
+        _forget_fetches(get_current_client().base_url)
+        get_current_client().put(path, data)
         return True
     except: return False
 
@@ -121,6 +188,9 @@ def login():
                 session['can_access_settings'] = True
             else:
                  session['can_access_settings'] = user.get('can_access_settings', False)
+            # Temp unlock travels with the session; admins' changes bump the revision
+            session['settings_unlock_expiry'] = user.get('settings_unlock_expiry') or 0
+            session['perm_rev'] = auth_db.permission_revision(user.get('id'))
 
             # Set Context
             # Set Context
@@ -169,52 +239,69 @@ def logout():
 @app.route('/pumps')
 @login_required
 def pumps():
-    return render_template('pumps.html', current_time=time.time())
+    return page_cache.render_page('pumps.html')
 
 # --- ADMIN ROUTES ---
 
+USERS_PER_PAGE = 50
+
+def _visible_user_ids(views, role, user_id):
+    """Role visibility rules as index lookups; ids come back in user-id order."""
+    if role == 'developer':
+        return views['order']
+    if role == 'superadmin':
+        # Superadmin sees all EXCEPT developers
+        return list(heapq.merge(*[ids for r, ids in views['by_role'].items() if r != 'developer']))
+    if role == 'admin':
+        # Admin sees only users THEY created, plus themselves (never developers)
+        ids = views['by_creator'].get(user_id, [])
+        if user_id in views['users'] and user_id not in ids:
+            ids = list(heapq.merge(ids, [user_id]))
+        return [i for i in ids if views['users'][i].get('role') != 'developer']
+    return []
+
+def _user_matches(user, q):
+    return any(q in (user.get(f) or '').lower() for f in ('name', 'username', 'role', 'factory_name'))
+
 @app.route('/users')
 @admin_required
 def admin_users():
-    all_users = auth_db.get_users()
     # Visibility Logic
     current_role = session.get('role')
     current_user_id = session.get('user_id')
     current_factory_id = session.get('factory_id')
-    
-    # 2. Filter Factories based on Role
-    all_factories = auth_db.get_factories()
-    visible_factories = []
-    
+
+    # 1. Filter Factories based on Role
     if current_role in ['superadmin', 'developer']:
-        visible_factories = all_factories
+        visible_factories = auth_db.get_factories()
     elif current_role == 'admin':
         # Admin only sees their own factory
-        for f in all_factories:
-            if f['id'] == current_factory_id:
-                visible_factories.append(f)
-                break
-    
-    # 3. Filter Users based on Role
-    all_users = auth_db.get_users()
-    visible_users = []
-    
-    if current_role == 'developer':
-        visible_users = all_users
-    elif current_role == 'superadmin':
-        # Superadmin sees all EXCEPT developers
-        visible_users = [u for u in all_users if u.get('role') != 'developer']
-    elif current_role == 'admin':
-        # Admin sees only users THEY created, plus themselves
-        filtered = []
-        for u in all_users:
-            if u.get('created_by') == current_user_id or u.get('id') == current_user_id:
-                # Double check they don't see developers even if they somehow created them (unlikely but safe)
-                if u.get('role') != 'developer':
-                    filtered.append(u)
-        visible_users = filtered
-        
-    return render_template('users.html', users=visible_users, factories=visible_factories, current_time=time.time())
+        factory = auth_db.get_factory_by_id(current_factory_id) if current_factory_id else None
+        visible_factories = [factory] if factory else []
+    else:
+        visible_factories = []
+
+    # 2. Filter Users based on Role (indexes from auth_db, built once per cache fill)
+    views = auth_db.get_user_views() or auth_db.build_user_views([])
+    ids = _visible_user_ids(views, current_role, current_user_id)
+
+    # 3. Optional factory filter and search, then one page
+    factory_filter = request.args.get('factory', '')
+    if factory_filter:
+        in_factory = set(views['by_factory'].get(factory_filter, []))
+        ids = [i for i in ids if i in in_factory]
+    q = request.args.get('q', '').strip().lower()
+    if q:
+        ids = [i for i in ids if _user_matches(views['users'][i], q)]
+
+    total = len(ids)
+    pages = max(1, -(-total // USERS_PER_PAGE))
+    page = min(max(request.args.get('page', 1, type=int), 1), pages)
+    page_ids = ids[(page - 1) * USERS_PER_PAGE:page * USERS_PER_PAGE]
+    visible_users = [views['users'][i] for i in page_ids]
+
+    return render_template('users.html', users=visible_users, factories=visible_factories, current_time=time.time(),
+                           page=page, pages=pages, total=total, q=request.args.get('q', ''), factory_filter=factory_filter)
 
 @app.route('/admin/add_user', methods=['POST'])
 @admin_required
@@ -260,12 +347,7 @@ def admin_delete_user(user_id):
 
     # Security Check: Standard Admins cannot delete other Admins or Superadmins
     # We need to fetch the target user to check their role.
-    target_user = None
-    users = auth_db.get_users() # Not efficient but safe
-    for u in users:
-        if u['id'] == user_id:
-            target_user = u
-            break
+    target_user = auth_db.get_user_by_id(user_id)
             
     if target_user:
         if target_user.get('role') in ['admin', 'superadmin'] and session.get('role') not in ['superadmin', 'developer']:
@@ -318,6 +400,26 @@ def admin_switch_factory(factory_id):
         flash("Factory not found.", "error")
         return redirect(url_for('admin_users'))
 
+def refresh_settings_permission():
+    """Re-reads the session's settings permissions if an admin changed them.
+
+    Compares the session's permission revision with the shared one from
+    auth_db, so the common case costs no upstream call. Without a shared
+    cache there is no revision, and the record is read straight from the
+    database (a per-process cache would miss other workers' revokes).
+    """
+    uid = session.get('user_id')
+    if not uid or session.get('role') in ['admin', 'superadmin', 'developer']:
+        return
+    revision = auth_db.permission_revision(uid)
+    if revision is not None and revision == session.get('perm_rev') and 'settings_unlock_expiry' in session:
+        return
+    user = auth_db.get_user_by_id(uid, fresh=revision is None)
+    if user:
+        session['can_access_settings'] = user.get('can_access_settings', False)
+        session['settings_unlock_expiry'] = user.get('settings_unlock_expiry') or 0
+        session['perm_rev'] = revision
+
 # --- DEVELOPER (MASTER) ROUTES ---
 
 def developer_required(view):
@@ -351,6 +453,8 @@ def developer_add_factory():
     url = request.form['firebase_url']
     
     if auth_db.add_factory(name, url):
+        if tracker:
+            tracker.request_sync()
         flash(f"Factory '{name}' added successfully.", "success")
     else:
         flash("Error adding factory. URL might already exist.", "error")
@@ -446,7 +550,7 @@ def developer_update_factory_pin():
         fb_url = factory.get('firebase_url')
         try:
             # Direct update to factory DB
-            requests.patch(f"{fb_url}/settings.json", json={"settings_pin": new_pin})
+            firebase_client.get_client(fb_url).patch("settings", {"settings_pin": new_pin})
             flash(f"PIN for {factory.get('name')} updated to {new_pin}.", "success")
         except Exception as e:
             flash(f"Error updating PIN: {str(e)}", "error")
@@ -459,6 +563,8 @@ def developer_update_factory_pin():
 @developer_required
 def developer_delete_factory(factory_id):
     if auth_db.delete_factory(factory_id):
+        if tracker:
+            tracker.request_sync()
         flash("Factory deleted successfully.", "success")
     else:
         flash("Error deleting factory.", "error")
@@ -470,10 +576,13 @@ def developer_clear_logs(factory_id):
     factory = auth_db.get_factory_by_id(factory_id)
     if factory:
         fb_url = factory.get('firebase_url')
+        import history_retention
         try:
-            # Delete the entire history node
-            requests.delete(f"{fb_url}/history.json")
-            flash(f"Event logs cleared for {factory.get('name')}.", "success")
+            # Paged key-range delete; one DELETE of the whole node can time out on big logs
+            deleted = history_retention.purge(
+                fb_url, progress=history_retention.print_progress(f"Clear logs ({factory.get('name')})")
+            )
+            flash(f"Event logs cleared for {factory.get('name')} ({deleted} records).", "success")
         except Exception as e:
             flash(f"Error clearing logs: {str(e)}", "error")
     else:
@@ -481,6 +590,53 @@ def developer_clear_logs(factory_id):
         
     return redirect(url_for('developer_dashboard'))
 
+@app.route('/developer/alarm_rules/<factory_id>', methods=['GET', 'PUT'])
+@developer_required
+def developer_alarm_rules(factory_id):
+    """Reads or replaces a factory's alarm rule table (JSON list, see alarm_rules.py).
+
+    The tracker picks up a new table within RULES_REFRESH_INTERVAL.
+    """
+    factory = auth_db.get_factory_by_id(factory_id)
+    if not factory:
+        return json.dumps({"error": "Factory not found"}), 404, {'Content-Type': 'application/json'}
+    import alarm_rules
+    client = firebase_client.get_client(factory['firebase_url'])
+
+    if request.method == 'PUT':
+        rules = request.get_json(silent=True)
+        if not isinstance(rules, list):
+            return json.dumps({"error": "Expected a JSON list of rules"}), 400, {'Content-Type': 'application/json'}
+        try:
+            for rule in rules:
+                alarm_rules.validate_rule(rule)
+        except ValueError as e:
+            return json.dumps({"error": str(e)}), 400, {'Content-Type': 'application/json'}
+        response = client.put('alarm_rules', rules)
+        if response.status_code >= 300:
+            return json.dumps({"error": f"Saving failed: HTTP {response.status_code}"}), 502, {'Content-Type': 'application/json'}
+        return json.dumps({"saved": len(rules)}), 200, {'Content-Type': 'application/json'}
+
+    stored = client.get_json('alarm_rules')
+    return json.dumps({"rules": stored or alarm_rules.DEFAULT_RULES, "default": not stored}), 200, {'Content-Type': 'application/json'}
+
+@app.route('/developer/metrics')
+@developer_required
+def developer_metrics():
+    """Upstream Firebase latency and cache counters for this worker."""
+    import live_stream
+    metrics = {
+        "firebase": firebase_client.all_stats(),
+        "auth_cache": auth_db.cache_stats(),
+        "live_data_cache": live_snapshot.stats(),
+        "live_stream": live_stream.all_stats(),
+        "page_cache": page_cache.stats()
+    }
+    if tracker:
+        metrics["history_writer"] = tracker.writer.stats()
+        metrics["tracker"] = tracker.stats()
+    return json.dumps(metrics), 200, {'Content-Type': 'application/json'}
+
 
 # --- APP ROUTES ---
 
@@ -490,41 +646,160 @@ def index():
     """Renders the Main Dashboard"""
     # If admin hasn't selected a factory, maybe warn them or show default?
     # The session['factory_url'] is robust enough now.
-    return render_template('index.html')
+    return page_cache.render_page('index.html')
 
 @app.route('/alarms')
 @login_required
 def alarms():
-    return render_template('alarms.html')
+    return page_cache.render_page('alarms.html')
 
 @app.route('/api/live_data')
 @login_required
 def api_live_data():
-    """Fetches the latest live data entry from Firebase."""
+    """Latest live data entry, shared by every client of the same factory.
+
+    Served from live_snapshot's short-TTL cache; clients sending the
+    previous ETag in If-None-Match get a bodyless 304 while it is unchanged.
+    """
     try:
-        base_url = get_current_factory_url()
-        # Fetch only the latest entry to optimize performance
-        url = f"{base_url}/live_data.json?orderBy=\"$key\"&limitToLast=1"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                # Firebase returns { "timestamp_key": { ...data... } }
-                # We just want the inner data object
-                key = list(data.keys())[0]
-                return json.dumps(data[key])
-            return json.dumps({})
-        return json.dumps({"error": "Firebase Error"}), 500
+        snapshot = live_snapshot.get_latest(get_current_factory_url())
+        headers = {'ETag': f'"{snapshot.etag}"', 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains(snapshot.etag):
+            return '', 304, headers
+        headers['Content-Type'] = 'application/json'
+        return snapshot.body, 200, headers
     except Exception as e:
         return json.dumps({"error": str(e)}), 500
 
+@app.route('/api/live_stream')
+@login_required
+def api_live_stream():
+    """Server-Sent Events feed of the current factory's live data.
+
+    Sends a 'snapshot' event with the full sample on connect, then 'delta'
+    events holding only the fields that changed. All clients of a factory
+    share one upstream Firebase stream (see live_stream.py).
+    """
+    if not LIVE_STREAM_ENABLED:
+        return json.dumps({"error": "Live stream is disabled here; poll /api/live_data"}), 404, {'Content-Type': 'application/json'}
+    import live_stream
+    # The generator outlives the request context, so resolve the factory now
+    base_url = get_current_factory_url()
+    return Response(live_stream.events(base_url), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx-style proxies from buffering the stream
+    })
+
+@app.route('/api/history')
+@login_required
+def api_history():
+    """One page of the current factory's event log, newest first.
+
+    /api/history?type=ALARM&pump=Main&q=pressure&limit=50&before=<cursor>
+    type is a tab (ALARM, STATUS, SYSTEM) or a raw event type; q matches
+    words in the message/source. Served from the local history index,
+    which is topped up from Firebase at most every few seconds. Until a new
+    index has finished backfilling (a couple of seconds per request), pages
+    are read from Firebase directly and carry "indexing": true.
+    """
+    import history_index
+    base_url = get_current_factory_url()
+    index = history_index.get_index()
+    try:
+        index.sync(base_url, budget=history_index.SYNC_BUDGET)
+    except Exception as e:
+        print(f"History sync failed, serving indexed events: {e}")
+
+    filters = dict(
+        event_type=request.args.get('type') or None,
+        pump=request.args.get('pump') or None,
+        q=request.args.get('q') or None,
+        before=request.args.get('before') or None,
+        limit=request.args.get('limit', history_index.DEFAULT_LIMIT)
+    )
+    try:
+        if index.ready(base_url):
+            page = index.query(base_url, **filters)
+        else:
+            page = history_index.firebase_page(base_url, **filters)
+            page['indexing'] = True
+    except ValueError as e:
+        return json.dumps({"error": str(e)}), 400, {'Content-Type': 'application/json'}
+    return json.dumps(page), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+
+@app.route('/api/export/<kind>')
+@login_required
+def api_export(kind):
+    """Streams history or live_data as a download.
+
+    /api/export/history?start=2025-01-01&end=2025-02-01
+    /api/export/live_data?start=...&end=...&format=csv|columnar&gzip=1&factory_id=...
+    start/end are epoch ms or ISO dates (plant-local). Rows are paged and
+    written as they are read, so a year of data never sits in memory.
+    """
+    if kind not in ('history', 'live_data'):
+        return json.dumps({"error": "Unknown export"}), 404, {'Content-Type': 'application/json'}
+    import exporter
+
+    base_url = get_current_factory_url()
+    factory_id = request.args.get('factory_id')
+    if factory_id:
+        if session.get('role') not in ['superadmin', 'developer'] and factory_id != session.get('factory_id'):
+            return json.dumps({"error": "Access denied"}), 403, {'Content-Type': 'application/json'}
+        factory = auth_db.get_factory_by_id(factory_id)
+        if not factory:
+            return json.dumps({"error": "Factory not found"}), 404, {'Content-Type': 'application/json'}
+        base_url = factory['firebase_url']
+
+    try:
+        end_ms = exporter.parse_time(request.args.get('end'), int(time.time() * 1000))
+        start_ms = exporter.parse_time(request.args.get('start'), None if kind == 'history' else end_ms - 86400000)
+        chunks, mimetype, filename = exporter.export(
+            kind, base_url, start_ms, end_ms,
+            fmt=request.args.get('format', 'csv'),
+            compress=request.args.get('gzip') in ('1', 'true')
+        )
+    except ValueError as e:
+        return json.dumps({"error": str(e)}), 400, {'Content-Type': 'application/json'}
+
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/analytics/series')
+@login_required
+def api_analytics_series():
+    """Pre-aggregated min/avg/max/count per time bucket for the analytics charts.
+
+    Example: /api/analytics/series?metric=pressure,waterLevel&bucket=1h&range=24h
+    """
+    import analytics_series
+    metrics = [m.strip() for m in request.args.get('metric', 'pressure,waterLevel,dieselLevel').split(',') if m.strip()]
+    bucket = request.args.get('bucket', '1h')
+    range_text = request.args.get('range', '24h')
+    try:
+        result = analytics_series.get_series(get_current_factory_url(), metrics, bucket, range_text, int(time.time() * 1000))
+        return json.dumps(result), 200, {'Content-Type': 'application/json'}
+    except ValueError as e:
+        return json.dumps({"error": str(e)}), 400, {'Content-Type': 'application/json'}
+    except Exception as e:
+        return json.dumps({"error": str(e)}), 500, {'Content-Type': 'application/json'}
+
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
     """Handles the Configuration Page"""
     
     # 1. READ SETTINGS FROM CLOUD
+    # Start every read the page needs at once; the fb_get() calls below
+    # pick up the in-flight results.
+    if request.method == 'GET':
+        fb_prefetch('settings', 'phone_numbers')
+        refresh_settings_permission()
+    elif request.form.get('action') == 'add_number':
+        fb_prefetch('phone_numbers')  # Needed for the recipient limit check
+
     cloud_settings = fb_get('settings')
     if not cloud_settings:
         cloud_settings = {
@@ -639,26 +914,11 @@ def settings():
     
     # If not allowed by session (i.e., not Admin or Permitted User), check Temporary Access
     if not access_allowed:
-        # We need to fetch the user again to check expiry timestamp
-        # Optimization: In a real app we might cache this, but for now fetch fresh.
-        # However, verify_user fetches by username. We have ID.
-        # auth_db doesn't have a quick get_user_by_id exposed nicely yet without querying list or direct path.
-        # Let's verify against the stored session user_id to avoid extra DB calls if possible,
-        # but to be secure we should check DB.
-        # Since we use Firebase REST, we can just get that node.
-        try:
-            import requests # Explicit import if lazy, but already at top
-            sys_url = auth_db.SYSTEM_DB_URL
-            uid = session.get('user_id')
-            if uid:
-                resp = requests.get(f"{sys_url}/system_metadata/users/{uid}/settings_unlock_expiry.json")
-                if resp.status_code == 200:
-                    expiry = resp.json()
-                    if expiry and isinstance(expiry, (int, float)):
-                        if time.time() < expiry:
-                            access_allowed = True
-        except:
-             pass
+        # Expiry comes from the session (kept current by refresh_settings_permission)
+        expiry = session.get('settings_unlock_expiry')
+        if expiry and isinstance(expiry, (int, float)):
+            if time.time() < expiry:
+                access_allowed = True
 
     return render_template('settings.html', 
         current_settings=cloud_settings, 
@@ -669,7 +929,7 @@ def settings():
 @login_required
 def analytics():
     """Renders the Analytics/Graphs Page"""
-    return render_template('analytics.html')
+    return page_cache.render_page('analytics.html')
 
 
 
@@ -678,19 +938,25 @@ def analytics():
 # ========================================================
 # History tracker uses background threads which don't work in
 # serverless environments (Vercel). Only start it for local dev.
-IS_SERVERLESS = os.environ.get('VERCEL', False) or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', False)
-
 if not IS_SERVERLESS:
     from history_tracker import HistoryTracker
     tracker = HistoryTracker()
 else:
     tracker = None
 
+@app.route('/internal/tracker/tick', methods=['GET', 'POST'])
+def internal_tracker_tick():
+    """One bounded round of history tracking, for deployments without the
+    background tracker (cron-driven; bearer token, see tracker_tick.py)."""
+    import tracker_tick
+    status, body = tracker_tick.handle(request.headers.get('Authorization'))
+    return body, status, {'Content-Type': 'application/json', 'Cache-Control': 'no-store'}
+
 @app.route('/history')
 @login_required
 def history():
     """Renders the History Page"""
-    return render_template('history.html')
+    return page_cache.render_page('history.html')
 
 if __name__ == '__main__':
     # Start tracker manually (local dev only)
@@ -1,44 +1,79 @@
-import requests
 import hashlib
 import uuid
 import json
+import os
 import time
+from urllib.parse import quote
+import cache_backend
+import firebase_client
 
 # Configuration
 # Using the same default URL as app.py for the system metadata
-SYSTEM_DB_URL = "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app"
+SYSTEM_DB_URL = os.environ.get('SYSTEM_DB_URL', "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app")
+
+def system_db():
+    """Shared keep-alive client for the system metadata database."""
+    return firebase_client.get_client(SYSTEM_DB_URL)
 
 # --- CACHE CONFIGURATION ---
-AUTH_CACHE = {}
+# Backend is chosen with AUTH_CACHE_BACKEND (memory | sqlite | redis).
+# sqlite/redis are shared by every worker, so invalidate_cache reaches all of them.
 AUTH_CACHE_TTL = 300  # 5 minutes
+# Expired entries are served for up to this long while one background refresh runs
+AUTH_CACHE_STALE_TTL = 300
+AUTH_CACHE = cache_backend.create_cache(ttl=AUTH_CACHE_TTL, stale_ttl=AUTH_CACHE_STALE_TTL)
 
 def get_from_cache(key):
     """Retrieves value from cache if valid."""
-    if key in AUTH_CACHE:
-        data, timestamp = AUTH_CACHE[key]
-        if time.time() - timestamp < AUTH_CACHE_TTL:
-            return data
-        else:
-            del AUTH_CACHE[key] # Expired
-    return None
+    return AUTH_CACHE.get(key)
 
 def set_to_cache(key, data):
     """Sets value in cache with current timestamp."""
-    AUTH_CACHE[key] = (data, time.time())
+    AUTH_CACHE.set(key, data)
 
 def invalidate_cache(key_prefix=None):
     """Invalidates cache entries. If prefix provided, only matching keys."""
-    global AUTH_CACHE
-    if key_prefix:
-        keys_to_delete = [k for k in AUTH_CACHE.keys() if k.startswith(key_prefix)]
-        for k in keys_to_delete:
-            del AUTH_CACHE[k]
-    else:
-        AUTH_CACHE = {}
+    AUTH_CACHE.invalidate(key_prefix)
+
+def cache_stats():
+    return AUTH_CACHE.stats()
+
+# --- PERMISSION REVISIONS ---
+# Sessions carry a copy of the user's settings permissions. Every grant or
+# revoke bumps the user's revision in the shared cache; a session whose copy
+# was taken at an older revision re-reads the user record.
+# A per-process (memory) cache can't carry revisions between workers or
+# serverless instances, so it has none: callers then re-read every time.
+def permission_revision(user_id):
+    """Current permission revision for user_id (None if the cache is unavailable or not shared)."""
+    if not AUTH_CACHE.shared:
+        return None
+    return AUTH_CACHE.counter(f"perm_rev_{user_id}")
+
+def bump_permission_revision(user_id):
+    AUTH_CACHE.incr(f"perm_rev_{user_id}")
+
+# Same idea for rendered pages: page_cache keys include the factory's
+# feature revision, bumped whenever its feature flags change.
+def feature_revision(factory_id):
+    return AUTH_CACHE.counter(f"feature_rev_{factory_id}")
+
+def bump_feature_revision(factory_id):
+    AUTH_CACHE.incr(f"feature_rev_{factory_id}")
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+def username_key(username):
+    """Escapes a username into a valid Firebase key for the usernames index.
+
+    Firebase keys cannot contain . $ # [ ] / so those (and %) are %-escaped.
+    """
+    return "".join(
+        f"%{ord(ch):02X}" if ch in '.$#[]/%' or ord(ch) < 32 or ord(ch) == 127 else ch
+        for ch in username
+    )
+
 # --- FACTORY MANAGEMENT ---
 
 def add_factory(name, firebase_url):
@@ -75,7 +110,7 @@ def add_factory(name, firebase_url):
     
     try:
         # We index by ID for easier lookup
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/factories/{factory_id}.json", json=data)
+        system_db().patch(f"system_metadata/factories/{factory_id}", data)
         invalidate_cache("all_factories")
         return True
     except:
@@ -84,8 +119,9 @@ def add_factory(name, firebase_url):
 def update_factory_features(factory_id, features_dict):
     """Updates features for a specific factory."""
     try:
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/factories/{factory_id}/features.json", json=features_dict)
+        system_db().patch(f"system_metadata/factories/{factory_id}/features", features_dict)
         invalidate_cache(f"factory_{factory_id}")
+        bump_feature_revision(factory_id)
         return True
     except:
         return False
@@ -93,56 +129,46 @@ def update_factory_features(factory_id, features_dict):
 def delete_factory(factory_id):
     """Deletes a factory from the system metadata."""
     try:
-        requests.delete(f"{SYSTEM_DB_URL}/system_metadata/factories/{factory_id}.json")
+        system_db().delete(f"system_metadata/factories/{factory_id}")
         invalidate_cache("all_factories")
         invalidate_cache(f"factory_{factory_id}")
+        bump_feature_revision(factory_id)
         return True
     except:
         return False
 
 def get_factories():
-    cache_key = "all_factories"
-    cached = get_from_cache(cache_key)
-    if cached is not None:
-        return cached
-
     try:
-        response = requests.get(f"{SYSTEM_DB_URL}/system_metadata/factories.json")
-        data = response.json()
-        if not data: 
-            set_to_cache(cache_key, [])
-            return []
-        
-        # Convert dict of dicts to list
-        if isinstance(data, dict):
-            result = list(data.values())
-            set_to_cache(cache_key, result)
-            return result
-        return []
+        return AUTH_CACHE.get_or_load("all_factories", _load_factories) or []
     except: return []
 
+def _load_factories():
+    response = system_db().get("system_metadata/factories")
+    data = response.json()
+    if not data:
+        return []
+
+    # Convert dict of dicts to list
+    if isinstance(data, dict):
+        return list(data.values())
+    # Unexpected shape - don't cache it
+    return None
+
 def get_factory_by_id(factory_id):
-    cache_key = f"factory_{factory_id}"
-    cached = get_from_cache(cache_key)
-    if cached is not None:
-        return cached
+    def load():
+        response = system_db().get(f"system_metadata/factories/{factory_id}")
+        return response.json() or None
 
     try:
-        response = requests.get(f"{SYSTEM_DB_URL}/system_metadata/factories/{factory_id}.json")
-        data = response.json()
-        if data:
-            set_to_cache(cache_key, data)
-        return data
+        return AUTH_CACHE.get_or_load(f"factory_{factory_id}", load)
     except: return None
 
 # --- USER MANAGEMENT ---
 
 def add_user(username, password, role, factory_id=None, can_access_settings=False, name=None, created_by=None):
-    # Check if username exists
-    users = get_users()
-    for u in users:
-        if u['username'] == username:
-            return False
+    # Check if username exists (index first, full list catches pre-index users)
+    if lookup_user_id(username) or username in get_username_index():
+        return False
             
     user_id = str(uuid.uuid4())[:8]
     pwd_hash = hash_password(password)
@@ -163,62 +189,154 @@ def add_user(username, password, role, factory_id=None, can_access_settings=Fals
     }
     
     try:
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/users/{user_id}.json", json=data)
+        # Multi-path update keeps the user record and its index entry in step
+        system_db().patch("system_metadata", {
+            f"users/{user_id}": data,
+            f"usernames/{username_key(username)}": user_id
+        })
         invalidate_cache("all_users")
         return True
     except:
         return False
 
+def lookup_user_id(username):
+    """Resolves a username to its user ID via the usernames index.
+
+    Uses the in-process index when the user list is cached, otherwise a
+    single fetch of system_metadata/usernames/{username}.
+    """
+    index = get_from_cache("all_users_index")
+    if index is not None and username in index:
+        return index[username]
+
+    try:
+        key = quote(username_key(username), safe='')
+        response = system_db().get(f"system_metadata/usernames/{key}")
+        user_id = response.json() if response.status_code == 200 else None
+        if isinstance(user_id, str):
+            return user_id
+    except:
+        pass
+    return None
+
 def verify_user(username, password):
-    # This involves fetching all users to find by username, 
-    # since Firebase doesn't support "WHERE" queries easily on REST without indexing rules.
-    # For a small number of users, this is fine.
-    users = get_users()
     pwd_hash = hash_password(password)
-    
-    for u in users:
-        if u['username'] == username and u['password_hash'] == pwd_hash:
+
+    user_id = lookup_user_id(username)
+    if user_id:
+        u = get_user_by_id(user_id)
+        if u and u.get('username') == username and u.get('password_hash') == pwd_hash:
+            return u
+        return None
+
+    # Users created before the usernames index existed are not in it yet.
+    # Fall back to the (cached) full list once and repair the index.
+    user_id = get_username_index().get(username)
+    if user_id:
+        u = get_user_by_id(user_id)
+        if u and u.get('password_hash') == pwd_hash:
+            _index_username(username, user_id)
             return u
     return None
 
-def get_users():
-    cache_key = "all_users"
-    cached = get_from_cache(cache_key)
-    if cached is not None:
-        return cached
+def _index_username(username, user_id):
+    try:
+        system_db().patch("system_metadata/usernames", {username_key(username): user_id})
+    except:
+        pass
 
+def get_username_index():
+    """Returns {username: user_id}, built when the user list cache is filled."""
     try:
-        response = requests.get(f"{SYSTEM_DB_URL}/system_metadata/users.json")
+        return AUTH_CACHE.get_or_load("all_users_index", lambda: _build_username_index(get_users()))
+    except: return {}
+
+def get_user_by_id(user_id, fresh=False):
+    """Cached user record; fresh=True reads it from the database (and re-caches it)."""
+    def load():
+        response = system_db().get(f"system_metadata/users/{user_id}")
         data = response.json()
-        if not data: 
-            set_to_cache(cache_key, [])
-            return []
-        
-        users_list = []
-        if isinstance(data, dict):
-            users_list = list(data.values())
-        elif isinstance(data, list):
-            users_list = [x for x in data if x]
-            
-        # Enrich with factory names for UI
-        # Optimization: Fetch factories once (cached)
-        factories = get_factories()
-        fac_map = {f['id']: f['name'] for f in factories}
-            
-        for u in users_list:
-            if u.get('factory_id'):
-                u['factory_name'] = fac_map.get(u['factory_id'], 'Unknown')
-            else:
-                u['factory_name'] = None
-        
-        set_to_cache(cache_key, users_list)      
-        return users_list
+        return data if isinstance(data, dict) else None
+
+    try:
+        if fresh:
+            user = load()
+            if user is not None:
+                AUTH_CACHE.set(f"user_{user_id}", user)
+            return user
+        return AUTH_CACHE.get_or_load(f"user_{user_id}", load)
+    except: return None
+
+def get_users():
+    try:
+        return AUTH_CACHE.get_or_load("all_users", _load_users)
     except: return []
 
+def _load_users():
+    response = system_db().get("system_metadata/users")
+    data = response.json()
+    if not data:
+        set_to_cache("all_users_index", {})
+        return []
+
+    users_list = []
+    if isinstance(data, dict):
+        users_list = list(data.values())
+    elif isinstance(data, list):
+        users_list = [x for x in data if x]
+
+    # Enrich with factory names for UI
+    # Optimization: Fetch factories once (cached)
+    factories = get_factories()
+    fac_map = {f['id']: f['name'] for f in factories}
+
+    for u in users_list:
+        if u.get('factory_id'):
+            u['factory_name'] = fac_map.get(u['factory_id'], 'Unknown')
+        else:
+            u['factory_name'] = None
+
+    set_to_cache("all_users_index", _build_username_index(users_list))
+    return users_list
+
+def _build_username_index(users_list):
+    return {u['username']: u['id'] for u in users_list if u.get('username')}
+
+# --- USER VIEWS ---
+# The /users page used to filter the full user list per role on every
+# request. These indexes are built once per cache fill instead; the
+# "all_users" prefix means every user write invalidates them too.
+def get_user_views():
+    """Users keyed by id plus id lists by factory, creator and role.
+
+    Every list is in user-id order (the order Firebase returns), so lists
+    can be merged without re-sorting.
+    """
+    try:
+        return AUTH_CACHE.get_or_load("all_users_views", lambda: build_user_views(get_users()))
+    except: return None
+
+def build_user_views(users_list):
+    views = {"users": {}, "order": [], "by_factory": {}, "by_creator": {}, "by_role": {}}
+    for u in sorted((u for u in users_list if u.get('id')), key=lambda u: u['id']):
+        uid = u['id']
+        views["users"][uid] = u
+        views["order"].append(uid)
+        views["by_factory"].setdefault(u.get('factory_id') or '', []).append(uid)
+        if u.get('created_by'):
+            views["by_creator"].setdefault(u['created_by'], []).append(uid)
+        views["by_role"].setdefault(u.get('role') or '', []).append(uid)
+    return views
+
 def delete_user(user_id):
     try:
-        requests.delete(f"{SYSTEM_DB_URL}/system_metadata/users/{user_id}.json")
+        user = get_user_by_id(user_id)
+        updates = {f"users/{user_id}": None}
+        if user and user.get('username') and lookup_user_id(user['username']) == user_id:
+            updates[f"usernames/{username_key(user['username'])}"] = None
+        system_db().patch("system_metadata", updates)
         invalidate_cache("all_users")
+        invalidate_cache(f"user_{user_id}")
         return True
     except: return False
 
@@ -226,8 +344,9 @@ def update_password(user_id, new_password):
     """Updates the password for a specific user ID."""
     try:
         pwd_hash = hash_password(new_password)
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/users/{user_id}.json", json={"password_hash": pwd_hash})
+        system_db().patch(f"system_metadata/users/{user_id}", {"password_hash": pwd_hash})
         invalidate_cache("all_users")
+        invalidate_cache(f"user_{user_id}")
         return True
     except:
         return False
@@ -236,8 +355,10 @@ def grant_temp_access(user_id, duration_minutes=60):
     """Grant temporary settings access for a specific duration."""
     try:
         expiry_time = int(time.time() + (duration_minutes * 60))
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/users/{user_id}.json", json={"settings_unlock_expiry": expiry_time})
+        system_db().patch(f"system_metadata/users/{user_id}", {"settings_unlock_expiry": expiry_time})
         invalidate_cache("all_users")
+        invalidate_cache(f"user_{user_id}")
+        bump_permission_revision(user_id)
         return True
     except:
         return False
@@ -249,8 +370,61 @@ def update_user_permission(user_id, can_access_settings):
         if not can_access_settings:
             data["settings_unlock_expiry"] = 0
             
-        requests.patch(f"{SYSTEM_DB_URL}/system_metadata/users/{user_id}.json", json=data)
+        system_db().patch(f"system_metadata/users/{user_id}", data)
         invalidate_cache("all_users")
+        invalidate_cache(f"user_{user_id}")
+        bump_permission_revision(user_id)
         return True
     except:
         return False
+
+# --- BUNDLED SNAPSHOT ---
+# `python auth_db.py` (run at build time, like static_assets.py) writes the
+# factory records to AUTH_SNAPSHOT_PATH. A cold process seeds AUTH_CACHE from
+# it as already-expired entries, so its first requests are answered from the
+# snapshot while one background load brings them up to date. Users are left
+# out on purpose: the bundle would otherwise carry password hashes.
+AUTH_SNAPSHOT_PATH = os.environ.get('AUTH_SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'auth_snapshot.json'))
+
+def build_snapshot():
+    factories = _load_factories()
+    if factories is None:
+        raise ValueError("Unexpected shape for system_metadata/factories")
+    entries = {"all_factories": factories}
+    for f in factories:
+        if isinstance(f, dict) and f.get('id'):
+            entries[f"factory_{f['id']}"] = f
+    return {"created_at": int(time.time()), "system_db": SYSTEM_DB_URL, "entries": entries}
+
+def write_snapshot(path=AUTH_SNAPSHOT_PATH):
+    """Writes a fresh snapshot to path. Returns how many cache entries it holds."""
+    snapshot = build_snapshot()
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp, path)
+    return len(snapshot["entries"])
+
+def load_snapshot(path=AUTH_SNAPSHOT_PATH):
+    """Seeds AUTH_CACHE from the bundled snapshot, if any. Returns how many entries were seeded."""
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"Ignoring auth snapshot {path}: {e}")
+        return 0
+    if snapshot.get("system_db") != SYSTEM_DB_URL:
+        return 0  # Built against another system database
+    return AUTH_CACHE.preload(snapshot.get("entries") or {})
+
+load_snapshot()
+
+if __name__ == '__main__':
+    try:
+        count = write_snapshot()
+        print(f"Wrote {count} entries to {AUTH_SNAPSHOT_PATH}")
+    except Exception as e:
+        # Never fail a build over it; processes just start with a cold cache
+        print(f"Auth snapshot not written: {e}")
@@ -0,0 +1,30 @@
+import auth_db
+
+def backfill():
+    print("--- starting usernames index backfill ---")
+    auth_db.invalidate_cache("all_users")
+    users = auth_db.get_users()
+
+    index = {}
+    for u in users:
+        username = u.get('username')
+        if not username:
+            continue
+        key = auth_db.username_key(username)
+        if key in index:
+            print(f"   ! Duplicate username '{username}' ({index[key]}, {u['id']}) - keeping first")
+            continue
+        index[key] = u['id']
+        print(f"   + {username} -> {u['id']}")
+
+    try:
+        # PUT replaces the whole node so stale entries are dropped too
+        auth_db.system_db().put("system_metadata/usernames", index)
+        print(f"Indexed {len(index)} usernames.")
+    except Exception as e:
+        print(f"Error saving index: {e}")
+
+    print("--- backfill complete ---")
+
+if __name__ == "__main__":
+    backfill()
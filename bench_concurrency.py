@@ -0,0 +1,156 @@
+"""Load benchmark: sync vs threaded vs gevent gunicorn workers.
+
+Starts a local stand-in for Firebase that answers every read after a fixed
+delay, runs the app under gunicorn once per worker class, and hammers one
+route with concurrent clients. Reports throughput and latency per mode.
+
+Usage:
+    python bench_concurrency.py
+    python bench_concurrency.py --clients 100 --duration 15 --upstream-delay 0.2
+    python bench_concurrency.py --modes sync,gevent --path /settings
+    python bench_concurrency.py --modes gthread,gevent --cache-backend sqlite
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_upstream(port, delay):
+    """Minimal RTDB stand-in: every GET returns {} after `delay` seconds."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = b'{}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def session_cookie(env):
+    """Signs a regular user's session the same way the app does."""
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from app import app
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'user_id': 'bench-user', 'role': 'user', 'factory_url': env['FIREBASE_DB_URL']})
+
+
+def start_app(mode, port, env, workers, threads):
+    if mode == 'sync':
+        threads = 1  # gunicorn silently switches sync to gthread when threads > 1
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{port}',
+           '-k', mode, '-w', str(workers), '--threads', str(threads),
+           '--worker-connections', '5000', '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=dict(os.environ, **env))
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/login', timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn ({mode}) did not start")
+
+
+def run_load(url, cookie, clients, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        s = requests.Session()
+        s.cookies.set('session', cookie)
+        while time.time() < stop_at:
+            start = time.perf_counter()
+            try:
+                r = s.get(url, timeout=30, allow_redirects=False)
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / duration,
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p95': pct(0.95),
+        'max': latencies[-1] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--path', default='/settings')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--upstream-delay', type=float, default=0.1, help='Seconds per Firebase read')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers per mode')
+    parser.add_argument('--threads', type=int, default=64, help='Threads per gthread worker')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--cache-backend', default='memory', help='AUTH_CACHE_BACKEND for the app (memory|sqlite|redis)')
+    args = parser.parse_args()
+
+    upstream_port = args.port + 1
+    start_upstream(upstream_port, args.upstream_delay)
+    upstream = f'http://127.0.0.1:{upstream_port}'
+    env = {'FIREBASE_DB_URL': upstream, 'SYSTEM_DB_URL': upstream, 'AUTH_CACHE_BACKEND': args.cache_backend}
+    cookie = session_cookie(env)
+
+    print(f"{args.path}: {args.clients} clients, {args.duration:.0f}s, upstream delay {args.upstream_delay * 1000:.0f} ms, "
+          f"{args.cache_backend} auth cache")
+    print(f"{'mode':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>7}")
+    for mode in args.modes.split(','):
+        if mode == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print(f"{mode:<8} skipped (gevent not installed)")
+                continue
+        proc = start_app(mode, args.port, env, args.workers, args.threads)
+        try:
+            result = run_load(f'http://127.0.0.1:{args.port}{args.path}', cookie, args.clients, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{mode:<8} {result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+              f"{result['max']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
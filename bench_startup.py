@@ -0,0 +1,110 @@
+"""Cold-start benchmark for the serverless entry point.
+
+Imports api/index.py in fresh interpreters under `python -X importtime`
+(with VERCEL=1, as on Vercel) and reports the median import time, split
+into Flask and friends vs. this repo's own modules. Exits with status 1
+when the project's share goes over the budget, or when a module that is
+meant to load on first use (DEFERRED_MODULES) is imported at startup, so
+it can run as a CI step.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 10 --budget-ms 40
+    python bench_startup.py --entry tracker_tick --verbose
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Configuration
+DEFAULT_RUNS = 5
+# Self time of the repo's own modules (route table, config, cache setup).
+# Flask itself is left out: it is a fixed cost we can't do much about.
+DEFAULT_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 40))
+
+# Loaded on first use; importing any of these at startup is a regression
+DEFERRED_MODULES = {
+    'api.index': ['requests', 'urllib3', 'history_tracker', 'alarm_rules', 'analytics_series', 'exporter',
+                  'history_index', 'history_retention', 'live_stream', 'sample_store', 'rollup_store',
+                  'event_writer', 'tracker_tick'],
+    'tracker_tick': ['flask', 'jinja2', 'app', 'exporter', 'live_stream'],
+}
+
+
+def project_modules():
+    names = {f[:-3] for f in os.listdir(ROOT) if f.endswith('.py')}
+    names.update(f"api.{f[:-3]}" for f in os.listdir(os.path.join(ROOT, 'api')) if f.endswith('.py'))
+    names.add('api')
+    return names
+
+
+def measure(entry):
+    """One cold import. Returns (total_us, project_self_us, {module: self_us})."""
+    env = dict(os.environ, VERCEL='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {entry}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {entry} failed:\n{result.stderr[-2000:]}")
+
+    own = project_modules()
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        modules[name] = int(self_us)
+        if name == entry:
+            total = int(cumulative_us)
+    project = sum(us for name, us in modules.items() if name in own)
+    return total, project, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entry', default='api.index', help='Module to import (default api.index)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="Limit for the median self time of the repo's own modules")
+    parser.add_argument('--verbose', action='store_true', help="List the repo's modules by self time")
+    args = parser.parse_args()
+
+    totals, projects, modules = [], [], {}
+    for _ in range(args.runs):
+        total, project, modules = measure(args.entry)
+        totals.append(total / 1000)
+        projects.append(project / 1000)
+
+    total_ms, project_ms = statistics.median(totals), statistics.median(projects)
+    print(f"{args.entry}: {total_ms:.1f} ms median over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f})")
+    print(f"  repo modules: {project_ms:.1f} ms (budget {args.budget_ms:.0f} ms), "
+          f"third-party: {total_ms - project_ms:.1f} ms")
+    if args.verbose:
+        own = project_modules()
+        for name, us in sorted(((n, us) for n, us in modules.items() if n in own), key=lambda m: -m[1]):
+            print(f"    {name:<24} {us / 1000:6.1f} ms")
+
+    failures = []
+    if project_ms > args.budget_ms:
+        failures.append(f"repo modules took {project_ms:.1f} ms, budget is {args.budget_ms:.0f} ms")
+    loaded = [m for m in DEFERRED_MODULES.get(args.entry, []) if m in modules]
+    if loaded:
+        failures.append(f"imported at startup but meant to load on first use: {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,598 @@
+import contextlib
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# Configuration
+DEFAULT_TTL = 300  # 5 minutes
+DEFAULT_STALE_TTL = 0  # How long past expiry an entry may still be served while it refreshes
+DEFAULT_MAX_ENTRIES = 1024
+# SQLite backend default location: the app's data dir, not the shared temp dir
+DATA_DIR = os.environ.get('EAGLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+# A hit refreshes an entry's LRU timestamp at most this often (seconds), so
+# most SQLite hits stay read-only instead of each being a write transaction
+LRU_TOUCH_INTERVAL = 30
+# Connections per process for the shared backends
+DEFAULT_POOL_SIZE = int(os.environ.get('AUTH_CACHE_POOL_SIZE', 8))
+# Counter bumped by every invalidate() on a shared backend, so a load that
+# began before another worker's invalidation doesn't store what it read
+INVALIDATION_COUNTER = 'invalidations'
+
+
+class SingleFlight:
+    """Collapses concurrent loads of the same key into one call.
+
+    The first caller runs the loader; everyone else arriving while it is in
+    flight waits for and shares its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+        return call['result']
+
+    def do_background(self, key, fn):
+        """Starts fn in a daemon thread unless a load for key is already running."""
+        with self._lock:
+            if key in self._calls:
+                return False
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception as e:
+                print(f"Background refresh failed for {key}: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class ConnectionPool:
+    """Fixed-size pool of connections, each checked out for one operation.
+
+    A threading.local connection per thread turns into one per greenlet under
+    the gevent worker, i.e. a new SQLite/Redis connection for every request.
+    With the pool a process never holds more than `size`; callers beyond
+    that wait for one to be returned.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.size = size
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except Exception:
+                # Might be half-way through a reply / transaction: don't reuse it
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                raise
+            self._idle.put(conn)
+
+
+class CacheBackend:
+    """Bounded key/value cache with TTL expiry and hit/miss/eviction counters.
+
+    Subclasses implement _load/_store/_delete_prefix/_clear. Values must be
+    JSON-serialisable so that the shared backends can hold them.
+    `shared` says whether every worker sees the same entries and counters.
+    """
+
+    shared = False
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._flight = SingleFlight()
+        # key -> True once invalidate() has covered it while its loader runs
+        self._loading = {}
+        self._loading_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def peek(self, key):
+        """Returns (value, age_seconds) for an entry still inside its stale window."""
+        try:
+            entry = self._load(key)
+        except Exception as e:
+            # A broken shared backend degrades to a cache miss
+            print(f"Cache read error ({self.name}): {e}")
+            return None
+        if entry is None:
+            return None
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            return None
+        return value, age
+
+    def get(self, key):
+        """Returns the cached value, or None if missing or expired."""
+        entry = self.peek(key)
+        if entry is not None and entry[1] < self.ttl:
+            self._count(hits=1)
+            return entry[0]
+        self._count(misses=1)
+        return None
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value, calling loader() at most once per key on a miss.
+
+        Fresh entries are returned directly. Expired entries still inside
+        stale_ttl are returned immediately while a single background refresh
+        runs. On a real miss concurrent callers share one loader call.
+        A loader returning None is not cached, and neither is one that was
+        overtaken by invalidate() (it may have read the data before the
+        write that invalidated it); its value is still returned.
+        """
+        entry = self.peek(key)
+        if entry is not None:
+            value, age = entry
+            if age < self.ttl:
+                self._count(hits=1)
+                return value
+            self._count(stale_hits=1)
+            self._flight.do_background(key, lambda: self._refresh(key, loader))
+            return value
+
+        self._count(misses=1)
+        return self._flight.do(key, lambda: self._refresh(key, loader))
+
+    def _refresh(self, key, loader):
+        # Single-flight means one loader per key at a time in this process
+        with self._loading_lock:
+            self._loading[key] = False
+        generation = self.counter(INVALIDATION_COUNTER) if self.shared else None
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        finally:
+            with self._loading_lock:
+                invalidated = self._loading.pop(key, False)
+        if value is None:
+            return value
+        # Checked after storing: an invalidate() landing in between has
+        # marked/bumped before its delete, so either its delete removes our
+        # entry or we see the change here and remove it ourselves
+        if invalidated or (generation is not None and self.counter(INVALIDATION_COUNTER) != generation):
+            try:
+                self._delete_prefix(key)  # May drop longer keys too; they just reload
+            except Exception as e:
+                print(f"Cache invalidate error ({self.name}): {e}")
+        return value
+
+    def set(self, key, value):
+        try:
+            self._store(key, value, time.time())
+        except Exception as e:
+            print(f"Cache write error ({self.name}): {e}")
+
+    def preload(self, entries):
+        """Seeds missing keys with values that are already due for a refresh.
+
+        They are served at once as stale hits and reloaded in the background
+        on first use, so a cold process answers without waiting on the
+        loader. Needs stale_ttl > 0. Returns how many keys were seeded.
+        """
+        stored_at = time.time() - self.ttl
+        seeded = 0
+        for key, value in entries.items():
+            if value is None or self.peek(key) is not None:
+                continue  # Never replace something a live worker already loaded
+            try:
+                self._store(key, value, stored_at)
+                seeded += 1
+            except Exception as e:
+                print(f"Cache write error ({self.name}): {e}")
+        return seeded
+
+    def invalidate(self, prefix=None):
+        """Drops keys starting with prefix, or everything if no prefix.
+
+        Loads already running for those keys won't store their result.
+        """
+        # Marked before deleting, see _refresh
+        with self._loading_lock:
+            for key in self._loading:
+                if not prefix or key.startswith(prefix):
+                    self._loading[key] = True
+        if self.shared:
+            self.incr(INVALIDATION_COUNTER)
+        try:
+            if prefix:
+                self._delete_prefix(prefix)
+            else:
+                self._clear()
+        except Exception as e:
+            print(f"Cache invalidate error ({self.name}): {e}")
+
+    # --- COUNTERS ---
+    # Small integers that live outside the TTL/LRU rules and survive full
+    # invalidations, used as revision numbers other processes can compare
+    # against (e.g. auth_db's permission revisions).
+
+    def incr(self, key):
+        """Atomically bumps counter key. Returns the new value, or None on error."""
+        try:
+            return self._incr(key)
+        except Exception as e:
+            print(f"Cache counter error ({self.name}): {e}")
+            return None
+
+    def counter(self, key):
+        """Current value of counter key (0 if never bumped), or None on error."""
+        try:
+            return self._counter(key)
+        except Exception as e:
+            print(f"Cache counter error ({self.name}): {e}")
+            return None
+
+    def _count(self, hits=0, misses=0, evictions=0, stale_hits=0):
+        with self._stats_lock:
+            self.hits += hits
+            self.stale_hits += stale_hits
+            self.misses += misses
+            self.evictions += evictions
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                "backend": self.name,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / total, 3) if total else 0.0
+            }
+
+
+class MemoryCache(CacheBackend):
+    """Per-process LRU cache. Fastest, but every worker has its own copy."""
+
+    name = "memory"
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
+        super().__init__(ttl, max_entries, stale_ttl)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._counters = {}
+
+    def _load(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def _store(self, key, value, stored_at):
+        with self._lock:
+            self._data[key] = (value, stored_at)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count(evictions=evicted)
+
+    def _delete_prefix(self, prefix):
+        with self._lock:
+            for k in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[k]
+
+    def _clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def _counter(self, key):
+        return self._counters.get(key, 0)
+
+
+class SQLiteCache(CacheBackend):
+    """Cache shared by every process on the host through a SQLite file.
+
+    A full invalidation bumps a generation number instead of rewriting the
+    table, so every worker stops seeing older entries on its next read.
+    The file holds user records (password hashes included), so it is only
+    readable by the app's own user (0600, in a 0700 directory when created).
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, stale_ttl=DEFAULT_STALE_TTL):
+        super().__init__(ttl, max_entries, stale_ttl)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Create it private before SQLite does (the -wal/-shm files copy its mode)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        try:
+            os.chmod(path, 0o600)
+        except OSError as e:
+            print(f"Could not restrict permissions on {path}: {e}")
+        self._pool = ConnectionPool(self._connect)
+        with self._pool.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL, generation INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('generation', 0)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _load(self, key):
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT c.value, c.stored_at, c.accessed_at FROM cache c, meta m"
+                " WHERE c.key = ? AND m.name = 'generation' AND c.generation = m.value",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] > LRU_TOUCH_INTERVAL:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def _store(self, key, value, stored_at):
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, stored_at, accessed_at, generation)"
+                " SELECT ?, ?, ?, ?, value FROM meta WHERE name = 'generation'",
+                (key, json.dumps(value), stored_at, stored_at)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                # Entries from older generations go first, then least recently used
+                cur = conn.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    " SELECT c.key FROM cache c, meta m WHERE m.name = 'generation'"
+                    " ORDER BY (c.generation = m.value), c.accessed_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+                self._count(evictions=cur.rowcount)
+
+    def _delete_prefix(self, prefix):
+        # Range scan on the primary key rather than LIKE (which would treat _ as a wildcard)
+        with self._pool.connection() as conn:
+            conn.execute(
+                "DELETE FROM cache WHERE key >= ? AND key < ?",
+                (prefix, prefix + '\U0010ffff')
+            )
+
+    def _clear(self):
+        with self._pool.connection() as conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            conn.execute(
+                "DELETE FROM cache WHERE generation < (SELECT value FROM meta WHERE name = 'generation')"
+            )
+
+    # Counters share the meta table with the generation number
+    def _incr(self, key):
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT INTO meta (name, value) VALUES (?, 1)"
+                " ON CONFLICT (name) DO UPDATE SET value = value + 1",
+                ('counter:' + key,)
+            )
+            row = conn.execute("SELECT value FROM meta WHERE name = ?", ('counter:' + key,)).fetchone()
+        return row[0]
+
+    def _counter(self, key):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE name = ?", ('counter:' + key,)).fetchone()
+        return row[0] if row else 0
+
+
+class _RedisConnection:
+    __slots__ = ('sock', 'reader')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class RedisCache(CacheBackend):
+    """Cache shared through a local Redis-compatible server.
+
+    Speaks just enough RESP for GET/SET/DEL/INCR/SCAN so no client library
+    is needed. Size is bounded by the server's maxmemory LRU policy; the
+    eviction counter mirrors the server's evicted_keys.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, stale_ttl=DEFAULT_STALE_TTL, namespace="eagle:auth"):
+        super().__init__(ttl, max_entries, stale_ttl)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or '/0').strip('/') or 0)
+        self.namespace = namespace
+        self._pool = ConnectionPool(self._connect)
+
+    # --- RESP ---
+
+    def _connect(self):
+        conn = _RedisConnection(socket.create_connection((self.host, self.port), timeout=2))
+        if self.db:
+            self._send(conn, ('SELECT', self.db))
+        return conn
+
+    def _command(self, *args):
+        with self._pool.connection() as conn:
+            return self._send(conn, args)
+
+    def _send(self, conn, args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        conn.sock.sendall(b"".join(parts))
+        return self._read_reply(conn.reader)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RuntimeError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    # --- STORAGE ---
+
+    def _generation(self):
+        value = self._command('GET', f"{self.namespace}:generation")
+        return int(value) if value else 0
+
+    def _key(self, key, generation=None):
+        if generation is None:
+            generation = self._generation()
+        return f"{self.namespace}:{generation}:{key}"
+
+    def _load(self, key):
+        raw = self._command('GET', self._key(key))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['v'], entry['t']
+
+    def _store(self, key, value, stored_at):
+        payload = json.dumps({'v': value, 't': stored_at})
+        self._command('SET', self._key(key), payload, 'PX', int((self.ttl + self.stale_ttl) * 1000))
+
+    def _delete_prefix(self, prefix):
+        pattern = self._key(prefix) + '*'
+        cursor = b'0'
+        while True:
+            cursor, keys = self._command('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+            if keys:
+                self._command('DEL', *keys)
+            if cursor in (b'0', '0'):
+                break
+
+    def _clear(self):
+        # Older generations simply age out through their TTL
+        self._command('INCR', f"{self.namespace}:generation")
+
+    def _incr(self, key):
+        return int(self._command('INCR', f"{self.namespace}:counter:{key}"))
+
+    def _counter(self, key):
+        value = self._command('GET', f"{self.namespace}:counter:{key}")
+        return int(value) if value else 0
+
+    def stats(self):
+        result = super().stats()
+        try:
+            info = self._command('INFO', 'stats').decode()
+            for line in info.splitlines():
+                if line.startswith('evicted_keys:'):
+                    result['evictions'] = int(line.split(':', 1)[1])
+        except Exception:
+            pass
+        return result
+
+
+def create_cache(backend=None, ttl=DEFAULT_TTL, max_entries=None, path=None, url=None, stale_ttl=DEFAULT_STALE_TTL):
+    """Builds the cache backend selected by argument or environment.
+
+    AUTH_CACHE_BACKEND: memory (default) | sqlite | redis
+    AUTH_CACHE_PATH:    SQLite file shared by all workers on the host
+                        (default <EAGLE_DATA_DIR>/auth_cache.sqlite3)
+    AUTH_CACHE_URL:     redis://host:port/db
+    AUTH_CACHE_MAX_ENTRIES: LRU bound
+    """
+    backend = (backend or os.environ.get('AUTH_CACHE_BACKEND', 'memory')).lower()
+    if max_entries is None:
+        max_entries = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+    if backend == 'sqlite':
+        path = path or os.environ.get('AUTH_CACHE_PATH') or os.path.join(DATA_DIR, 'auth_cache.sqlite3')
+        return SQLiteCache(path, ttl=ttl, max_entries=max_entries, stale_ttl=stale_ttl)
+    if backend == 'redis':
+        url = url or os.environ.get('AUTH_CACHE_URL', 'redis://127.0.0.1:6379/0')
+        return RedisCache(url, ttl=ttl, max_entries=max_entries, stale_ttl=stale_ttl)
+    return MemoryCache(ttl=ttl, max_entries=max_entries, stale_ttl=stale_ttl)
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import firebase_client
+
+# Configuration
+DATA_DIR = os.environ.get('EAGLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journal')
+BATCH_SIZE = 100  # Events per PATCH
+FLUSH_INTERVAL = 1.0  # Seconds an event may wait before its batch is sent
+RETRY_ATTEMPTS = 3  # Per batch, on top of the client's own 5xx/429 retries
+RETRY_BACKOFF = 0.5
+JOURNAL_REPLAY_INTERVAL = 30  # Seconds between attempts to drain a journal
+FLUSH_WORKERS = 8
+
+
+class EventWriter:
+    """Background, batched writer for history events across all factories.
+
+    enqueue() assigns a client-side push ID and returns immediately. IDs
+    are taken at write time; the event's own time stays in the record.
+    (Caught-up and replayed events are back-dated, and HistoryIndex.sync()
+    only reads keys after the last one it has seen.) A single thread groups queued events per database and writes each group
+    with one multi-child PATCH on /history, as soon as BATCH_SIZE events are
+    waiting or FLUSH_INTERVAL has passed. Because keys are generated here,
+    retrying a batch can never create duplicates.
+
+    Batches that still fail after retries are appended to an on-disk
+    journal (one JSON line per batch, per database) and replayed once the
+    database is reachable again.
+    """
+
+    def __init__(self, journal_dir=JOURNAL_DIR, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, path="history"):
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = path
+        self._cond = threading.Condition()
+        self._queues = {}  # base_url -> deque[(key, record, enqueued_at)]
+        self._in_flight = set()
+        self._last_replay = {}
+        self._journal_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._executor = None
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.flushed_events = 0
+        self.flushed_batches = 0
+        self.failed_batches = 0
+        self.journaled_events = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # --- PUBLIC API ---
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=FLUSH_WORKERS, thread_name_prefix="event-writer")
+            self._thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Flushes what is queued and stops the background thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def enqueue(self, base_url, record):
+        """Queues one event for base_url's /history. Returns its push key."""
+        key = firebase_client.push_id()
+        with self._cond:
+            q = self._queues.setdefault(base_url, deque())
+            q.append((key, record, time.time()))
+            if len(q) >= self.batch_size:
+                self._cond.notify_all()
+        return key
+
+    @property
+    def running(self):
+        return self._running
+
+    def flush(self):
+        """Synchronously writes everything queued (used on shutdown and in tools)."""
+        for base_url in list(self._queues):
+            self._flush_database(base_url, force=True)
+
+    def depth(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def stats(self):
+        queue_depth = self.depth()
+        journal_depth = self.journal_depth()
+        with self._stats_lock:
+            return {
+                "queue_depth": queue_depth,
+                "journal_depth": journal_depth,
+                "flushed_events": self.flushed_events,
+                "flushed_batches": self.flushed_batches,
+                "failed_batches": self.failed_batches,
+                "journaled_events": self.journaled_events,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "max_flush_ms": round(self.max_flush_ms, 2),
+                "avg_flush_ms": round(self._total_flush_ms / self.flushed_batches, 2) if self.flushed_batches else 0.0
+            }
+
+    # --- BACKGROUND LOOP ---
+
+    def _run_loop(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    break
+                self._cond.wait(timeout=self.flush_interval / 2)
+                due = self._due_databases()
+
+            for base_url in due:
+                if base_url not in self._in_flight:
+                    self._in_flight.add(base_url)
+                    self._executor.submit(self._flush_database, base_url)
+
+            self._replay_due_journals()
+
+        # Final drain on shutdown
+        self.flush()
+
+    def _due_databases(self):
+        now = time.time()
+        due = []
+        for base_url, q in self._queues.items():
+            if q and (len(q) >= self.batch_size or now - q[0][2] >= self.flush_interval):
+                due.append(base_url)
+        return due
+
+    def _take_batch(self, base_url):
+        with self._cond:
+            q = self._queues.get(base_url)
+            batch = []
+            while q and len(batch) < self.batch_size:
+                batch.append(q.popleft())
+            return batch
+
+    def _flush_database(self, base_url, force=False):
+        try:
+            while True:
+                batch = self._take_batch(base_url)
+                if not batch:
+                    return
+                payload = {key: record for key, record, _ in batch}
+                if not self._write(base_url, payload):
+                    self._journal(base_url, payload)
+                if not force and len(batch) < self.batch_size:
+                    return
+        finally:
+            self._in_flight.discard(base_url)
+
+    def _write(self, base_url, payload):
+        """One multi-child PATCH with retries. Returns True on success."""
+        client = firebase_client.get_client(base_url)
+        for attempt in range(RETRY_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                response = client.patch(self.path, payload)
+                if response.status_code < 300:
+                    self._record_flush(len(payload), (time.perf_counter() - start) * 1000)
+                    return True
+                print(f"Event batch rejected by {base_url}: HTTP {response.status_code}")
+            except Exception as e:
+                print(f"Event batch failed for {base_url}: {e}")
+            time.sleep(RETRY_BACKOFF * (2 ** attempt))
+        with self._stats_lock:
+            self.failed_batches += 1
+        return False
+
+    def _record_flush(self, count, elapsed_ms):
+        with self._stats_lock:
+            self.flushed_events += count
+            self.flushed_batches += 1
+            self.last_flush_ms = elapsed_ms
+            self._total_flush_ms += elapsed_ms
+            if elapsed_ms > self.max_flush_ms:
+                self.max_flush_ms = elapsed_ms
+
+    # --- JOURNAL ---
+
+    def _journal_path(self, base_url):
+        name = hashlib.sha1(base_url.encode()).hexdigest()[:16]
+        return os.path.join(self.journal_dir, f"{name}.jsonl")
+
+    def _journal(self, base_url, payload):
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with self._journal_lock, open(self._journal_path(base_url), 'a') as f:
+                f.write(json.dumps({"base_url": base_url, "events": payload}) + "\n")
+            with self._stats_lock:
+                self.journaled_events += len(payload)
+            print(f"Firebase unreachable - journaled {len(payload)} events for {base_url}")
+        except Exception as e:
+            print(f"Failed to journal events, {len(payload)} dropped: {e}")
+
+    def journal_depth(self):
+        total = 0
+        if not os.path.isdir(self.journal_dir):
+            return 0
+        for name in os.listdir(self.journal_dir):
+            if name.endswith('.jsonl'):
+                try:
+                    with open(os.path.join(self.journal_dir, name)) as f:
+                        total += sum(len(json.loads(line)["events"]) for line in f if line.strip())
+                except Exception:
+                    pass
+        return total
+
+    def _replay_due_journals(self):
+        if not os.path.isdir(self.journal_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.journal_dir):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            if now - self._last_replay.get(path, 0) < JOURNAL_REPLAY_INTERVAL or path in self._in_flight:
+                continue
+            self._last_replay[path] = now
+            self._in_flight.add(path)
+            self._executor.submit(self._replay_in_background, path)
+
+    def _replay_in_background(self, path):
+        try:
+            self.replay_journal(path)
+        finally:
+            self._in_flight.discard(path)
+
+    def replay_journal(self, path):
+        """Re-sends journaled batches in order; keeps whatever still fails."""
+        # Held throughout so batches journaled meanwhile are not lost in the rewrite
+        with self._journal_lock:
+            self._replay_locked(path)
+
+    def _replay_locked(self, path):
+        try:
+            with open(path) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:
+            print(f"Unreadable journal {path}: {e}")
+            return
+
+        remaining = []
+        for i, entry in enumerate(entries):
+            if not self._write(entry["base_url"], entry["events"]):
+                remaining = entries[i:]
+                break
+
+        if remaining:
+            tmp = path + ".tmp"
+            with open(tmp, 'w') as f:
+                for entry in remaining:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp, path)
+        else:
+            os.remove(path)
+            print(f"Replayed journal {os.path.basename(path)} ({len(entries)} batches)")
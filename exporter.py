@@ -0,0 +1,203 @@
+"""Streaming bulk export of history events and live_data samples.
+
+Everything here is a generator: rows are read a page at a time (Firebase
+key ranges, or mapped segments of the local sample store) and written out
+as they come, so memory stays flat whatever the range.
+
+Formats:
+    csv       - one header line, then one line per row
+    columnar  - live_data only. Binary, for scripts:
+                b'EAGLECOL1\\n' + one JSON line {"columns": [[name, typecode], ...]}
+                then blocks of: uint32 row count (little-endian) followed by
+                each column's values as packed little-endian arrays (same
+                order as the header; typecodes as in Python's array module).
+                NaN / -1 mean "no reading", as in sample_store.
+"""
+import csv
+import datetime
+import io
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+
+import analytics_series
+import firebase_client
+import sample_store
+
+# Configuration
+PAGE_SIZE = 1000  # Firebase children per range query
+COLUMNAR_BLOCK_ROWS = 4096
+FLUSH_BYTES = 64 * 1024  # Output is yielded in chunks of roughly this size
+
+# Older RUN_CYCLE records have no event_type/timestamp, only start_time + duration_seconds
+HISTORY_COLUMNS = ['key', 'timestamp', 'date', 'pump_name', 'event_type', 'message',
+                   'start_time', 'duration_seconds', 'details']
+LIVE_COLUMNS = list(sample_store.COLUMNS)  # ts + metrics + pump states
+
+
+def parse_time(value, default=None):
+    """Epoch ms from '1718000000000', '2025-01-31' or '2025-01-31T08:00' (plant-local)."""
+    if value is None or value == '':
+        return default
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone(datetime.timedelta(minutes=analytics_series.DATA_UTC_OFFSET_MINUTES)))
+    return int(dt.timestamp() * 1000)
+
+
+def format_time(ts_ms):
+    """'YYYY-MM-DD HH:MM:SS' in plant-local time, like the tracker's date_formatted."""
+    tz = datetime.timezone(datetime.timedelta(minutes=analytics_series.DATA_UTC_OFFSET_MINUTES))
+    return datetime.datetime.fromtimestamp(ts_ms / 1000, tz).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def key_range(start_ms, end_ms):
+    # Keys are push IDs, so a time range is a key range
+    start_key = firebase_client.push_id_prefix(start_ms) if start_ms else None
+    end_key = firebase_client.push_id_prefix(end_ms) if end_ms else None
+    return start_key, end_key
+
+
+# --- ROW SOURCES ---
+
+def history_rows(base_url, start_ms=None, end_ms=None):
+    client = firebase_client.get_client(base_url)
+    start_key, end_key = key_range(start_ms, end_ms)
+    for key, rec in client.iter_children('history', start_key, end_key, PAGE_SIZE):
+        if not isinstance(rec, dict):
+            continue
+        timestamp = rec.get('timestamp') or rec.get('start_time')
+        date = rec.get('date_formatted')
+        if not date and isinstance(timestamp, (int, float)):
+            date = format_time(timestamp)
+        run_cycle = not rec.get('event_type')
+        yield {
+            'key': key,
+            'timestamp': timestamp,
+            'date': date,
+            'pump_name': rec.get('pump_name'),
+            # Same labels the old client-side export used for run cycles
+            'event_type': 'RUN_CYCLE' if run_cycle else rec.get('event_type'),
+            'message': rec.get('message') or ('Run Duration' if run_cycle else None),
+            'start_time': rec.get('start_time'),
+            'duration_seconds': rec.get('duration_seconds'),
+            'details': json.dumps(rec.get('details') or {}),
+        }
+
+
+def live_rows(base_url, start_ms, end_ms):
+    """Samples in [start_ms, end_ms), from the local store when it covers the range."""
+    store = None
+    try:
+        store = sample_store.get_store()
+        if not store.covers(base_url, start_ms, end_ms):
+            store = None
+    except Exception as e:
+        print(f"Sample store unavailable for export: {e}")
+        store = None
+
+    if store is not None:
+        yield from store.rows(base_url, start_ms, end_ms)
+        return
+
+    client = firebase_client.get_client(base_url)
+    start_key, end_key = key_range(start_ms, end_ms)
+    for key, entry in client.iter_children('live_data', start_key, end_key, PAGE_SIZE):
+        if not isinstance(entry, dict):
+            continue
+        ts = analytics_series.parse_sample_time(entry)
+        if ts is None:
+            ts = firebase_client.push_id_time(key)
+        row = sample_store.encode_sample(ts, entry)
+        for name, value in row.items():
+            if (isinstance(value, float) and math.isnan(value)) or (sample_store.COLUMNS[name] == 'b' and value < 0):
+                row[name] = None
+        yield row
+
+
+# --- ENCODERS ---
+
+def csv_chunks(rows, columns):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if row.get(c) is None else row.get(c) for c in columns])
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+
+def columnar_chunks(rows, columns=LIVE_COLUMNS):
+    types = [(c, sample_store.COLUMNS[c]) for c in columns]
+    yield b'EAGLECOL1\n' + json.dumps({'columns': types}).encode() + b'\n'
+
+    def block(buffers, n):
+        out = [struct.pack('<I', n)]
+        for arr in buffers:
+            if sys.byteorder != 'little':
+                arr.byteswap()
+            out.append(arr.tobytes())
+        return b''.join(out)
+
+    buffers = [array(t) for _, t in types]
+    n = 0
+    for row in rows:
+        for arr, (name, t) in zip(buffers, types):
+            v = row.get(name)
+            arr.append((float('nan') if t == 'd' else -1) if v is None else v)
+        n += 1
+        if n == COLUMNAR_BLOCK_ROWS:
+            yield block(buffers, n)
+            buffers = [array(t) for _, t in types]
+            n = 0
+    if n:
+        yield block(buffers, n)
+
+
+def gzip_chunks(chunks):
+    """Streams chunks through gzip (wbits=31 writes the gzip header/trailer)."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export(kind, base_url, start_ms, end_ms, fmt='csv', compress=False):
+    """Returns (chunk generator, mimetype, file name). Raises ValueError on bad options."""
+    if kind == 'history':
+        if fmt != 'csv':
+            raise ValueError("history can only be exported as csv")
+        chunks = csv_chunks(history_rows(base_url, start_ms, end_ms), HISTORY_COLUMNS)
+    elif kind == 'live_data':
+        if start_ms is None:
+            raise ValueError("live_data export needs a start time")
+        rows = live_rows(base_url, start_ms, end_ms)
+        if fmt == 'csv':
+            chunks = csv_chunks(rows, LIVE_COLUMNS)
+        elif fmt == 'columnar':
+            chunks = columnar_chunks(rows)
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+    else:
+        raise ValueError(f"Unknown export: {kind}")
+
+    ext = 'csv' if fmt == 'csv' else 'ecol'
+    name = f"{kind}_export.{ext}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/octet-stream'
+    if compress:
+        return gzip_chunks(chunks), 'application/gzip', name + '.gz'
+    return chunks, mimetype, name
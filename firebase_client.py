@@ -0,0 +1,350 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# requests (+ urllib3, certifi, charset detection) is imported on first use:
+# it is a good share of a serverless cold start, and plenty of requests are
+# answered from cache without ever talking to Firebase.
+requests = None
+
+# Configuration
+# Every value can be overridden from the environment so the same code runs
+# against the real RTDB endpoint or a local HTTP stand-in.
+CONNECT_TIMEOUT = float(os.environ.get('FIREBASE_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('FIREBASE_READ_TIMEOUT', 10))
+POOL_CONNECTIONS = int(os.environ.get('FIREBASE_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('FIREBASE_POOL_MAXSIZE', 16))
+MAX_RETRIES = int(os.environ.get('FIREBASE_MAX_RETRIES', 3))
+RETRY_BACKOFF = float(os.environ.get('FIREBASE_RETRY_BACKOFF', 0.3))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Firebase sends a keep-alive event every 30 s on an open stream
+STREAM_READ_TIMEOUT = float(os.environ.get('FIREBASE_STREAM_READ_TIMEOUT', 75))
+# Shared pool for independent fetches issued from one request (see gather)
+FETCH_WORKERS = int(os.environ.get('FIREBASE_FETCH_WORKERS', 32))
+
+# POST is left out on purpose: retrying a push after a lost response
+# would create a duplicate child.
+RETRY_METHODS = frozenset(['GET', 'PUT', 'PATCH', 'DELETE'])
+
+
+def _load_requests():
+    global requests
+    if requests is None:
+        import requests as _requests
+        requests = _requests
+    return requests
+
+
+class FirebaseClient:
+    """Keep-alive REST client bound to a single Realtime Database URL."""
+
+    def __init__(self, base_url, timeout=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.session = self._build_session()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def _build_session(self):
+        _load_requests()
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=POOL_MAXSIZE,
+            max_retries=retry,
+            pool_block=False
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def url(self, path):
+        path = path.strip('/')
+        if not path:
+            return f"{self.base_url}/.json"
+        return f"{self.base_url}/{path}.json"
+
+    # --- HTTP VERBS ---
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        failed = False
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+            failed = response.status_code >= 400
+            return response
+        except requests.RequestException:
+            failed = True
+            raise
+        finally:
+            self._record(method, time.perf_counter() - start, failed)
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params=params)
+
+    def put(self, path, data):
+        return self.request('PUT', path, json=data)
+
+    def patch(self, path, data):
+        return self.request('PATCH', path, json=data)
+
+    def post(self, path, data):
+        return self.request('POST', path, json=data)
+
+    def delete(self, path):
+        return self.request('DELETE', path)
+
+    def stream(self, path, params=None):
+        """Yields (event, data) from the REST event-stream protocol for path.
+
+        Events are put/patch (data = {"path": ..., "data": ...}), keep-alive,
+        cancel and auth_revoked. Runs until the server closes the connection,
+        which is raised as ConnectionError so callers can reconnect.
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.get(
+                self.url(path), params=params, stream=True,
+                headers={'Accept': 'text/event-stream'},
+                timeout=(self.timeout[0], STREAM_READ_TIMEOUT)
+            )
+        except requests.RequestException:
+            self._record('STREAM', time.perf_counter() - start, True)
+            raise
+        self._record('STREAM', time.perf_counter() - start, response.status_code != 200)
+
+        try:
+            if response.status_code != 200:
+                raise requests.HTTPError(f"Stream failed with HTTP {response.status_code}", response=response)
+
+            buffer = b''
+            event, data_lines = None, []
+            while True:
+                # read1 returns as soon as any bytes arrive (chunked or not)
+                chunk = response.raw.read1(8192)
+                if not chunk:
+                    raise ConnectionError("Event stream closed by server")
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for raw in lines:
+                    line = raw.rstrip(b'\r').decode('utf-8')
+                    if not line:
+                        if event is not None:
+                            payload = '\n'.join(data_lines)
+                            yield event, json.loads(payload) if payload else None
+                        event, data_lines = None, []
+                    elif line.startswith('event:'):
+                        event = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data_lines.append(line[5:].strip())
+        finally:
+            response.close()
+
+    def iter_children(self, path, start_key=None, end_key=None, page_size=1000):
+        """Yields (key, value) for children of path in key order, one page at a time.
+
+        Pages are orderBy="$key" range queries (startAt/endAt, limitToFirst),
+        so memory stays at one page however large the node is.
+        """
+        after = None
+        while True:
+            params = {'orderBy': '"$key"', 'limitToFirst': page_size + (1 if after is not None else 0)}
+            lower = after if after is not None else start_key
+            if lower is not None:
+                params['startAt'] = json.dumps(lower)
+            if end_key is not None:
+                params['endAt'] = json.dumps(end_key)
+            response = self.get(path, params=params)
+            if response.status_code != 200:
+                raise requests.HTTPError(f"Reading {path} failed with HTTP {response.status_code}", response=response)
+            data = response.json()
+            if not isinstance(data, dict) or not data:
+                return
+            keys = sorted(data)
+            if after is not None and keys[0] == after:
+                keys = keys[1:]  # startAt is inclusive
+            for key in keys:
+                yield key, data[key]
+            if len(keys) < page_size:
+                return
+            after = keys[-1]
+
+    def get_with_etag(self, path):
+        """(value, etag) of path, for a later put_if_match."""
+        response = self.request('GET', path, headers={'X-Firebase-ETag': 'true'})
+        if response.status_code != 200:
+            raise requests.HTTPError(f"Reading {path} failed with HTTP {response.status_code}", response=response)
+        return response.json(), response.headers.get('ETag')
+
+    def put_if_match(self, path, data, etag):
+        """PUT only if path still has etag. Returns False if someone else wrote it first."""
+        response = self.request('PUT', path, json=data, headers={'if-match': etag})
+        if response.status_code == 412:
+            return False
+        if response.status_code >= 300:
+            raise requests.HTTPError(f"Writing {path} failed with HTTP {response.status_code}", response=response)
+        return True
+
+    def get_json(self, path, params=None):
+        """GET that returns the decoded body, or None on a non-200 response."""
+        response = self.get(path, params=params)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    # --- METRICS ---
+
+    def _record(self, method, elapsed, failed):
+        with self._stats_lock:
+            s = self._stats.setdefault(method, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            ms = elapsed * 1000
+            s['count'] += 1
+            s['total_ms'] += ms
+            if ms > s['max_ms']:
+                s['max_ms'] = ms
+            if failed:
+                s['errors'] += 1
+
+    def stats(self):
+        """Returns per-method request counts and latency (ms)."""
+        with self._stats_lock:
+            result = {}
+            for method, s in self._stats.items():
+                result[method] = dict(s, avg_ms=round(s['total_ms'] / s['count'], 2) if s['count'] else 0.0)
+            return result
+
+    def close(self):
+        self.session.close()
+
+
+# --- PUSH IDS ---
+# Same scheme as the Firebase SDKs: 8 chars of millisecond timestamp followed by
+# 12 random chars, so keys generated here sort chronologically alongside
+# server-generated ones and can be written with a plain PATCH.
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+_push_lock = threading.Lock()
+_last_push_time = 0
+_last_rand_chars = [0] * 12
+
+def push_id(now_ms=None):
+    global _last_push_time
+    with _push_lock:
+        now = int(now_ms if now_ms is not None else time.time() * 1000)
+        duplicate = (now == _last_push_time)
+        _last_push_time = now
+        prefix = push_id_prefix(now)
+
+        if not duplicate:
+            for i in range(12):
+                _last_rand_chars[i] = random.randrange(64)
+        else:
+            # Same millisecond: increment the random part so IDs stay ordered
+            i = 11
+            while i >= 0 and _last_rand_chars[i] == 63:
+                _last_rand_chars[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_rand_chars[i] += 1
+
+        return prefix + ''.join(PUSH_CHARS[c] for c in _last_rand_chars)
+
+def push_id_prefix(ms):
+    """The 8-char timestamp part of a push ID for ms.
+
+    Every push ID created before ms sorts below this string, so it works as
+    an endAt bound for orderBy="$key" range queries.
+    """
+    ms = int(ms)
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[ms % 64])
+        ms //= 64
+    return ''.join(reversed(time_chars))
+
+def push_id_time(key):
+    """Milliseconds encoded in the first 8 chars of a push ID (None if not one)."""
+    if not isinstance(key, str) or len(key) < 8:
+        return None
+    try:
+        value = 0
+        for ch in key[:8]:
+            value = value * 64 + PUSH_CHARS.index(ch)
+        return value
+    except (ValueError, TypeError):
+        return None
+
+
+# --- CONCURRENT FETCHES ---
+# Routes that need several independent reads start them all at once and
+# wait for the slowest, instead of paying each round-trip in turn. Under
+# the gevent worker (gunicorn.conf.py) the pool's threads are greenlets, so
+# waiting costs no OS thread; under sync/gthread workers they are real
+# threads that release the GIL while blocked on the socket.
+_fetch_pool = None
+_fetch_pool_lock = threading.Lock()
+
+def submit(fn, *args, **kwargs):
+    """Starts fn on the shared fetch pool and returns its Future."""
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _fetch_pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="firebase-fetch")
+    return _fetch_pool.submit(fn, *args, **kwargs)
+
+def gather(*calls):
+    """Runs zero-argument callables concurrently; returns their results in order.
+
+    The last call runs on the calling thread. Exceptions are re-raised, so
+    pass callables that handle their own errors if a default is wanted.
+    """
+    if not calls:
+        return []
+    futures = [submit(call) for call in calls[:-1]]
+    last = calls[-1]()
+    return [f.result() for f in futures] + [last]
+
+
+# --- CLIENT REGISTRY ---
+# One client (and so one connection pool) per database URL, shared by every
+# thread in the process.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(base_url):
+    key = base_url.rstrip('/')
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = FirebaseClient(key)
+                _clients[key] = client
+    return client
+
+def all_stats():
+    """Latency counters for every database this process has talked to."""
+    with _clients_lock:
+        clients = list(_clients.items())
+    return {url: c.stats() for url, c in clients}
+
+def close_all():
+    with _clients_lock:
+        for c in _clients.values():
+            c.close()
+        _clients.clear()
@@ -0,0 +1,33 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:app`
+# (Procfile / render.yaml) from the working directory.
+#
+# Serving modes (GUNICORN_WORKER_CLASS):
+#   gevent  - default when gevent is installed. Sockets are cooperative, so
+#             a worker keeps serving while routes wait on Firebase, and
+#             firebase_client.gather() fans reads out as greenlets. This
+#             is the mode for many dashboards / open /api/live_stream tabs.
+#   gthread - fallback: a fixed pool of GUNICORN_THREADS threads per worker.
+#   sync    - the old behaviour; one request per worker at a time.
+# Compare them with: python bench_concurrency.py. On /settings with 50
+# clients and a 100 ms upstream (2 workers) that measured roughly:
+#   sync 23 req/s, gthread 72 req/s, gevent 85 req/s  (memory auth cache)
+#   gthread 103 req/s, gevent 111 req/s               (sqlite auth cache)
+# The shared cache backends use a fixed connection pool (cache_backend.
+# ConnectionPool), so greenlets don't each open their own connection.
+import os
+
+# /api/live_stream keeps one connection open per dashboard tab. With the
+# gevent worker each idle connection is a greenlet instead of a thread, so
+# one worker can hold thousands of them.
+try:
+    import gevent  # noqa: F401
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+except ImportError:
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Workers share nothing (caches, live stream channels), so keep this small
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 5000))  # gevent
+threads = int(os.environ.get('GUNICORN_THREADS', 64))  # gthread
+timeout = 120
+keepalive = 75
@@ -0,0 +1,413 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+import firebase_client
+
+# Configuration
+DATA_DIR = os.environ.get('EAGLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+HISTORY_INDEX_PATH = os.environ.get('HISTORY_INDEX_PATH', os.path.join(DATA_DIR, 'history.sqlite3'))
+SYNC_INTERVAL = 5  # Seconds between incremental pulls from Firebase per factory
+SYNC_OVERLAP_MS = 10 * 60 * 1000  # Re-read this much before the last key (late journal replays)
+SYNC_PAGE_SIZE = 1000
+# Seconds a request may spend backfilling an empty index; the rest is picked up
+# by the following requests, which meanwhile read Firebase directly
+SYNC_BUDGET = float(os.environ.get('HISTORY_SYNC_BUDGET', 2))
+FALLBACK_MAX_PAGES = 5  # History pages scanned per direct (not yet indexed) request
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+# Node in each factory's database recording the latest purge (clear logs /
+# retention), so every instance's index forgets what was deleted
+PURGE_MARKER_PATH = "history_purge"
+
+# Tab filters on the history page -> event types. SYSTEM is a flag set at
+# ingest (no event type, or a pressure/battery/tank source).
+TYPE_GROUPS = {
+    'ALARM': ('ALARM',),
+    'STATUS': ('STATUS_CHANGE', 'MODE_CHANGE'),
+}
+SYSTEM_SOURCES = ('pressure', 'battery', 'tank')
+
+
+def encode_cursor(ts, key):
+    return base64.urlsafe_b64encode(f"{ts}:{key}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(ts, key) from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, key = raw.split(':', 1)
+        return int(ts), key
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def fts_query(text):
+    """User search text -> FTS5 query: every word must match as a prefix."""
+    words = [w.replace('"', '') for w in text.split()]
+    return ' '.join(f'"{w}"*' for w in words if w)
+
+
+def event_time(record, key):
+    ts = record.get('timestamp') or record.get('start_time')
+    try:
+        return int(ts)
+    except (TypeError, ValueError):
+        return firebase_client.push_id_time(key)
+
+
+def is_system(record):
+    name = str(record.get('pump_name') or '').lower()
+    return not record.get('event_type') or any(s in name for s in SYSTEM_SOURCES)
+
+
+def matches(record, event_type=None, pump=None, q=None):
+    """Same filters as HistoryIndex.query, for records read straight from Firebase."""
+    if event_type:
+        if event_type == 'SYSTEM':
+            if not is_system(record):
+                return False
+        elif record.get('event_type') not in TYPE_GROUPS.get(event_type, (event_type,)):
+            return False
+    if pump and str(record.get('pump_name') or '').lower() != pump.lower():
+        return False
+    if q and q.strip():
+        text = ' '.join(str(record.get(f) or '') for f in ('message', 'pump_name', 'event_type', 'date_formatted'))
+        tokens = re.findall(r'\w+', text.lower())
+        for word in re.findall(r'\w+', q.lower()):
+            if not any(t.startswith(word) for t in tokens):
+                return False
+    return True
+
+
+def firebase_page(factory, event_type=None, pump=None, q=None, before=None, limit=DEFAULT_LIMIT):
+    """One page like HistoryIndex.query, read from Firebase newest-first.
+
+    Used while the local index is still backfilling. Filters are applied
+    here, over at most FALLBACK_MAX_PAGES pages of /history per call; if
+    that runs out first the page is short and `next` continues the scan.
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    end_key = decode_cursor(before)[1] if before else None
+    client = firebase_client.get_client(factory)
+
+    events = []
+    exhausted = False
+    for _ in range(FALLBACK_MAX_PAGES):
+        params = {'orderBy': '"$key"', 'limitToLast': SYNC_PAGE_SIZE + 1}
+        if end_key is not None:
+            params['endAt'] = json.dumps(end_key)
+        data = client.get_json('history', params=params)
+        keys = sorted((k for k in (data or {}) if end_key is None or k < end_key), reverse=True)
+        for key in keys:
+            record = data[key]
+            if isinstance(record, dict) and matches(record, event_type, pump, q):
+                events.append((key, record))
+        if len(keys) < SYNC_PAGE_SIZE or len(events) > limit:
+            exhausted = len(keys) < SYNC_PAGE_SIZE
+            break
+        end_key = keys[-1]
+
+    page = []
+    for key, record in events[:limit]:
+        event = dict(record)
+        event['key'] = key
+        page.append(event)
+    if len(events) > limit:
+        last_key, last = events[limit - 1]
+        next_cursor = encode_cursor(event_time(last, last_key), last_key)
+    elif not exhausted and end_key is not None:
+        next_cursor = encode_cursor(firebase_client.push_id_time(end_key) or 0, end_key)
+    else:
+        next_cursor = None
+    return {"events": page, "next": next_cursor}
+
+
+def record_purge(factory, before_ms=None):
+    """Publishes a purge of factory's history before before_ms and applies it locally.
+
+    before_ms=None records a clear-all: every index drops the factory's
+    events and backfills again. Other instances' indexes pick the marker
+    up on their next sync().
+    """
+    client = firebase_client.get_client(factory)
+    marker = client.get_json(PURGE_MARKER_PATH)
+    generation = uuid.uuid4().hex
+    if before_ms is None:
+        marker = {"generation": generation, "before": int(time.time() * 1000), "all": True}
+    else:
+        if isinstance(marker, dict) and isinstance(marker.get('before'), (int, float)):
+            before_ms = max(before_ms, marker['before'])  # A later, narrower purge doesn't undo a wider one
+        marker = {"generation": generation, "before": int(before_ms)}
+    response = client.put(PURGE_MARKER_PATH, marker)
+    if response.status_code >= 300:
+        print(f"Failed to record history purge: HTTP {response.status_code}")
+    index = get_index()
+    index.apply_purge(factory, marker)
+    index._set_generation(factory, generation)
+
+
+class HistoryIndex:
+    """Local, queryable copy of every factory's /history.
+
+    Events are indexed by (factory, time) alone and together with event type,
+    pump name and the SYSTEM flag, plus an FTS5 table over the text fields,
+    so any filter combination is an index range scan. Pages are keyset
+    cursors on (timestamp, key), newest first: a page costs the same on
+    month six as on day one.
+
+    Events reach the index from the EventWriter as they are queued and from
+    sync(), which pulls anything newer than the last key seen from Firebase.
+    An empty index is backfilled a time-boxed slice per sync(); ready() says
+    when it is complete and queries can be served from it.
+    """
+
+    def __init__(self, path=HISTORY_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._sync_locks = {}
+        self._sync_locks_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY, factory TEXT NOT NULL, key TEXT NOT NULL,"
+                " ts INTEGER NOT NULL, event_type TEXT, pump_name TEXT COLLATE NOCASE,"
+                " system INTEGER NOT NULL, message TEXT, date_formatted TEXT, record TEXT NOT NULL,"
+                " UNIQUE (factory, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_by_time ON events (factory, ts, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_by_type ON events (factory, event_type, ts, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_by_pump ON events (factory, pump_name, ts, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_by_system ON events (factory, system, ts, key)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " factory TEXT PRIMARY KEY, last_key TEXT, synced_at REAL NOT NULL,"
+                " complete INTEGER NOT NULL DEFAULT 0, generation TEXT)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sync_state)")]
+            if 'complete' not in columns:
+                # Indexes from before resumable backfills were always synced in full
+                conn.execute("ALTER TABLE sync_state ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+                conn.execute("ALTER TABLE sync_state ADD COLUMN generation TEXT")
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+                    " message, pump_name, event_type, date_formatted,"
+                    " content='events', content_rowid='id', tokenize='unicode61')"
+                )
+                self.fts = True
+            except sqlite3.OperationalError:
+                print("SQLite built without FTS5 - history search falls back to LIKE")
+                self.fts = False
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- WRITE SIDE ---
+
+    def add(self, factory, events):
+        """Indexes [(key, record), ...]. Keys already indexed are skipped. Returns how many were new."""
+        conn = self._conn()
+        added = 0
+        with conn:
+            for key, record in events:
+                if not isinstance(record, dict):
+                    continue
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO events (factory, key, ts, event_type, pump_name, system, message, date_formatted, record)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (factory, key, event_time(record, key), record.get('event_type'), record.get('pump_name'),
+                     int(is_system(record)), record.get('message'), record.get('date_formatted'), json.dumps(record))
+                )
+                if cur.rowcount and self.fts:
+                    conn.execute(
+                        "INSERT INTO events_fts (rowid, message, pump_name, event_type, date_formatted) VALUES (?, ?, ?, ?, ?)",
+                        (cur.lastrowid, record.get('message'), record.get('pump_name'),
+                         record.get('event_type'), record.get('date_formatted'))
+                    )
+                added += cur.rowcount
+        return added
+
+    def forget(self, factory, before_ms=None):
+        """Drops indexed events older than before_ms (all of them when None)."""
+        conn = self._conn()
+        where, args = "factory = ?", (factory,)
+        if before_ms is not None:
+            where, args = "factory = ? AND ts < ?", (factory, before_ms)
+        with conn:
+            if self.fts:
+                # External-content FTS tables need the old values to delete a row
+                conn.execute(
+                    "INSERT INTO events_fts (events_fts, rowid, message, pump_name, event_type, date_formatted)"
+                    " SELECT 'delete', id, message, pump_name, event_type, date_formatted FROM events"
+                    f" WHERE {where}",
+                    args
+                )
+            cur = conn.execute(f"DELETE FROM events WHERE {where}", args)
+        return cur.rowcount
+
+    def apply_purge(self, factory, marker):
+        """Forgets what a PURGE_MARKER_PATH marker says was deleted.
+
+        A clear-all drops every event and restarts the backfill, since it
+        also took records whose time says nothing about their key.
+        """
+        if marker.get('all'):
+            self.forget(factory)
+            conn = self._conn()
+            with conn:
+                conn.execute("UPDATE sync_state SET last_key = NULL, complete = 0 WHERE factory = ?", (factory,))
+        elif isinstance(marker.get('before'), (int, float)):
+            self.forget(factory, marker['before'])
+
+    def sync(self, factory, force=False, budget=None):
+        """Pulls history newer than the last key seen. Returns how many events were new.
+
+        Throttled to once per SYNC_INTERVAL per factory across workers (the
+        timestamp lives in the database). An empty index is backfilled page
+        by page, oldest first; with a budget (seconds) the backfill stops
+        after the page that runs past it and the next call resumes there.
+        Every sync first applies any purge recorded at PURGE_MARKER_PATH.
+        """
+        with self._sync_locks_lock:
+            lock = self._sync_locks.setdefault(factory, threading.Lock())
+        with lock:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT last_key, synced_at, complete, generation FROM sync_state WHERE factory = ?", (factory,)
+            ).fetchone()
+            last_key, complete, generation = (row[0], row[2], row[3]) if row else (None, 0, None)
+            if row and complete and not force and time.time() - row[1] < SYNC_INTERVAL:
+                return 0
+            deadline = time.time() + budget if budget is not None else None
+
+            client = firebase_client.get_client(factory)
+            marker = client.get_json(PURGE_MARKER_PATH)
+            if isinstance(marker, dict) and marker.get('generation') and marker['generation'] != generation:
+                if row:
+                    self.apply_purge(factory, marker)
+                    if marker.get('all'):
+                        last_key, complete = None, 0
+                generation = marker['generation']
+
+            start_key = last_key
+            last_time = firebase_client.push_id_time(last_key) if last_key else None
+            if complete and last_time is not None:
+                start_key = firebase_client.push_id_prefix(max(last_time - SYNC_OVERLAP_MS, 0))
+
+            added = 0
+            page = []
+            finished = True
+            for key, record in client.iter_children('history', start_key, None, SYNC_PAGE_SIZE):
+                page.append((key, record))
+                if last_key is None or key > last_key:
+                    last_key = key
+                if len(page) >= SYNC_PAGE_SIZE:
+                    added += self.add(factory, page)
+                    page = []
+                    if not complete and deadline is not None and time.time() > deadline:
+                        finished = False
+                        break
+            added += self.add(factory, page)
+
+            with conn:
+                conn.execute(
+                    "INSERT INTO sync_state (factory, last_key, synced_at, complete, generation) VALUES (?, ?, ?, ?, ?)"
+                    " ON CONFLICT (factory) DO UPDATE SET last_key = excluded.last_key, synced_at = excluded.synced_at,"
+                    "  complete = excluded.complete, generation = excluded.generation",
+                    (factory, last_key, time.time(), int(complete or finished), generation)
+                )
+            return added
+
+    def ready(self, factory):
+        """True once factory's history has been backfilled completely."""
+        row = self._conn().execute("SELECT complete FROM sync_state WHERE factory = ?", (factory,)).fetchone()
+        return bool(row and row[0])
+
+    def _set_generation(self, factory, generation):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sync_state (factory, last_key, synced_at, complete, generation) VALUES (?, NULL, 0, 0, ?)"
+                " ON CONFLICT (factory) DO UPDATE SET generation = excluded.generation",
+                (factory, generation)
+            )
+
+    # --- READ SIDE ---
+
+    def query(self, factory, event_type=None, pump=None, q=None, before=None, limit=DEFAULT_LIMIT):
+        """One page of events, newest first.
+
+        event_type is a tab group (ALARM, STATUS, SYSTEM) or a raw event
+        type; before is the cursor returned with the previous page.
+        Returns {"events": [...], "next": cursor or None}.
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where = ["factory = ?"]
+        args = [factory]
+
+        if event_type:
+            if event_type == 'SYSTEM':
+                where.append("system = 1")
+            else:
+                types = TYPE_GROUPS.get(event_type, (event_type,))
+                where.append(f"event_type IN ({', '.join('?' * len(types))})")
+                args.extend(types)
+        if pump:
+            where.append("pump_name = ?")
+            args.append(pump)
+        if q and q.strip():
+            if self.fts:
+                where.append("id IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?)")
+                args.append(fts_query(q))
+            else:
+                where.append("(message LIKE ? OR pump_name LIKE ? OR event_type LIKE ? OR date_formatted LIKE ?)")
+                args.extend([f"%{q.strip()}%"] * 4)
+        if before:
+            ts, key = decode_cursor(before)
+            where.append("(ts, key) < (?, ?)")
+            args.extend([ts, key])
+
+        rows = self._conn().execute(
+            f"SELECT key, ts, record FROM events WHERE {' AND '.join(where)}"
+            " ORDER BY ts DESC, key DESC LIMIT ?",
+            args + [limit + 1]
+        ).fetchall()
+
+        events = []
+        for key, ts, record in rows[:limit]:
+            event = json.loads(record)
+            event['key'] = key
+            events.append(event)
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return {"events": events, "next": next_cursor}
+
+    def count(self, factory):
+        return self._conn().execute("SELECT COUNT(*) FROM events WHERE factory = ?", (factory,)).fetchone()[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Process-wide HistoryIndex (opened lazily)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = HistoryIndex()
+    return _index
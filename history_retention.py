@@ -0,0 +1,89 @@
+import json
+
+import firebase_client
+import history_index
+
+# Configuration
+PAGE_SIZE = 1000  # Keys fetched per range query
+DELETE_CHUNK_SIZE = 500  # Keys nulled per multi-path PATCH
+
+
+def _page_keys(client, path, end_key, start_key=None, limit=PAGE_SIZE):
+    """Next page of child keys under path, in key order, up to end_key.
+
+    RTDB won't combine shallow=true with range queries, so this is an
+    orderBy="$key" range limited to one page; only the keys are kept.
+    """
+    params = {'orderBy': '"$key"', 'limitToFirst': limit}
+    if end_key is not None:
+        params['endAt'] = json.dumps(end_key)
+    if start_key is not None:
+        params['startAt'] = json.dumps(start_key)
+    response = client.get(path, params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"Listing {path} failed: HTTP {response.status_code}")
+    data = response.json()
+    if not isinstance(data, dict):
+        return []
+    return sorted(data)
+
+
+def _delete_keys(client, path, keys):
+    """Nulls keys under path, DELETE_CHUNK_SIZE children per PATCH."""
+    deleted = 0
+    for i in range(0, len(keys), DELETE_CHUNK_SIZE):
+        chunk = keys[i:i + DELETE_CHUNK_SIZE]
+        response = client.patch(path, {key: None for key in chunk})
+        if response.status_code >= 300:
+            raise RuntimeError(f"Deleting from {path} failed: HTTP {response.status_code}")
+        deleted += len(chunk)
+    return deleted
+
+
+def purge(base_url, before_ms=None, path="history", progress=None):
+    """Deletes every child of path whose push-ID key is older than before_ms.
+
+    History keys are push IDs, so their order is their age: the cutoff
+    becomes a key bound and old records are found with paged key-range
+    queries instead of a scan by timestamp. Each page is deleted with
+    chunked multi-path PATCHes before the next one is fetched, so memory
+    stays bounded however large the backlog is. before_ms=None clears the
+    whole node: it is paged with no upper bound, so keys that are not push
+    IDs (or are dated ahead of the clock) go too.
+
+    progress(deleted, pages) is called after every page. Returns the number
+    of records deleted.
+    """
+    client = firebase_client.get_client(base_url)
+    end_key = firebase_client.push_id_prefix(before_ms) if before_ms is not None else None
+
+    deleted = 0
+    pages = 0
+    start_key = None
+    while True:
+        keys = _page_keys(client, path, end_key, start_key)
+        if start_key is not None and keys and keys[0] == start_key:
+            keys = keys[1:]  # startAt is inclusive
+        if not keys:
+            break
+        deleted += _delete_keys(client, path, keys)
+        pages += 1
+        if progress:
+            progress(deleted, pages)
+        # Resume after the last key rather than from the top, so a key the
+        # server refuses to delete can't make us loop forever
+        start_key = keys[-1]
+
+    if path == "history":
+        try:
+            history_index.record_purge(base_url, before_ms)
+        except Exception as e:
+            print(f"Failed to prune history index: {e}")
+    return deleted
+
+
+def print_progress(label):
+    """progress callback that logs like the rest of the tracker."""
+    def report(deleted, pages):
+        print(f"{label}: deleted {deleted} records ({pages} pages)")
+    return report
@@ -1,28 +1,69 @@
 import threading
 import time
-import requests
 import datetime
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import alarm_rules
+import analytics_series
+import auth_db
+import event_writer
+import firebase_client
+import history_index
+import history_retention
+import live_snapshot
+import rollup_store
+import sample_store
 
 # Configuration
-FIREBASE_DB_URL = "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app"
+FIREBASE_DB_URL = os.environ.get('FIREBASE_DB_URL', "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app")
 POLL_INTERVAL = 5  # Seconds - Increased to reduce load
 HISTORY_RETENTION_DAYS = 30
+FACTORY_SYNC_INTERVAL = 60  # Seconds between re-reads of the factory list
+TRACKER_WORKERS = int(os.environ.get('TRACKER_WORKERS', 32))  # Concurrent factory polls
+# 'stream' holds one RTDB event-stream per factory and only polls while it is down;
+# 'poll' is the old behaviour (limitToLast=1 every POLL_INTERVAL)
+TRACKER_MODE = os.environ.get('TRACKER_MODE', 'stream')
+STREAM_MAX_FAILURES = 5  # Consecutive stream failures before falling back to polling
+STREAM_RETRY_INTERVAL = 300  # Seconds spent polling before trying the stream again
+RULES_REFRESH_INTERVAL = 60  # Seconds between re-reads of a factory's alarm_rules
+# Progress is checkpointed to the factory's database (last key + state machine)
+# so a restart or an outage resumes where it stopped instead of at the newest sample
+CHECKPOINT_PATH = "tracker_checkpoint"
+CHECKPOINT_INTERVAL = 30  # Seconds; a checkpoint is also written after every event
+CATCHUP_PAGE_SIZE = 500  # live_data samples per catch-up read
+CATCHUP_MAX_DAYS = float(os.environ.get('CATCHUP_MAX_DAYS', 7))  # Older gaps are skipped, not replayed
 
 class HistoryTracker:
-    def __init__(self):
+    """Watches every factory registered in auth_db and records its history.
+
+    Each factory gets its own FactoryTracker (state machine + Firebase
+    client). In stream mode every factory keeps an event-stream open on its
+    own thread; polls (and the daily cleanup) run on a shared thread pool. A
+    factory whose previous poll is still in flight is skipped for that tick,
+    so one slow endpoint never holds up the others.
+    """
+
+    def __init__(self, max_workers=TRACKER_WORKERS, mode=TRACKER_MODE):
         self.running = False
         self.thread = None
-        self.previous_states = {} # Store last known state of pumps { 'main': {'status': 'OFF', 'mode': 'AUTO'}, ... }
-        self.previous_tank_status = "NORMAL" # NORMAL or CRITICAL
-        self.previous_diesel_status = "NORMAL"
-        self.previous_battery_status = "NORMAL"
-        self.previous_pressure_status = "NORMAL"
+        self.max_workers = max_workers
+        self.mode = mode
+        self.factories = {}  # factory_id -> FactoryTracker
+        self.rollups = None
+        self.samples = None
+        self.writer = event_writer.EventWriter()
+        self._in_flight = {}  # factory_id -> Future
+        self._sync_requested = True
+        self._last_sync = 0
 
     def start(self):
         """Starts the background tracking thread."""
         if not self.running:
             self.running = True
+            self.rollups = rollup_store.get_store()
+            self.samples = sample_store.get_store()
+            self.writer.start()
             self.thread = threading.Thread(target=self._run_loop, daemon=True)
             self.thread.start()
             print("History Tracker Started.")
@@ -30,112 +71,385 @@ class HistoryTracker:
     def stop(self):
         """Stops the background tracking thread."""
         self.running = False
+        for factory in list(self.factories.values()):
+            factory.active = False
         if self.thread:
             self.thread.join()
+        self.writer.stop()
+        if self.samples is not None:
+            self.samples.close()
+
+    def stats(self):
+        """Per-factory tracking mode and lag, for /developer/metrics."""
+        return {factory.name: factory.stats() for factory in list(self.factories.values())}
+
+    def request_sync(self):
+        """Re-reads the factory list on the next tick (call after adding/deleting a factory)."""
+        self._sync_requested = True
+
+    def sync_factories(self):
+        """Adds trackers for new factories and drops deleted ones.
+
+        Falls back to the default database when no factories are registered.
+        """
+        # Make sure we see writes made by other workers
+        auth_db.invalidate_cache("all_factories")
+        factories = auth_db.get_factories()
+        wanted = {f['id']: f for f in factories if f.get('id') and f.get('firebase_url')}
+        if not wanted:
+            if self.factories:
+                # get_factories() also returns [] on a network error; keep
+                # the current trackers (and their state) rather than drop them
+                self._last_sync = time.time()
+                self._sync_requested = False
+                return
+            wanted = {'default': {'id': 'default', 'name': 'Default', 'firebase_url': FIREBASE_DB_URL}}
+
+        for factory_id in list(self.factories):
+            current = wanted.get(factory_id)
+            if current is None or current['firebase_url'] != self.factories[factory_id].base_url:
+                print(f"History Tracker: stopped watching {self.factories[factory_id].name}")
+                self.factories[factory_id].active = False
+                del self.factories[factory_id]
+
+        for factory_id, f in wanted.items():
+            if factory_id not in self.factories:
+                factory = FactoryTracker(factory_id, f['firebase_url'], f.get('name'), self.rollups, self.writer, self.samples)
+                self.factories[factory_id] = factory
+                if self.mode == 'stream':
+                    factory.start_stream()
+                print(f"History Tracker: watching {f.get('name', factory_id)}")
+
+        self._last_sync = time.time()
+        self._sync_requested = False
 
     def _run_loop(self):
-        """Main polling loop."""
-        last_cleanup_time = 0
-        
-        while self.running:
+        """Main scheduling loop."""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tracker") as executor:
+            while self.running:
+                try:
+                    if self._sync_requested or time.time() - self._last_sync > FACTORY_SYNC_INTERVAL:
+                        self.sync_factories()
+
+                    for factory_id, factory in list(self.factories.items()):
+                        pending = self._in_flight.get(factory_id)
+                        if pending is not None and not pending.done():
+                            continue  # Previous poll still running - don't pile up
+                        self._in_flight[factory_id] = executor.submit(factory.poll)
+
+                    for factory_id in list(self._in_flight):
+                        if factory_id not in self.factories:
+                            del self._in_flight[factory_id]
+
+                except Exception as e:
+                    print(f"History Tracker Error: {e}")
+
+                time.sleep(POLL_INTERVAL)
+
+
+class FactoryTracker:
+    """Per-factory state machine turning live_data samples into history events."""
+
+    def __init__(self, factory_id, base_url, name=None, rollups=None, writer=None, samples=None, sink=None, rules=None):
+        self.factory_id = factory_id
+        self.base_url = base_url
+        self.name = name or factory_id
+        self.client = firebase_client.get_client(base_url)
+        self.rollups = rollups
+        self.writer = writer  # EventWriter; None writes each event synchronously
+        self.samples = samples  # SampleStore (local columnar copy of live_data)
+        # Replays (replay_tracker.py): sink(record) receives every event instead of
+        # Firebase, events are stamped with the sample's time, nothing is published live
+        self.sink = sink
+        self.sample_time = None
+        self.active = True
+        self.streaming = False  # True while the event stream is delivering
+        self.last_key = None
+        self.last_sample = None
+        self.last_cleanup_time = 0
+        self._process_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._stream_thread = None
+        self.previous_states = {} # Store last known state of pumps { 'main': {'status': 'OFF', 'mode': 'AUTO'}, ... }
+        # Sensor alarms (tank, diesel, battery, pressure, ...) come from the factory's rule table
+        # (fixed when rules are passed in)
+        self.rules = alarm_rules.RuleEngine(rules if rules is not None else alarm_rules.parse_rules(alarm_rules.DEFAULT_RULES))
+        self.rules_loaded_at = float('inf') if rules is not None else 0
+        # Checkpoint / catch-up
+        self.checkpoint_loaded = False
+        self.checkpoint_saved_at = 0
+        self.events_since_checkpoint = 0
+        self.catching_up = False
+        self.catchup_samples = 0  # Samples replayed by catch-ups since start
+        self.lag_ms = None  # Age of the newest processed sample when it was processed
+        self.behind = False  # Last catch-up stopped at its deadline with samples left
+        self._catchup_lock = threading.Lock()
+
+    def poll(self):
+        """One tracking step: fetch the newest sample, check it, clean up daily.
+
+        While the event stream is up, samples arrive through it and this only
+        runs the daily cleanup.
+        """
+        try:
+            # 1. Fetch Live Data - everything since the last processed key,
+            # or just the newest sample if this factory was never tracked
+            if not self.streaming:
+                if self.catch_up() is None:
+                    key, data = self._get_latest_live_data()
+                    if data:
+                        self.process(key, data)
+
+            # 2. Daily Cleanup (Every 24 hours)
+            if time.time() - self.last_cleanup_time > 86400:
+                self._cleanup_old_history()
+                if self.samples is not None:
+                    self.samples.prune(self.base_url)
+                self.last_cleanup_time = time.time()
+
+        except Exception as e:
+            print(f"History Tracker Error ({self.name}): {e}")
+
+    def process(self, key, data):
+        """Runs one live_data sample through rollups and the state checks."""
+        with self._process_lock:
+            if self.last_key is not None and key < self.last_key:
+                return  # Already past it (a poll and the stream can overlap briefly)
+            self.last_key = key
+            self.last_sample = data
+            # Dashboards in this process can serve it without another read
+            if self.sink is None and not self.catching_up:
+                live_snapshot.publish(self.base_url, key, data)
+
+            # Fold into minute/hour/day rollups (no-op if this key was already seen)
+            if self.rollups is not None:
+                self.rollups.ingest(self.base_url, key, data)
+            # Append to the local columnar store (likewise keyed, so each sample lands once)
+            if self.samples is not None:
+                self.samples.append(self.base_url, key, data)
+
+            ts = analytics_series.parse_sample_time(data) or int(time.time() * 1000)
+            self.sample_time = ts
+
+            if 'pumps' in data:
+                self._check_pumps(data['pumps'])
+
+            # Check Sensors
+            self._refresh_rules()
+            for source, event_type, message, details in self.rules.evaluate(ts, data):
+                self._log_event(source, event_type, message, details)
+
+            sent_ms = firebase_client.push_id_time(key)
+            if sent_ms is not None:  # Keys that aren't push IDs carry no time
+                self.lag_ms = max(0, time.time() * 1000 - sent_ms)
+        # Outside the lock: the checkpoint PUT must not hold up the next sample
+        if not self.catching_up:
+            self.save_checkpoint()
+
+    # --- CHECKPOINT / CATCH-UP ---
+
+    def load_checkpoint(self):
+        """Restores last key and state machine from the factory's checkpoint (once)."""
+        if self.checkpoint_loaded or self.sink is not None:
+            return
+        saved = self.client.get_json(CHECKPOINT_PATH)  # Raises if unreachable: try again next time
+        self.checkpoint_loaded = True
+        if not isinstance(saved, dict) or not saved.get('key'):
+            return
+        saved_ms = firebase_client.push_id_time(saved['key'])
+        if saved_ms is None:
+            # Can't page live_data from a key that isn't a push ID; start afresh
+            print(f"History Tracker: {self.name} ignoring checkpoint at non push-ID key {saved['key']!r}")
+            return
+        with self._process_lock:
+            # Rule states only carry over to the same rule definitions, so load those first
+            self._refresh_rules()
+            self.last_key = saved['key']
+            self.last_sample = saved.get('sample')
+            self.previous_states = saved.get('pumps') or {}
+            self.rules.load_state(saved.get('rules'))
+            self.last_cleanup_time = (saved.get('cleaned_at') or 0) / 1000
+            self.lag_ms = max(0, time.time() * 1000 - saved_ms)
+            self.checkpoint_saved_at = time.time()
+        print(f"History Tracker: {self.name} resuming after {saved['key']}")
+
+    def save_checkpoint(self, force=False):
+        """Writes the checkpoint if an event was logged or CHECKPOINT_INTERVAL has passed."""
+        if self.sink is not None:
+            return
+        # One save at a time, so an older snapshot never lands after a newer one
+        with self._checkpoint_lock:
+            if not force and not self.events_since_checkpoint and time.time() - self.checkpoint_saved_at < CHECKPOINT_INTERVAL:
+                return
+            # Snapshot under the process lock; the network I/O happens outside it
+            with self._process_lock:
+                if self.last_key is None:
+                    return
+                checkpoint = {
+                    "key": self.last_key,
+                    "sample": self.last_sample,
+                    "pumps": {pump: dict(info) for pump, info in self.previous_states.items()},
+                    "rules": self.rules.get_state(),
+                    "cleaned_at": int(self.last_cleanup_time * 1000),
+                    "saved_at": int(time.time() * 1000)
+                }
+                events = self.events_since_checkpoint
+            # Without a background flusher (serverless tick) the events this checkpoint
+            # covers are written first, so it never gets ahead of /history
+            if self.writer is not None and not self.writer.running:
+                self.writer.flush()
+            try:
+                response = self.client.put(CHECKPOINT_PATH, checkpoint)
+                if response.status_code < 300:
+                    self.checkpoint_saved_at = time.time()
+                    with self._process_lock:
+                        self.events_since_checkpoint = max(0, self.events_since_checkpoint - events)
+            except Exception as e:
+                print(f"Failed to save tracker checkpoint ({self.name}): {e}")
+
+    def catch_up(self, deadline=None):
+        """Processes every live_data sample after the last processed key, page by page.
+
+        Returns how many samples were processed, or None when there is no
+        position to resume from (first run). Events are stamped with each
+        sample's own time. Gaps older than CATCHUP_MAX_DAYS are skipped.
+        With a deadline (epoch seconds) it stops there and checkpoints; the
+        next call carries on.
+        """
+        if not self._catchup_lock.acquire(blocking=False):
+            return 0
+        try:
+            self.load_checkpoint()
+            if self.last_key is None:
+                return None
+
+            start_key = self.last_key
+            last_ms = firebase_client.push_id_time(start_key)
+            if last_ms is None:
+                return None  # Not a push ID: nothing to page from, start like a first run
+            oldest = time.time() * 1000 - CATCHUP_MAX_DAYS * 86400000
+            if last_ms < oldest:
+                start_key = firebase_client.push_id_prefix(oldest)
+                print(f"History Tracker: {self.name} was down more than {CATCHUP_MAX_DAYS:g} days; skipping to {start_key}")
+
+            count = 0
+            self.catching_up = True
+            self.behind = False
+            try:
+                for key, data in self.client.iter_children('live_data', start_key, None, CATCHUP_PAGE_SIZE):
+                    if key <= self.last_key or not isinstance(data, dict):
+                        continue  # startAt is inclusive
+                    self.process(key, data)
+                    count += 1
+                    if deadline is not None and time.time() >= deadline:
+                        self.behind = True
+                        break
+                    if count % CATCHUP_PAGE_SIZE == 0:
+                        self.save_checkpoint(force=True)
+                        print(f"History Tracker: {self.name} catching up, {count} samples, {self.lag_ms / 1000:.0f}s behind")
+            finally:
+                self.catching_up = False
+                self.catchup_samples += count
+            if count:
+                self.save_checkpoint(force=True)
+                if count > 1:
+                    print(f"History Tracker: {self.name} caught up ({count} samples)")
+            return count
+        finally:
+            self._catchup_lock.release()
+
+    def stats(self):
+        if self.catching_up:
+            mode = "catching_up"
+        elif self.streaming:
+            mode = "stream"
+        else:
+            mode = "poll"
+        return {
+            "mode": mode,
+            "last_key": self.last_key,
+            "lag_seconds": round(self.lag_ms / 1000, 1) if self.lag_ms is not None else None,
+            "catchup_samples": self.catchup_samples,
+            "checkpoint_age_seconds": round(time.time() - self.checkpoint_saved_at, 1) if self.checkpoint_saved_at else None
+        }
+
+    # --- STREAMING ---
+
+    def start_stream(self):
+        self._stream_thread = threading.Thread(target=self._stream_loop, daemon=True, name=f"stream-{self.factory_id}")
+        self._stream_thread.start()
+
+    def _stream_loop(self):
+        """Keeps an event-stream open on live_data, reconnecting with backoff.
+
+        Each connection resumes from the last processed key (startAt), so
+        samples pushed while disconnected are replayed in order. After
+        STREAM_MAX_FAILURES consecutive failures the scheduler's polling takes
+        over for STREAM_RETRY_INTERVAL seconds.
+        """
+        failures = 0
+        while self.active:
             try:
-                # 1. Fetch Live Data
-                data = self._get_latest_live_data()
-                if data:
-                    if 'pumps' in data:
-                        self._check_pumps(data['pumps'])
-                    
-                    # Check Sensors
-                    self._check_tank(data)
-                    self._check_diesel(data)
-                    self._check_battery(data)
-                    self._check_pressure(data)
-
-                # 2. Daily Cleanup (Every 24 hours)
-                if time.time() - last_cleanup_time > 86400: 
-                    self._cleanup_old_history()
-                    last_cleanup_time = time.time()
+                # Page through anything missed first; the stream's initial
+                # snapshot then only holds the last processed sample
+                self.catch_up()
+                if self.last_key:
+                    params = {"orderBy": '"$key"', "startAt": json.dumps(self.last_key)}
+                else:
+                    params = {"orderBy": '"$key"', "limitToLast": 1}
 
+                for event, payload in self.client.stream("live_data", params=params):
+                    if not self.active:
+                        return
+                    if event in ('cancel', 'auth_revoked'):
+                        raise ConnectionError(f"Stream {event}")
+                    self.streaming = True
+                    failures = 0
+                    if event in ('put', 'patch'):
+                        self._handle_stream_event(event, payload)
             except Exception as e:
-                print(f"History Tracker Error: {e}")
-            
-            time.sleep(POLL_INTERVAL)
+                failures += 1
+                print(f"History Tracker stream error ({self.name}): {e}")
+            self.streaming = False
+
+            if failures >= STREAM_MAX_FAILURES:
+                print(f"History Tracker: {self.name} falling back to polling for {STREAM_RETRY_INTERVAL}s")
+                self._sleep(STREAM_RETRY_INTERVAL)
+                failures = 0
+            else:
+                self._sleep(min(2 ** failures, 30))
+
+    def _sleep(self, seconds):
+        end = time.time() + seconds
+        while self.active and time.time() < end:
+            time.sleep(0.5)
+
+    def _handle_stream_event(self, event, payload):
+        """Applies one put/patch event and feeds complete samples to process()."""
+        for key, sample in live_snapshot.stream_samples(event, payload, self.last_key, self.last_sample):
+            self.process(key, sample)
 
     def _get_latest_live_data(self):
         try:
             # Fetch only the last entry to minimize bandwidth
-            response = requests.get(f"{FIREBASE_DB_URL}/live_data.json?orderBy=\"$key\"&limitToLast=1")
+            response = self.client.get("live_data", params={"orderBy": '"$key"', "limitToLast": 1})
             if response.status_code == 200 and response.json():
                 raw = response.json()
                 key = list(raw.keys())[0]
-                return raw[key]
+                return key, raw[key]
         except:
-            return None
-        return None
-
-    def _check_tank(self, data):
-        """Checks tank level against critical threshold (95)."""
-        # Support both keys as per dashboard.js
-        level = float(data.get('waterLevel') or data.get('tank_level') or 0)
-        
-        current_status = "CRITICAL" if level < 95 else "NORMAL"
-        
-        if self.previous_tank_status != current_status:
-            # State change detected
-            if current_status == "CRITICAL":
-                self._log_event(
-                    "Water Tank",
-                    "ALARM",
-                    f"Critical Level Detected: {level}%",
-                    {"level": level, "threshold": 95}
-                )
-            else:
-                self._log_event(
-                    "Water Tank",
-                    "STATUS_CHANGE",
-                    f"Level Restored to Normal: {level}%",
-                    {"level": level, "threshold": 95}
-                )
-            
-            self.previous_tank_status = current_status
-
-    def _check_diesel(self, data):
-        """Checks diesel level against critical threshold (95)."""
-        level = float(data.get('dieselLevel') or data.get('diesel_level') or 0)
-        current_status = "CRITICAL" if level < 95 else "NORMAL"
-        
-        if self.previous_diesel_status != current_status:
-            if current_status == "CRITICAL":
-                self._log_event("Diesel Tank", "ALARM", f"Critical Level Detected: {level}%", {"level": level})
-            else:
-                self._log_event("Diesel Tank", "STATUS_CHANGE", f"Level Restored to Normal: {level}%", {"level": level})
-            self.previous_diesel_status = current_status
-
-    def _check_battery(self, data):
-        """Checks battery voltage (Range: 11.8 - 14.2)."""
-        volts = float(data.get('batteryVolts') or data.get('batteryVoltage') or data.get('battery_voltage') or 0)
-        # Critical if below 11.8 or above 14.2
-        current_status = "CRITICAL" if (volts < 11.8 or volts > 14.2) else "NORMAL"
-        
-        if self.previous_battery_status != current_status:
-            if current_status == "CRITICAL":
-                msg = f"Low Voltage: {volts}V" if volts < 11.8 else f"High Voltage: {volts}V"
-                self._log_event("Battery System", "ALARM", msg, {"voltage": volts})
-            else:
-                self._log_event("Battery System", "STATUS_CHANGE", f"Voltage Normal: {volts}V", {"voltage": volts})
-            self.previous_battery_status = current_status
+            return None, None
+        return None, None
 
-    def _check_pressure(self, data):
-        """Checks system pressure (Threshold: < 4.15 kg/cm²)."""
-        pressure = float(data.get('pressure') or 0)
-        current_status = "CRITICAL" if pressure < 4.15 else "NORMAL"
-        
-        if self.previous_pressure_status != current_status:
-            if current_status == "CRITICAL":
-                self._log_event("System Pressure", "ALARM", f"Low Pressure Detected: {pressure} Bar", {"pressure": pressure})
-            else:
-                self._log_event("System Pressure", "STATUS_CHANGE", f"Pressure Normal: {pressure} Bar", {"pressure": pressure})
-            self.previous_pressure_status = current_status
+    def _refresh_rules(self):
+        """Re-reads alarm_rules every RULES_REFRESH_INTERVAL; keeps the current rules on failure."""
+        if time.time() - self.rules_loaded_at < RULES_REFRESH_INTERVAL:
+            return
+        self.rules_loaded_at = time.time()
+        try:
+            self.rules.set_rules(alarm_rules.load_rules(self.client))
+        except Exception as e:
+            print(f"Failed to load alarm rules ({self.name}): {e}")
 
     def _check_pumps(self, bumps_data):
         """Checks for state changes in pumps (Status, Mode)."""
@@ -177,9 +491,10 @@ class HistoryTracker:
                 self.previous_states[pump_name]['mode'] = current_mode
 
     def _log_event(self, pump_name, event_type, message, details=None):
-        """Pushes a new generic event record to Firebase."""
+        """Queues a new generic event record for Firebase (batched by the EventWriter)."""
         
-        now = time.time()
+        # Replayed and caught-up samples are logged at the time they were taken
+        now = time.time() if self.sink is None and not self.catching_up else self.sample_time / 1000
         record = {
             "timestamp": int(now * 1000), # JS Timestamp
             "date_formatted": datetime.datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S'),
@@ -189,26 +504,35 @@ class HistoryTracker:
             "details": details or {}
         }
         
+        if self.sink is not None:
+            self.sink(record)
+            return
+        self.events_since_checkpoint += 1
+
         try:
-            requests.post(f"{FIREBASE_DB_URL}/history.json", json=record)
-            print(f"Recorded Event: [{record['date_formatted']}] {pump_name}: {message}")
+            if self.writer is not None:
+                key = self.writer.enqueue(self.base_url, record)
+            else:
+                key = self.client.post("history", record).json()['name']
+            print(f"Recorded Event: [{record['date_formatted']}] {self.name} / {pump_name}: {message}")
         except Exception as e:
             print(f"Failed to save history: {e}")
+            return
+
+        try:
+            history_index.get_index().add(self.base_url, [(key, record)])
+        except Exception as e:
+            print(f"Failed to index history event: {e}")
 
     def _cleanup_old_history(self):
         """Deletes history records older than HISTORY_RETENTION_DAYS."""
         try:
-            print("Running History Cleanup...")
+            print(f"Running History Cleanup ({self.name})...")
             cutoff_timestamp = (time.time() - (HISTORY_RETENTION_DAYS * 86400)) * 1000
-            
-            # Query by timestamp
-            query = f'{FIREBASE_DB_URL}/history.json?orderBy="timestamp"&endAt={cutoff_timestamp}'
-            response = requests.get(query)
-            
-            if response.status_code == 200 and response.json():
-                items_to_delete = response.json()
-                for key in items_to_delete:
-                    requests.delete(f"{FIREBASE_DB_URL}/history/{key}.json")
-                print(f"Deleted {len(items_to_delete)} old history records.")
+            deleted = history_retention.purge(
+                self.base_url, cutoff_timestamp,
+                progress=history_retention.print_progress(f"History Cleanup ({self.name})")
+            )
+            print(f"Deleted {deleted} old history records.")
         except Exception as e:
             print(f"Cleanup Error: {e}")
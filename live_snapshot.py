@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+
+import cache_backend
+import firebase_client
+
+# Configuration
+# Pages poll /api/live_data every 2 s; with a 1 s TTL every open tab of a
+# factory shares one upstream read per second at most.
+LIVE_CACHE_TTL = float(os.environ.get('LIVE_CACHE_TTL', 1.0))
+
+LIVE_CACHE = cache_backend.MemoryCache(ttl=LIVE_CACHE_TTL, max_entries=256)
+
+
+class Snapshot:
+    """Latest live_data sample for one factory, pre-serialized for responses."""
+
+    __slots__ = ('key', 'body', 'etag', 'fetched_at')
+
+    def __init__(self, key, data):
+        self.key = key
+        self.body = json.dumps(data if data is not None else {})
+        self.etag = hashlib.sha1(self.body.encode()).hexdigest()[:20]
+        self.fetched_at = time.time()
+
+
+def fetch_latest(base_url):
+    """One limitToLast=1 read. Raises on upstream errors so nothing is cached."""
+    response = firebase_client.get_client(base_url).get(
+        "live_data", params={"orderBy": '"$key"', "limitToLast": 1}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Firebase Error (HTTP {response.status_code})")
+    data = response.json()
+    if data:
+        # Firebase returns { "timestamp_key": { ...data... } }
+        key = list(data.keys())[0]
+        return Snapshot(key, data[key])
+    return Snapshot(None, {})
+
+
+def get_latest(base_url):
+    """Cached latest sample for base_url.
+
+    Concurrent callers on a miss share a single upstream fetch
+    (single-flight in cache_backend).
+    """
+    return LIVE_CACHE.get_or_load(base_url, lambda: fetch_latest(base_url))
+
+
+def publish(base_url, key, data):
+    """Primes the cache from a sample that already arrived (e.g. the tracker's stream)."""
+    entry = LIVE_CACHE.peek(base_url)  # peek: don't count this as a hit/miss
+    if entry is not None and entry[0].key is not None and key is not None and key < entry[0].key:
+        return
+    LIVE_CACHE.set(base_url, Snapshot(key, data))
+
+
+def stream_samples(event, payload, last_key, last_sample):
+    """Complete (key, sample) pairs carried by one live_data put/patch event.
+
+    last_key/last_sample are the newest sample the caller already holds;
+    patches and nested-field updates are applied on top of it. Pairs come
+    out in key order.
+    """
+    if not isinstance(payload, dict):
+        return []
+    parts = [p for p in (payload.get('path') or '/').split('/') if p]
+    data = payload.get('data')
+
+    if not parts:
+        # Whole-query snapshot (put) or several children (patch): {key: sample}
+        if not isinstance(data, dict):
+            return []
+        # A root-level patch replaces whole children, so every value is a full sample
+        return [(key, data[key]) for key in sorted(data)
+                if isinstance(data[key], dict) and (last_key is None or key > last_key
+                                                    or (event == 'patch' and key == last_key))]
+
+    key = parts[0]
+    if len(parts) == 1:
+        if not isinstance(data, dict):
+            return []
+        if event == 'patch' and key == last_key and last_sample is not None:
+            return [(key, dict(last_sample, **data))]
+        return [(key, data)]
+
+    # Update of a nested field inside a sample we already hold
+    if key != last_key or last_sample is None:
+        return []
+    sample = json.loads(json.dumps(last_sample))
+    node = sample
+    for p in parts[1:-1]:
+        node = node.setdefault(p, {})
+    if event == 'patch' and isinstance(data, dict):
+        node = node.setdefault(parts[-1], {})
+        node.update(data)
+    else:
+        node[parts[-1]] = data
+    return [(key, sample)]
+
+
+def stats():
+    return LIVE_CACHE.stats()
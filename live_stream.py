@@ -0,0 +1,197 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import firebase_client
+import live_snapshot
+
+# Configuration
+KEEPALIVE_INTERVAL = 15  # Seconds between SSE comments so proxies keep idle connections open
+CHANNEL_IDLE_TIMEOUT = 60  # Seconds a factory's upstream stays open with no subscribers
+SUBSCRIBER_QUEUE_SIZE = 32  # Pending events per client before it is resynced with a full snapshot
+RECONNECT_MAX_DELAY = 30
+CHANNEL_MAX_SUBSCRIBERS = int(os.environ.get('LIVE_STREAM_MAX_SUBSCRIBERS', 5000))
+
+
+def diff(old, new):
+    """Fields of new that differ from old; nested dicts are diffed recursively.
+
+    Removed fields come back as None so the client can drop them.
+    """
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                changes[key] = nested
+        elif value != previous or key not in old:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Channel:
+    """One upstream live_data stream for a factory, fanned out to every subscriber.
+
+    The upstream connection is opened with the first subscriber and closed
+    once nobody has been listening for CHANNEL_IDLE_TIMEOUT seconds.
+    Each subscriber gets the full sample on connect and then only the fields
+    that changed.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.client = firebase_client.get_client(base_url)
+        self.last_key = None
+        self.last_sample = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._idle_since = time.time()
+        self._thread = None
+        self.samples = 0
+        self.broadcasts = 0
+        self.resyncs = 0
+
+    # --- SUBSCRIBERS ---
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= CHANNEL_MAX_SUBSCRIBERS:
+                raise RuntimeError("Too many live stream clients")
+            self._subscribers.add(q)
+            if self.last_sample is not None:
+                q.put_nowait(format_event('snapshot', self.last_sample))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="live-stream")
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+            if not self._subscribers:
+                self._idle_since = time.time()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _broadcast(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Slow client: drop what it hasn't read and start it over from the full sample
+                self._resync(q)
+        self.broadcasts += 1
+
+    def _resync(self, q):
+        try:
+            while True:
+                q.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            q.put_nowait(format_event('snapshot', self.last_sample))
+        except queue.Full:
+            pass
+        self.resyncs += 1
+
+    # --- UPSTREAM ---
+
+    def _idle(self):
+        with self._lock:
+            if not self._subscribers and time.time() - self._idle_since > CHANNEL_IDLE_TIMEOUT:
+                self._thread = None
+                return True
+        return False
+
+    def _run(self):
+        failures = 0
+        while not self._idle():
+            try:
+                # Only the newest sample matters here, no replay on reconnect
+                for event, payload in self.client.stream("live_data", params={"orderBy": '"$key"', "limitToLast": 1}):
+                    if event in ('cancel', 'auth_revoked'):
+                        raise ConnectionError(f"Stream {event}")
+                    failures = 0
+                    if event in ('put', 'patch'):
+                        for key, sample in live_snapshot.stream_samples(event, payload, self.last_key, self.last_sample):
+                            self._on_sample(key, sample)
+                    if self._idle():
+                        return
+            except Exception as e:
+                failures += 1
+                print(f"Live stream error ({self.base_url}): {e}")
+            time.sleep(min(2 ** failures, RECONNECT_MAX_DELAY))
+
+    def _on_sample(self, key, sample):
+        previous = self.last_sample
+        if self.last_key is not None and key < self.last_key:
+            return
+        self.last_key, self.last_sample = key, sample
+        self.samples += 1
+        live_snapshot.publish(self.base_url, key, sample)
+
+        if previous is None:
+            self._broadcast(format_event('snapshot', sample))
+            return
+        changes = diff(previous, sample)
+        if changes:
+            self._broadcast(format_event('delta', changes))
+
+    def stats(self):
+        return {
+            "subscribers": self.subscriber_count(),
+            "connected": self._thread is not None and self._thread.is_alive(),
+            "samples": self.samples,
+            "broadcasts": self.broadcasts,
+            "resyncs": self.resyncs,
+        }
+
+
+# --- CHANNEL REGISTRY ---
+_channels = {}
+_channels_lock = threading.Lock()
+
+def get_channel(base_url):
+    key = base_url.rstrip('/')
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            channel = Channel(key)
+            _channels[key] = channel
+    return channel
+
+
+def events(base_url):
+    """SSE body generator for one client of base_url's factory."""
+    channel = get_channel(base_url)
+    q = channel.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                yield q.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+    finally:
+        # Runs when the client disconnects (generator closed by the server)
+        channel.unsubscribe(q)
+
+
+def all_stats():
+    with _channels_lock:
+        channels = list(_channels.items())
+    return {url: c.stats() for url, c in channels}
@@ -1,47 +1,89 @@
 import time
-import requests
 import json
 import os
+import firebase_client
 
 # Configuration
-FIREBASE_URL = "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app"
+FIREBASE_URL = os.environ.get('FIREBASE_DB_URL', "https://eagleai-fotia-default-rtdb.asia-southeast1.firebasedatabase.app")
 DATA_PATH = "live_data"
 
-def monitor():
+def print_sample(key, value):
+    print(f"\n[{time.strftime('%H:%M:%S')}] 🟢 New Data Received ({key}):")
+    print(json.dumps(value, indent=4))
+
+def watch_stream(client, last_key):
+    """Prints new entries from the RTDB event-stream. Returns the last key seen."""
+    if last_key:
+        params = {"orderBy": '"$key"', "startAt": json.dumps(last_key)}
+    else:
+        params = {"orderBy": '"$key"', "limitToLast": 1}
+
+    for event, payload in client.stream(DATA_PATH, params=params):
+        if event in ('cancel', 'auth_revoked'):
+            raise ConnectionError(f"Stream {event}")
+        if event not in ('put', 'patch') or not payload:
+            continue
+
+        path = payload.get('path', '/')
+        data = payload.get('data')
+        if path == '/' and isinstance(data, dict):
+            items = sorted(data.items())
+        elif data is not None:
+            items = [(path.strip('/').split('/')[0], data)]
+        else:
+            items = []
+
+        for key, value in items:
+            if last_key is None or key > last_key or event == 'patch':
+                print_sample(key, value)
+                last_key = max(key, last_key or key)
+    return last_key
+
+def poll_once(client, last_key):
+    # Fetch only the latest entry to save bandwidth
+    response = client.get(DATA_PATH, params={"orderBy": '"$key"', "limitToLast": 1})
+
+    if response.status_code == 200:
+        data = response.json()
+
+        if data:
+            # Get the key and value
+            key = list(data.keys())[0]
+            value = data[key]
+
+            # Only print if it's new data
+            if key != last_key:
+                print_sample(key, value)
+                last_key = key
+        else:
+            print(f"\n[{time.strftime('%H:%M:%S')}] ⚠️ No data found at path.")
+    else:
+        print(f"\n❌ Error {response.status_code}: {response.text}")
+    return last_key
+
+def monitor(use_stream=True):
     print(f"--- [CONNECTING] Firebase Monitor: {FIREBASE_URL} ---")
-    print(f"--- [WATCHING] Path: /{DATA_PATH} ---")
+    print(f"--- [WATCHING] Path: /{DATA_PATH} ({'stream' if use_stream else 'polling'}) ---")
     print("Press Ctrl+C to stop.\n")
 
+    client = firebase_client.get_client(FIREBASE_URL)
     last_key = None
+    failures = 0
 
     try:
         while True:
-            try:
-                # Fetch only the latest entry to save bandwidth
-                url = f"{FIREBASE_URL}/{DATA_PATH}.json?orderBy=\"$key\"&limitToLast=1"
-                response = requests.get(url)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data:
-                        # Get the key and value
-                        key = list(data.keys())[0]
-                        value = data[key]
-                        
-                        # Only print if it's new data
-                        if key != last_key:
-                            print(f"\n[{time.strftime('%H:%M:%S')}] 🟢 New Data Received ({key}):")
-                            print(json.dumps(value, indent=4))
-                            last_key = key
-                        else:
-                            # print(".", end="", flush=True) # Heartbeat
-                            pass
-                    else:
-                        print(f"\n[{time.strftime('%H:%M:%S')}] ⚠️ No data found at path.")
-                else:
-                    print(f"\n❌ Error {response.status_code}: {response.text}")
+            if use_stream and failures < 3:
+                try:
+                    last_key = watch_stream(client, last_key)
+                except Exception as e:
+                    failures += 1
+                    print(f"\n❌ Stream Error ({failures}/3): {e}")
+                    time.sleep(min(2 ** failures, 30))
+                continue
 
+            # Polling fallback
+            try:
+                last_key = poll_once(client, last_key)
             except Exception as e:
                 print(f"\n❌ Connection Error: {e}")
 
@@ -51,4 +93,5 @@ def monitor():
         print("\n\n🛑 Monitor Stopped.")
 
 if __name__ == "__main__":
-    monitor()
+    import sys
+    monitor(use_stream='--poll' not in sys.argv)
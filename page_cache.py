@@ -0,0 +1,67 @@
+import hashlib
+
+from flask import render_template, request, session
+
+import auth_db
+import cache_backend
+
+# Configuration
+PAGE_CACHE_TTL = 600  # Seconds; feature changes invalidate sooner through the revision
+# The feature revision only reaches other workers/instances through a shared
+# auth cache (sqlite/redis). With the per-process one a flag toggled elsewhere
+# is only picked up when the page expires, so keep pages briefly.
+PAGE_CACHE_UNSHARED_TTL = 30
+PAGE_CACHE_MAX_ENTRIES = 512
+
+# Session values the page templates print (nav, user menu, factory name/URL).
+# They are part of the key so a cached page never shows another user's details.
+VIEWER_KEYS = ('role', 'name', 'username', 'factory_name', 'factory_url')
+
+PAGE_CACHE = cache_backend.MemoryCache(
+    ttl=PAGE_CACHE_TTL if auth_db.AUTH_CACHE.shared else PAGE_CACHE_UNSHARED_TTL,
+    max_entries=PAGE_CACHE_MAX_ENTRIES
+)
+
+
+class Page:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+
+
+def page_key(template):
+    """Cache key: template, factory, feature revision and viewer.
+
+    Returns None when the feature revision can't be read, so the page is
+    rendered fresh rather than risk serving stale feature flags.
+    """
+    factory_id = session.get('factory_id') or ''
+    revision = auth_db.feature_revision(factory_id)
+    if revision is None:
+        return None
+    viewer = '|'.join(str(session.get(k, '')) for k in VIEWER_KEYS)
+    viewer_hash = hashlib.sha1(viewer.encode()).hexdigest()[:16]
+    return f"{template}|{factory_id}|{revision}|{viewer_hash}"
+
+
+def render_page(template):
+    """render_template for the mostly-static dashboard pages.
+
+    A hit skips both the render and the inject_features context processor.
+    Responses carry an ETag so a reload with an unchanged page is a 304.
+    """
+    key = page_key(template)
+    if key is None:
+        return render_template(template)
+    page = PAGE_CACHE.get_or_load(key, lambda: Page(render_template(template)))
+
+    headers = {'ETag': f'"{page.etag}"', 'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains(page.etag):
+        return '', 304, headers
+    return page.body, 200, headers
+
+
+def stats():
+    return PAGE_CACHE.stats()
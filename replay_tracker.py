@@ -0,0 +1,240 @@
+"""Replays recorded live_data through the tracker's state machine.
+
+Runs a range of stored samples through the same FactoryTracker.process()
+the live tracker uses (pump transitions + alarm rules), as fast as they can
+be read, and reports what it would have logged. Use it to try out new
+thresholds or to regenerate history for a period the tracker missed.
+
+Samples come from the factory's Firebase (paged key-range reads, next page
+fetched while the current one is processed) or from a local dump:
+    .json   a Firebase export of live_data ({key: sample}, or a whole-database
+            export containing "live_data")
+    .jsonl  one {key: sample} object per line, in key order
+(.gz versions of either work too.)
+
+Usage:
+    python replay_tracker.py --factory-id f1 --start 2025-01-01 --end 2025-01-02
+    python replay_tracker.py --dump live_data.json --rules new_rules.json -v
+    python replay_tracker.py --url https://...firebaseio.com --start ... --out events.jsonl
+    python replay_tracker.py --factory-id f1 --start ... --end ... --publish
+
+Without --out or --publish nothing is written (dry run). --out writes one
+{push key: history record} object per line; --publish writes the events to
+the factory's /history (check that the period really has no events first,
+or they will be doubled).
+"""
+import argparse
+import gzip
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+
+import alarm_rules
+import exporter
+import firebase_client
+from history_tracker import FactoryTracker
+
+PAGE_SIZE = 1000
+PREFETCH_PAGES = 4
+PROGRESS_INTERVAL = 5  # Seconds between progress lines on stderr
+
+
+# --- SAMPLE SOURCES ---
+
+def _open(path):
+    return gzip.open(path, 'rt') if path.endswith('.gz') else open(path)
+
+
+def dump_samples(path, start_key=None, end_key=None):
+    """Yields (key, sample) from a local dump, in key order, within the key range."""
+    def in_range(key):
+        return (start_key is None or key >= start_key) and (end_key is None or key <= end_key)
+
+    if path.endswith(('.jsonl', '.jsonl.gz')):
+        with _open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for key, sample in json.loads(line).items():
+                    if in_range(key) and isinstance(sample, dict):
+                        yield key, sample
+        return
+
+    with _open(path) as f:
+        data = json.load(f)
+    if isinstance(data.get('live_data'), dict):
+        data = data['live_data']
+    for key in sorted(data):
+        if in_range(key) and isinstance(data[key], dict):
+            yield key, data[key]
+
+
+def firebase_samples(base_url, start_key=None, end_key=None):
+    """Yields (key, sample) from Firebase; a reader thread stays a few pages ahead."""
+    pages = queue.Queue(maxsize=PREFETCH_PAGES)
+    done = object()
+
+    def reader():
+        page = []
+        try:
+            for item in firebase_client.get_client(base_url).iter_children('live_data', start_key, end_key, PAGE_SIZE):
+                page.append(item)
+                if len(page) >= PAGE_SIZE:
+                    pages.put(page)
+                    page = []
+            pages.put(page)
+        except Exception as e:
+            pages.put(e)
+        pages.put(done)
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        page = pages.get()
+        if page is done:
+            return
+        if isinstance(page, Exception):
+            raise page
+        for key, sample in page:
+            if isinstance(sample, dict):
+                yield key, sample
+
+
+# --- SINKS ---
+
+class EventSink:
+    """Collects replayed events: counts them, and optionally writes/prints them."""
+
+    def __init__(self, out=None, verbose=False):
+        self.out = out
+        self.verbose = verbose
+        self.count = 0
+        self.by_kind = Counter()
+
+    def __call__(self, record):
+        self.count += 1
+        self.by_kind[(record['pump_name'], record['event_type'])] += 1
+        if self.out is not None:
+            key = firebase_client.push_id(record['timestamp'])
+            self.out.write(json.dumps({key: record}) + "\n")
+        if self.verbose:
+            print(f"[{record['date_formatted']}] {record['pump_name']} {record['event_type']}: {record['message']}")
+
+
+def publish_events(base_url, path):
+    """Writes an --out file to base_url's /history through the batched EventWriter."""
+    import event_writer
+    writer = event_writer.EventWriter()
+    writer.start()
+    count = 0
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                for _, record in json.loads(line).items():
+                    writer.enqueue(base_url, record)
+                    count += 1
+    writer.stop()
+    return count
+
+
+# --- MAIN ---
+
+def resolve_factory(args):
+    """(name, base_url) from --factory-id or --url (None when replaying a dump alone)."""
+    if args.factory_id:
+        import auth_db
+        factory = auth_db.get_factory_by_id(args.factory_id)
+        if not factory:
+            sys.exit(f"Factory {args.factory_id} not found")
+        return factory.get('name') or args.factory_id, factory['firebase_url']
+    if args.url:
+        return args.url, args.url
+    return args.dump, None
+
+
+def load_rules(args, base_url):
+    if args.rules:
+        with open(args.rules) as f:
+            rules = alarm_rules.parse_rules(json.load(f))
+        if not rules:
+            sys.exit(f"No usable rules in {args.rules}")
+        return rules, args.rules
+    if base_url and not args.default_rules:
+        return alarm_rules.load_rules(firebase_client.get_client(base_url)), "factory's alarm_rules"
+    return alarm_rules.parse_rules(alarm_rules.DEFAULT_RULES), "default rules"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--factory-id', help='Read the factory registered in the system database')
+    source.add_argument('--url', help='Read this Realtime Database URL')
+    source.add_argument('--dump', help='Read a local .json/.jsonl(.gz) dump of live_data')
+    parser.add_argument('--start', help='Epoch ms or plant-local ISO date/time')
+    parser.add_argument('--end', help='Epoch ms or plant-local ISO date/time')
+    parser.add_argument('--rules', help='JSON file with the alarm rules to try')
+    parser.add_argument('--default-rules', action='store_true', help="Use the built-in rules, not the factory's")
+    parser.add_argument('--out', help='Write events as JSON lines to this file')
+    parser.add_argument('--publish', action='store_true', help="Also write the events to the factory's /history")
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print every event')
+    args = parser.parse_args()
+
+    name, base_url = resolve_factory(args)
+    if args.publish and not base_url:
+        sys.exit("--publish needs --factory-id or --url")
+    start_ms, end_ms = exporter.parse_time(args.start), exporter.parse_time(args.end)
+    start_key, end_key = exporter.key_range(start_ms, end_ms)
+    rules, rules_from = load_rules(args, base_url)
+
+    out_path = args.out
+    if args.publish and not out_path:
+        out_path = f"replay_events_{int(time.time())}.jsonl"
+    out = open(out_path, 'w') if out_path else None
+
+    sink = EventSink(out, args.verbose)
+    tracker = FactoryTracker(name, base_url or 'replay', name, sink=sink, rules=rules)
+    samples = dump_samples(args.dump, start_key, end_key) if args.dump else firebase_samples(base_url, start_key, end_key)
+
+    print(f"Replaying {name} with {len(rules)} rules ({rules_from})", file=sys.stderr)
+    count = 0
+    process_s = 0.0
+    started = last_report = time.perf_counter()
+    first_key = last_key = None
+    try:
+        for key, sample in samples:
+            t = time.perf_counter()
+            tracker.process(key, sample)
+            process_s += time.perf_counter() - t
+            count += 1
+            first_key = first_key or key
+            last_key = key
+            if t - last_report > PROGRESS_INTERVAL:
+                last_report = t
+                print(f"  {count} samples, {sink.count} events, {count / (t - started):.0f} samples/s", file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    if count:
+        span = f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(firebase_client.push_id_time(first_key) / 1000))} .. " \
+               f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(firebase_client.push_id_time(last_key) / 1000))}"
+    else:
+        span = "no samples"
+    print(f"{count} samples ({span}) -> {sink.count} events")
+    for (source, event_type), n in sorted(sink.by_kind.items()):
+        print(f"  {source:<20} {event_type:<14} {n:>6}")
+    print(f"{elapsed:.2f}s total, {count / elapsed if elapsed else 0:.0f} samples/s overall, "
+          f"{count / process_s if process_s else 0:.0f} samples/s in the state machine")
+
+    if out_path:
+        print(f"Events written to {out_path}")
+    if args.publish:
+        published = publish_events(base_url, out_path)
+        print(f"Published {published} events to {name}/history")
+
+
+if __name__ == '__main__':
+    main()
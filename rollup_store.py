@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import threading
+import time
+
+import analytics_series
+
+# Configuration
+DATA_DIR = os.environ.get('EAGLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+ROLLUP_DB_PATH = os.environ.get('ROLLUP_DB_PATH', os.path.join(DATA_DIR, 'rollups.sqlite3'))
+
+ROLLUP_METRICS = ('pressure', 'waterLevel', 'dieselLevel', 'batteryVolts')
+
+# Resolution -> (bucket seconds, retention seconds or None to keep forever)
+RESOLUTIONS = {
+    '1m': (60, 7 * 86400),
+    '1h': (3600, 90 * 86400),
+    '1d': (86400, None),
+}
+PRUNE_INTERVAL = 3600  # Seconds between retention sweeps
+# How far behind the requested end the newest ingested sample may be and
+# still count as covering it (same allowance as sample_store)
+COVERAGE_SLACK_SECONDS = int(os.environ.get('ROLLUP_COVERAGE_SLACK_SECONDS', 120))
+
+
+def align(ts_ms, bucket_seconds):
+    """Start of the local-time bucket containing ts_ms."""
+    bucket_ms = bucket_seconds * 1000
+    offset_ms = analytics_series.DATA_UTC_OFFSET_MINUTES * 60000
+    return (ts_ms + offset_ms) // bucket_ms * bucket_ms - offset_ms
+
+
+class RollupStore:
+    """Running minute/hour/day aggregates (count, sum, min, max, last) per factory.
+
+    Each live_data entry is folded in exactly once: the last ingested key
+    per factory is remembered and anything at or before it is skipped.
+    """
+
+    def __init__(self, path=ROLLUP_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._last_prune = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " factory TEXT NOT NULL, resolution TEXT NOT NULL, metric TEXT NOT NULL,"
+            " bucket INTEGER NOT NULL, count INTEGER NOT NULL, sum REAL NOT NULL,"
+            " min REAL NOT NULL, max REAL NOT NULL, last REAL NOT NULL, last_ts INTEGER NOT NULL,"
+            " PRIMARY KEY (factory, resolution, metric, bucket)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_state ("
+            " factory TEXT PRIMARY KEY, last_key TEXT NOT NULL, first_ts INTEGER NOT NULL,"
+            " last_ts INTEGER NOT NULL DEFAULT 0)"
+        )
+        if 'last_ts' not in [row[1] for row in conn.execute("PRAGMA table_info(ingest_state)")]:
+            # Older stores: coverage starts counting from the next ingest
+            conn.execute("ALTER TABLE ingest_state ADD COLUMN last_ts INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- WRITE SIDE ---
+
+    def ingest(self, factory, key, entry, now_ms=None):
+        """Folds one live_data entry into every resolution. Returns False if already seen."""
+        conn = self._conn()
+        row = conn.execute("SELECT last_key FROM ingest_state WHERE factory = ?", (factory,)).fetchone()
+        if row is not None and key <= row[0]:
+            return False
+
+        ts = analytics_series.parse_sample_time(entry)
+        if ts is None:
+            ts = now_ms if now_ms is not None else int(time.time() * 1000)
+
+        rows = []
+        for metric in ROLLUP_METRICS:
+            v = analytics_series.metric_value(entry, metric)
+            if v is None:
+                continue
+            for res, (seconds, _) in RESOLUTIONS.items():
+                rows.append((factory, res, metric, align(ts, seconds), v, v, v, v, ts))
+
+        with conn:
+            conn.executemany(
+                "INSERT INTO rollups (factory, resolution, metric, bucket, count, sum, min, max, last, last_ts)"
+                " VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (factory, resolution, metric, bucket) DO UPDATE SET"
+                "  count = count + 1, sum = sum + excluded.sum,"
+                "  min = MIN(min, excluded.min), max = MAX(max, excluded.max),"
+                "  last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,"
+                "  last_ts = MAX(last_ts, excluded.last_ts)",
+                rows
+            )
+            conn.execute(
+                "INSERT INTO ingest_state (factory, last_key, first_ts, last_ts) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (factory) DO UPDATE SET last_key = excluded.last_key,"
+                "  first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)",
+                (factory, key, ts, ts)
+            )
+
+        if time.time() - self._last_prune > PRUNE_INTERVAL:
+            self.prune()
+        return True
+
+    def prune(self, now_ms=None):
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        conn = self._conn()
+        with conn:
+            for res, (_, retention) in RESOLUTIONS.items():
+                if retention:
+                    conn.execute(
+                        "DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                        (res, now_ms - retention * 1000)
+                    )
+        self._last_prune = time.time()
+
+    # --- READ SIDE ---
+
+    def covers(self, factory, start_ms, end_ms, resolution=None, now_ms=None):
+        """True if rollups for factory span [start_ms, end_ms).
+
+        Ingestion must have begun by start_ms and its newest sample must
+        reach end_ms (capped at now, give or take COVERAGE_SLACK_SECONDS),
+        so a stopped or lagging tracker doesn't serve empty recent buckets.
+        With a resolution, start_ms must also be inside that resolution's
+        retention: older buckets are pruned even though ingestion began
+        earlier.
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        if resolution is not None:
+            retention = RESOLUTIONS[resolution][1]
+            if retention and start_ms < now_ms - retention * 1000:
+                return False
+        row = self._conn().execute(
+            "SELECT first_ts, last_ts FROM ingest_state WHERE factory = ?", (factory,)
+        ).fetchone()
+        if row is None or row[0] > start_ms:
+            return False
+        return row[1] >= min(end_ms, now_ms) - COVERAGE_SLACK_SECONDS * 1000
+
+    @staticmethod
+    def resolution_for(bucket_ms):
+        """Coarsest stored resolution that divides bucket_ms (None if none does)."""
+        for res, (seconds, _) in sorted(RESOLUTIONS.items(), key=lambda kv: -kv[1][0]):
+            if bucket_ms % (seconds * 1000) == 0:
+                return res
+        return None
+
+    def query(self, factory, resolution, metric, start_ms, end_ms):
+        """Rollup rows (bucket, count, sum, min, max, last) in [start_ms, end_ms)."""
+        return self._conn().execute(
+            "SELECT bucket, count, sum, min, max, last FROM rollups"
+            " WHERE factory = ? AND resolution = ? AND metric = ? AND bucket >= ? AND bucket < ?"
+            " ORDER BY bucket",
+            (factory, resolution, metric, start_ms, end_ms)
+        ).fetchall()
+
+    def series(self, factory, metrics, start_ms, bucket_ms, count, now_ms=None):
+        """Same shape as analytics_series.aggregate, built from rollups.
+
+        Uses the coarsest stored resolution that divides bucket_ms, so the
+        work is proportional to the number of buckets, not raw samples.
+        Returns None when no resolution can serve the whole range (e.g. 15m
+        buckets reaching past the 7 days 1m rollups are kept, or ingestion
+        stopped before the range ends), so the caller
+        falls back to the sample store or raw data instead of empty buckets.
+        """
+        end_ms = start_ms + bucket_ms * count
+        resolution = self.resolution_for(bucket_ms)
+        if resolution is None or not self.covers(factory, start_ms, end_ms, resolution, now_ms):
+            return None
+
+        result = {}
+        for m in metrics:
+            mins = [None] * count
+            maxs = [None] * count
+            sums = [0.0] * count
+            counts = [0] * count
+            for bucket, c, s, lo, hi, _ in self.query(factory, resolution, m, start_ms, end_ms):
+                i = (bucket - start_ms) // bucket_ms
+                counts[i] += c
+                sums[i] += s
+                mins[i] = lo if mins[i] is None else min(mins[i], lo)
+                maxs[i] = hi if maxs[i] is None else max(maxs[i], hi)
+            result[m] = {
+                'min': [round(v, 3) if v is not None else None for v in mins],
+                'avg': [round(sums[i] / counts[i], 3) if counts[i] else None for i in range(count)],
+                'max': [round(v, 3) if v is not None else None for v in maxs],
+                'count': counts,
+            }
+        return result
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Process-wide RollupStore (opened lazily)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RollupStore()
+    return _store
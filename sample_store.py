@@ -0,0 +1,383 @@
+import datetime
+import hashlib
+import json
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import analytics_series
+
+# Configuration
+DATA_DIR = os.environ.get('EAGLE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+SAMPLE_STORE_DIR = os.environ.get('SAMPLE_STORE_DIR', os.path.join(DATA_DIR, 'samples'))
+SAMPLE_RETENTION_DAYS = int(os.environ.get('SAMPLE_RETENTION_DAYS', 400))
+# index.json is rewritten every this many appends / seconds (and on flush()),
+# not per sample; column files stay open between appends
+INDEX_FLUSH_ROWS = int(os.environ.get('SAMPLE_INDEX_FLUSH_ROWS', 60))
+INDEX_FLUSH_SECONDS = int(os.environ.get('SAMPLE_INDEX_FLUSH_SECONDS', 30))
+# How far behind the requested end the newest stored sample may be and still
+# count as covering it (a sample every few seconds, plus the index flush delay)
+COVERAGE_SLACK_SECONDS = int(os.environ.get('SAMPLE_COVERAGE_SLACK_SECONDS', 120))
+
+PUMPS = ('main', 'jockey', 'sprinkler', 'diesel')
+
+# Column name -> array typecode. One file per column per segment; every file
+# holds the same number of fixed-width rows, so row i is the same sample in all.
+COLUMNS = {'ts': 'q'}  # epoch ms, non-decreasing within a segment
+for _metric in analytics_series.METRIC_FIELDS:
+    COLUMNS[_metric] = 'd'  # NaN when the sample had no value
+for _pump in PUMPS:
+    COLUMNS[f'{_pump}_status'] = 'b'  # 1 ON, 0 OFF, -1 unknown
+    COLUMNS[f'{_pump}_mode'] = 'b'  # 1 AUTO, 0 MANUAL, -1 unknown
+
+NAN = float('nan')
+_STATE_CODES = {'ON': 1, 'OFF': 0, 'AUTO': 1, 'MANUAL': 0}
+
+
+def factory_dir_name(factory):
+    return hashlib.sha1(factory.encode()).hexdigest()[:16]
+
+
+def day_of(ts_ms):
+    """Local (plant) calendar day of ts_ms, e.g. '2025-01-31'."""
+    offset = datetime.timedelta(minutes=analytics_series.DATA_UTC_OFFSET_MINUTES)
+    return (datetime.datetime.fromtimestamp(ts_ms / 1000, datetime.timezone.utc) + offset).strftime('%Y-%m-%d')
+
+
+def encode_sample(ts, entry):
+    """One live_data entry as a row: {column: value}."""
+    row = {'ts': ts}
+    for metric in analytics_series.METRIC_FIELDS:
+        v = analytics_series.metric_value(entry, metric)
+        row[metric] = NAN if v is None else v
+    pumps = entry.get('pumps') if isinstance(entry.get('pumps'), dict) else {}
+    for pump in PUMPS:
+        info = pumps.get(pump) if isinstance(pumps.get(pump), dict) else {}
+        row[f'{pump}_status'] = _STATE_CODES.get(str(info.get('status', '')).upper(), -1)
+        row[f'{pump}_mode'] = _STATE_CODES.get(str(info.get('mode', '')).upper(), -1)
+    return row
+
+
+class SegmentView:
+    """Memory-mapped columns of one day segment, restricted to a row range.
+
+    columns[name] is a memoryview over the mapped file (no copy). Use as a
+    context manager, or call close(); views must not be used afterwards.
+    """
+
+    def __init__(self, path, day, start_ms=None, end_ms=None, names=None):
+        self.day = day
+        self._maps = []
+        self._views = []
+        self.columns = {}
+
+        names = ['ts'] + [n for n in (names or COLUMNS) if n != 'ts']
+        mapped = {}
+        rows = None
+        for name in names:
+            mv = self._map(os.path.join(path, f'{name}.col'), COLUMNS[name])
+            mapped[name] = mv
+            n = len(mv) if mv is not None else 0
+            rows = n if rows is None else min(rows, n)  # A torn append leaves one column short
+        rows = rows or 0
+
+        ts = mapped['ts']
+        lo = 0 if start_ms is None or ts is None else bisect_left(ts, start_ms, 0, rows)
+        hi = rows if end_ms is None or ts is None else bisect_left(ts, end_ms, lo, rows)
+        self.rows = hi - lo
+        for name, mv in mapped.items():
+            if mv is not None:
+                view = mv[lo:hi]
+                self._views.append(view)
+                self.columns[name] = view
+
+    def _map(self, path, typecode):
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                itemsize = array(typecode).itemsize
+                usable = size - size % itemsize
+                if usable == 0:
+                    return None
+                mm = mmap.mmap(f.fileno(), usable, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        self._maps.append(mm)
+        mv = memoryview(mm).cast(typecode)
+        self._views.append(mv)
+        return mv
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        for mm in self._maps:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # A caller kept a view; the map is freed with it
+        self._views, self._maps, self.columns = [], [], {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SampleStore:
+    """Append-only columnar store of live_data samples, one segment per factory per day.
+
+    Layout: <root>/<sha1(factory)[:16]>/<YYYY-MM-DD>/<column>.col holding
+    raw fixed-width values (array typecodes in COLUMNS), plus index.json
+    per factory with every day's row count / time range and the last
+    ingested key, so a sample is stored once however often it is seen.
+
+    The writer keeps the current day's column files open and saves the
+    index every INDEX_FLUSH_ROWS appends / INDEX_FLUSH_SECONDS; call
+    flush() (or close()) on shutdown. Rows written after the last saved
+    index are cut off when the segment is reopened, and their keys are
+    ingested again, so a crash loses no sample and stores none twice.
+    """
+
+    def __init__(self, root=SAMPLE_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._writers = {}  # factory -> (day, {column: open file})
+        self._pending = {}  # factory -> (appends since the index was saved, time of the first)
+
+    # --- INDEX ---
+
+    def _factory_path(self, factory):
+        return os.path.join(self.root, factory_dir_name(factory))
+
+    def _index_path(self, factory):
+        return os.path.join(self._factory_path(factory), 'index.json')
+
+    def index(self, factory):
+        """The factory's index, re-read when another process has rewritten it."""
+        path = self._index_path(factory)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        cached = self._indexes.get(factory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path) as f:
+                idx = json.load(f)
+        except (FileNotFoundError, ValueError):
+            idx = {'factory': factory, 'last_key': None, 'days': {}}
+        self._indexes[factory] = (mtime, idx)
+        return idx
+
+    def _save_index(self, factory, idx):
+        writer = self._writers.get(factory)
+        if writer is not None:
+            # Rows reach the disk before the index that counts them
+            for f in writer[1].values():
+                f.flush()
+        self._pending.pop(factory, None)
+        path = self._index_path(factory)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(idx, f)
+        os.replace(tmp, path)
+        self._indexes[factory] = (os.path.getmtime(path), idx)
+
+    # --- WRITE SIDE ---
+
+    def _open_segment(self, factory, day, info):
+        """Column files of factory's day segment, opened for appending."""
+        writer = self._writers.get(factory)
+        if writer is not None and writer[0] == day:
+            return writer[1]
+        self._close_writer(factory)
+
+        seg = os.path.join(self._factory_path(factory), day)
+        os.makedirs(seg, exist_ok=True)
+        paths = {name: os.path.join(seg, f'{name}.col') for name in COLUMNS}
+        # Drop rows the saved index doesn't count (written after the last
+        # flush, or a torn append) so every column lines up again
+        rows = info['rows']
+        for name, path in paths.items():
+            try:
+                rows = min(rows, os.path.getsize(path) // array(COLUMNS[name]).itemsize)
+            except FileNotFoundError:
+                rows = 0
+        files = {}
+        for name, path in paths.items():
+            f = open(path, 'ab')
+            f.truncate(rows * array(COLUMNS[name]).itemsize)
+            files[name] = f
+        info['rows'] = rows
+        self._writers[factory] = (day, files)
+        return files
+
+    def _close_writer(self, factory):
+        writer = self._writers.pop(factory, None)
+        if writer is not None:
+            for f in writer[1].values():
+                f.close()
+
+    def append(self, factory, key, entry, now_ms=None):
+        """Appends one sample. Returns False if key was already stored."""
+        ts = analytics_series.parse_sample_time(entry)
+        if ts is None:
+            ts = now_ms if now_ms is not None else int(datetime.datetime.now().timestamp() * 1000)
+
+        with self._lock:
+            # Unsaved appends live only in the cached index; don't re-read it
+            idx = self._indexes[factory][1] if factory in self._pending else self.index(factory)
+            if idx['last_key'] is not None and key <= idx['last_key']:
+                return False
+
+            day = day_of(ts)
+            info = idx['days'].setdefault(day, {'rows': 0, 'first_ts': ts, 'last_ts': ts})
+            # Keep ts sorted inside a segment so range lookups can bisect
+            ts = max(ts, info['last_ts'])
+            row = encode_sample(ts, entry)
+
+            files = self._open_segment(factory, day, info)
+            for name, typecode in COLUMNS.items():
+                files[name].write(array(typecode, [row[name]]).tobytes())
+
+            info['rows'] += 1
+            info['last_ts'] = ts
+            idx['last_key'] = key
+            count, since = self._pending.get(factory, (0, time.time()))
+            self._pending[factory] = (count + 1, since)
+            if count + 1 >= INDEX_FLUSH_ROWS or time.time() - since >= INDEX_FLUSH_SECONDS:
+                self._save_index(factory, idx)
+        return True
+
+    def flush(self):
+        """Writes out buffered rows and every unsaved index."""
+        with self._lock:
+            for factory in list(self._pending):
+                self._save_index(factory, self._indexes[factory][1])
+
+    def close(self):
+        """flush(), then closes the open column files."""
+        self.flush()
+        with self._lock:
+            for factory in list(self._writers):
+                self._close_writer(factory)
+
+    def prune(self, factory, keep_days=SAMPLE_RETENTION_DAYS, now_ms=None):
+        """Drops day segments older than keep_days. Returns how many were removed."""
+        now_ms = now_ms if now_ms is not None else int(datetime.datetime.now().timestamp() * 1000)
+        cutoff = day_of(now_ms - keep_days * 86400000)
+        removed = 0
+        with self._lock:
+            idx = self._indexes[factory][1] if factory in self._pending else self.index(factory)
+            for day in [d for d in idx['days'] if d < cutoff]:
+                if self._writers.get(factory, (None,))[0] == day:
+                    self._close_writer(factory)
+                shutil.rmtree(os.path.join(self._factory_path(factory), day), ignore_errors=True)
+                del idx['days'][day]
+                removed += 1
+            if removed:
+                self._save_index(factory, idx)
+        return removed
+
+    # --- READ SIDE ---
+
+    def covers(self, factory, start_ms, end_ms, now_ms=None):
+        """True if stored samples span [start_ms, end_ms).
+
+        The end only has to be reached up to now (nothing is stored from
+        the future), give or take COVERAGE_SLACK_SECONDS.
+        """
+        days = self.index(factory)['days']
+        if not days or min(d['first_ts'] for d in days.values()) > start_ms:
+            return False
+        now_ms = now_ms if now_ms is not None else int(datetime.datetime.now().timestamp() * 1000)
+        last_ts = max(d['last_ts'] for d in days.values())
+        return last_ts >= min(end_ms, now_ms) - COVERAGE_SLACK_SECONDS * 1000
+
+    def segments(self, factory, start_ms, end_ms, columns=None):
+        """Yields a SegmentView per day overlapping [start_ms, end_ms), oldest first.
+
+        Each view is closed when the generator moves on, so consume the
+        columns inside the loop body.
+        """
+        days = self.index(factory)['days']
+        for day in sorted(days):
+            info = days[day]
+            if info['last_ts'] < start_ms or info['first_ts'] >= end_ms:
+                continue
+            with SegmentView(os.path.join(self._factory_path(factory), day), day, start_ms, end_ms, columns) as view:
+                if view.rows:
+                    yield view
+
+    def series(self, factory, metrics, start_ms, bucket_ms, count):
+        """Same shape as analytics_series.aggregate, straight off the mapped columns."""
+        inf = float('inf')
+        mins = {m: [inf] * count for m in metrics}
+        maxs = {m: [-inf] * count for m in metrics}
+        sums = {m: [0.0] * count for m in metrics}
+        counts = {m: [0] * count for m in metrics}
+
+        end_ms = start_ms + bucket_ms * count
+        for view in self.segments(factory, start_ms, end_ms, metrics):
+            ts = view.columns['ts']
+            for m in metrics:
+                col = view.columns.get(m)
+                if col is None:
+                    continue
+                mn, mx, sm, ct = mins[m], maxs[m], sums[m], counts[m]
+                for t, v in zip(ts, col):
+                    if v != v:  # NaN: no reading in this sample
+                        continue
+                    i = (t - start_ms) // bucket_ms
+                    sm[i] += v
+                    ct[i] += 1
+                    if v < mn[i]:
+                        mn[i] = v
+                    if v > mx[i]:
+                        mx[i] = v
+
+        result = {}
+        for m in metrics:
+            c = counts[m]
+            result[m] = {
+                'min': [round(mins[m][i], 3) if c[i] else None for i in range(count)],
+                'avg': [round(sums[m][i] / c[i], 3) if c[i] else None for i in range(count)],
+                'max': [round(maxs[m][i], 3) if c[i] else None for i in range(count)],
+                'count': c,
+            }
+        return result
+
+    def rows(self, factory, start_ms, end_ms, columns=None):
+        """Yields samples in [start_ms, end_ms) as dicts (NaN/-1 become None)."""
+        names = ['ts'] + [n for n in (columns or COLUMNS) if n != 'ts']
+        for view in self.segments(factory, start_ms, end_ms, names):
+            cols = [(n, view.columns[n]) for n in names if n in view.columns]
+            for i in range(view.rows):
+                row = {}
+                for n, col in cols:
+                    v = col[i]
+                    if (COLUMNS[n] == 'd' and math.isnan(v)) or (COLUMNS[n] == 'b' and v < 0):
+                        v = None
+                    row[n] = v
+                yield row
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Process-wide SampleStore."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SampleStore()
+    return _store
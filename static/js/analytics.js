@@ -1,18 +1,8 @@
 // Path: static/js/analytics.js
 
-import { initializeApp } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-app.js";
-import { getDatabase, ref, query, limitToLast, onValue } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-database.js";
-import { firebaseConfig } from './firebase_config.js';
-
-const app = initializeApp({
-    ...firebaseConfig,
-    databaseURL: window.FACTORY_DB_URL || firebaseConfig.databaseURL
-});
-const db = getDatabase(app);
-
 // Globals
 let pressureChart, tankChart, dieselChart;
-let dataLimit = 3000; // Increased to ensure enough data for 24h hourly view
+let dataRange = '24h'; // Last 24 hours in hourly buckets
 
 // --- INITIALIZE CHARTS ---
 function initCharts() {
@@ -92,140 +82,72 @@ function initCharts() {
 }
 
 // --- FETCH DATA ---
-function loadData(limit) {
-    const liveDataRef = query(ref(db, 'live_data'), limitToLast(limit));
-
-    onValue(liveDataRef, (snapshot) => {
-        const raw = snapshot.val();
-        if (!raw) return;
-
-        const labels = [];
-        const pressureData = [];
-        const tankData = [];
-        const dieselData = [];
-
-        // Helper to parse dates manually if standard parsing fails
-        function parseDate(dateString) {
-            // Try standard parsing first
-            let date = new Date(dateString);
-            if (!isNaN(date.getTime())) return date;
-
-            // Handle DD-MM-YYYY HH:mm:ss
-            if (typeof dateString === 'string') {
-                const parts = dateString.split(/[- :]/); // Split by - or : or space
-                if (parts.length >= 6) {
-                    return new Date(parts[2], parts[1] - 1, parts[0], parts[3], parts[4], parts[5]);
-                }
-            }
-            return new Date(0);
-        }
-
-        const now = Date.now();
-        // Snap to the start of the current hour to make buckets clean
-        const currentHourStart = new Date(now).setMinutes(0, 0, 0);
-
-        // We want the last 24 hours (or 48, based on user preference, but "hourly graph" usually implies a clearer recent trend).
-        // Let's stick to the previous range logic but bucket it. 
-        // 1000 points raw is a lot. Let's show the last 24 hours in hourly buckets.
-        const durationHours = 24;
-        const startTimestamp = currentHourStart - ((durationHours - 1) * 60 * 60 * 1000);
-        const bucketSize = 60 * 60 * 1000; // 1 hour
-
-        const totalBuckets = durationHours;
-
-        // Initialize buckets
-        const buckets = new Array(totalBuckets).fill(null).map(() => ({
-            count: 0,
-            pressureSum: 0,
-            tankSum: 0,
-            dieselSum: 0
-        }));
-
-        // Process Raw Data
-        Object.values(raw).forEach(entry => {
-            if (entry.lastUpdated) {
-                const date = parseDate(entry.lastUpdated);
-                const time = date.getTime();
-
-                if (time < startTimestamp) return;
-
-                // Determine Bucket Index
-                const bucketIndex = Math.floor((time - startTimestamp) / bucketSize);
-
-                if (bucketIndex >= 0 && bucketIndex < totalBuckets) {
-                    const b = buckets[bucketIndex];
-                    b.count++;
-                    b.pressureSum += parseFloat(entry.pressure || 0);
-                    const wLevel = (entry.waterLevel !== undefined) ? entry.waterLevel : (entry.tankLevel || 0);
-                    b.tankSum += parseFloat(wLevel);
-                    const dLevel = (entry.dieselLevel !== undefined) ? entry.dieselLevel : (entry.diesel_level || 0);
-                    b.dieselSum += parseFloat(dLevel);
-                }
-            }
-        });
+// Buckets are aggregated server-side (/api/analytics/series), so the browser
+// only receives one min/avg/max/count per bucket instead of raw live_data.
+let refreshTimer = null;
+
+function loadData(range) {
+    const params = new URLSearchParams({
+        metric: 'pressure,waterLevel,dieselLevel',
+        bucket: '1h',
+        range: range
+    });
 
-        // Generate Labels and Data
-        for (let i = 0; i < totalBuckets; i++) {
-            const bucketTime = new Date(startTimestamp + (i * bucketSize));
+    fetch(`/api/analytics/series?${params}`, { credentials: 'same-origin' })
+        .then(res => res.ok ? res.json() : Promise.reject(res.status))
+        .then(result => {
             // Label: HH:00
-            labels.push(bucketTime.toLocaleTimeString('en-US', { hour12: false, hour: '2-digit', minute: '2-digit' }));
-
-            const b = buckets[i];
-            if (b.count > 0) {
-                pressureData.push(b.pressureSum / b.count);
-                tankData.push(b.tankSum / b.count);
-                dieselData.push(b.dieselSum / b.count);
-            } else {
-                // Return null instead of 0 to avoid "collapsing to zero"
-                // This will create a gap or stop the line, rather than showing "Empty Tank"
-                pressureData.push(null);
-                tankData.push(null);
-                dieselData.push(null);
+            const labels = result.t.map(t => new Date(t).toLocaleTimeString('en-US', { hour12: false, hour: '2-digit', minute: '2-digit' }));
+
+            // Empty buckets come back as null: this creates a gap rather than "collapsing to zero"
+            const pressureData = result.series.pressure.avg;
+            const tankData = result.series.waterLevel.avg;
+            const dieselData = result.series.dieselLevel.avg;
+
+            // Update Header Time
+            const headerTime = document.getElementById('lastUpdated');
+            if (headerTime) headerTime.textContent = `Last ${range.replace('h', ' Hours').replace('d', ' Days')} (Hourly Average)`;
+
+            // Update Charts
+            if (pressureChart) {
+                pressureChart.data.labels = labels;
+                pressureChart.data.datasets[0].data = pressureData;
+                pressureChart.update();
             }
-        }
-
-        // Update Header Time
-        const headerTime = document.getElementById('lastUpdated');
-        if (headerTime) headerTime.textContent = "Last 24 Hours (Hourly Average)";
 
-        // Update Charts
-        // Update Charts
-        if (pressureChart) {
-            pressureChart.data.labels = labels;
-            pressureChart.data.datasets[0].data = pressureData;
-            pressureChart.update();
-        }
+            if (tankChart) {
+                tankChart.data.labels = labels;
+                tankChart.data.datasets[0].data = tankData;
+                tankChart.update();
+            }
 
-        if (tankChart) {
-            tankChart.data.labels = labels;
-            tankChart.data.datasets[0].data = tankData;
-            tankChart.update();
-        }
+            if (dieselChart) {
+                dieselChart.data.labels = labels;
+                dieselChart.data.datasets[0].data = dieselData;
+                dieselChart.update();
+            }
+        })
+        .catch(err => console.error("Analytics load failed:", err));
 
-        if (dieselChart) {
-            dieselChart.data.labels = labels;
-            dieselChart.data.datasets[0].data = dieselData;
-            dieselChart.update();
-        }
-    });
+    // The server caches each series for a minute; refresh on the same cadence
+    clearInterval(refreshTimer);
+    refreshTimer = setInterval(() => loadData(range), 60000);
 }
 
 // --- CONTROLS ---
-window.updateTimeRange = (limit) => {
-    dataLimit = limit;
+window.updateTimeRange = (range) => {
+    dataRange = range;
 
     // Update button styling
     document.querySelectorAll('.filter-btn').forEach(btn => {
         btn.classList.remove('active');
-        if (btn.textContent.includes(limit)) btn.classList.add('active');
+        if (btn.textContent.includes(range)) btn.classList.add('active');
     });
 
-    // Reload Data with new limit
-    // Note: We create a new listener. Ideally, we should detach old ones, 
-    // but for a simple dashboard, this overwrite is acceptable.
-    loadData(limit);
+    // Reload Data with new range (loadData resets the refresh timer)
+    loadData(range);
 };
 
 // Start
 initCharts();
-loadData(dataLimit);
\ No newline at end of file
+loadData(dataRange);
\ No newline at end of file
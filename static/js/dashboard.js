@@ -1,42 +1,96 @@
 // Path: static/js/dashboard.js
 
-import { initializeApp } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-app.js";
-import { getDatabase, ref, onValue, update, query, limitToLast } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-database.js";
-
-// Import config (Ensure this file exists in static/js/)
-import { firebaseConfig } from './firebase_config.js';
-
-const app = initializeApp({
-    ...firebaseConfig,
-    databaseURL: window.FACTORY_DB_URL || firebaseConfig.databaseURL
-});
-const db = getDatabase(app);
-
-// --- 1. SETUP LISTENERS ---
-
-// Use a Query to get only the latest entry from 'live_data'
-const liveDataRef = query(ref(db, 'live_data'), limitToLast(1));
+// --- 1. LIVE DATA STREAM ---
+// The server holds one Firebase subscription per factory and pushes it to
+// every open dashboard over Server-Sent Events (/api/live_stream):
+//   "snapshot" -> the full latest sample (on connect / resync)
+//   "delta"    -> only the fields that changed (null = field removed)
+// EventSource reconnects on its own if the connection drops.
+// Where the server can't stream (serverless, sync workers: window.LIVE_STREAM
+// is false), or the stream keeps failing before delivering anything, the
+// dashboard polls /api/live_data instead (ETag, so unchanged = 304).
+
+const POLL_INTERVAL_MS = 5000;
+const MAX_STREAM_ERRORS = 3; // Failed connects in a row before falling back to polling
+
+let liveData = null;
+let pollTimer = null;
+
+function mergeDelta(target, delta) {
+    for (const [key, value] of Object.entries(delta)) {
+        if (value === null) {
+            delete target[key];
+        } else if (typeof value === 'object' && !Array.isArray(value) &&
+                   typeof target[key] === 'object' && target[key] !== null) {
+            mergeDelta(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
 
+async function pollLiveData() {
+    try {
+        // no-cache: the browser revalidates with the stored ETag every time
+        const response = await fetch('/api/live_data', { cache: 'no-cache', credentials: 'same-origin' });
+        if (response.ok) {
+            const data = await response.json();
+            if (JSON.stringify(data) !== JSON.stringify(liveData)) {
+                liveData = data;
+                updateDashboard(liveData);
+            }
+        } else {
+            console.warn("⚠️ Live data request failed:", response.status);
+        }
+    } catch (err) {
+        console.warn("⚠️ Live data request failed:", err);
+    }
+}
 
+function startPolling() {
+    if (pollTimer) return;
+    console.log("Polling /api/live_data every", POLL_INTERVAL_MS / 1000, "s");
+    pollLiveData();
+    pollTimer = setInterval(pollLiveData, POLL_INTERVAL_MS);
+}
 
 // --- 2. LISTEN FOR LIVE SENSOR DATA ---
-onValue(liveDataRef, (snapshot) => {
-    const rawData = snapshot.val();
-
-    if (rawData) {
-        // DATA PROCESSING LOGIC:
-        // Firebase returns an object like: { "-OhOj...": { pressure: 0, ... } }
-        // We extract the value *inside* that dynamic key.
-        const keys = Object.keys(rawData);
-        const latestKey = keys[keys.length - 1]; // Get the most recent ID
-        const finalData = rawData[latestKey];    // Get the actual data inside it
-
-        console.log("🔥 Latest Data:", finalData); // Debugging
-        updateDashboard(finalData);
-    } else {
-        console.warn("⚠️ No data found in 'live_data'");
-    }
-});
+function startStream() {
+    const liveSource = new EventSource('/api/live_stream');
+    let errors = 0;
+
+    liveSource.addEventListener('snapshot', (event) => {
+        errors = 0;
+        liveData = JSON.parse(event.data);
+        console.log("🔥 Latest Data:", liveData); // Debugging
+        updateDashboard(liveData);
+    });
+
+    liveSource.addEventListener('delta', (event) => {
+        errors = 0;
+        if (!liveData) return; // A snapshot always comes first
+        mergeDelta(liveData, JSON.parse(event.data));
+        updateDashboard(liveData);
+    });
+
+    liveSource.onerror = () => {
+        errors += 1;
+        if (errors >= MAX_STREAM_ERRORS || liveSource.readyState === EventSource.CLOSED) {
+            console.warn("⚠️ Live stream unavailable, switching to polling");
+            liveSource.close();
+            startPolling();
+        } else {
+            console.warn("⚠️ Live stream interrupted, reconnecting...");
+        }
+    };
+}
+
+if (window.LIVE_STREAM !== false && typeof EventSource !== 'undefined') {
+    startStream();
+} else {
+    startPolling();
+}
 
 
 
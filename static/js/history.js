@@ -1,73 +1,67 @@
-import { initializeApp } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-app.js";
-import { getDatabase, ref, onValue, query, limitToLast, orderByChild } from "https://www.gstatic.com/firebasejs/9.22.0/firebase-database.js";
-import { firebaseConfig } from './firebase_config.js';
-
-const app = initializeApp(firebaseConfig);
-const db = getDatabase(app);
-
 let allHistoryData = [];
+let nextCursor = null;
+let requestSeq = 0;
 
 // DOM Elements
 const tableBody = document.getElementById('historyBody');
 const searchInput = document.getElementById('logSearch');
 const loader = document.getElementById('loader'); // Get loader
+const loadMoreBtn = document.getElementById('loadMore');
 let currentFilter = 'all';
 
 // Show loader initially
 if (loader) loader.style.display = 'flex';
 
 // --- FETCH DATA ---
-const historyRef = query(ref(db, 'history'), limitToLast(100)); // Limit to last 100 for performance
-
-onValue(historyRef, (snapshot) => {
-    const data = snapshot.val();
-    tableBody.innerHTML = ''; // Clear loading/old data
-    allHistoryData = [];
-
-    if (data) {
-        // Convert object to array and reverse (newest first)
-        Object.keys(data).forEach(key => {
-            allHistoryData.push(data[key]);
-        });
-
-        // Sort descending (newest first). Handle both 'timestamp' and 'start_time'
-        allHistoryData.sort((a, b) => {
-            const timeA = a.timestamp || a.start_time || 0;
-            const timeB = b.timestamp || b.start_time || 0;
-            return timeB - timeA;
-        });
+// Filtering, search and paging happen on the server (/api/history), so the
+// whole log is reachable, not just the latest 100 events.
+const PAGE_SIZE = 50;
+const REFRESH_INTERVAL = 30000;
+
+function historyUrl(cursor) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (currentFilter !== 'all') params.set('type', currentFilter);
+    const q = searchInput.value.trim();
+    if (q) params.set('q', q);
+    if (cursor) params.set('before', cursor);
+    return '/api/history?' + params.toString();
+}
+
+async function loadHistory(append = false) {
+    const seq = ++requestSeq; // Drop responses to superseded requests
+    try {
+        const res = await fetch(historyUrl(append ? nextCursor : null));
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        const page = await res.json();
+        if (seq !== requestSeq) return;
 
+        allHistoryData = append ? allHistoryData.concat(page.events) : page.events;
+        nextCursor = page.next;
         renderTable();
-    } else {
-        tableBody.innerHTML = '<tr><td colspan="4" style="text-align:center;">No history records found.</td></tr>';
+    } catch (e) {
+        console.error('History load failed', e);
+        if (!append && seq === requestSeq) {
+            tableBody.innerHTML = '<tr><td colspan="4" class="empty-state">Could not load history.</td></tr>';
+        }
+    } finally {
+        if (loader) loader.style.display = 'none';
+        if (loadMoreBtn) loadMoreBtn.style.display = nextCursor ? '' : 'none';
     }
+}
 
-    // Hide loader after render
-    if (loader) loader.style.display = 'none';
-});
+if (loadMoreBtn) loadMoreBtn.addEventListener('click', () => loadHistory(true));
+
+// Pick up new events while the user is still looking at the first page
+setInterval(() => {
+    if (allHistoryData.length <= PAGE_SIZE) loadHistory();
+}, REFRESH_INTERVAL);
+
+loadHistory();
 
 // --- RENDER TABLE (Advanced) ---
 function renderTable() {
     tableBody.innerHTML = '';
-    const searchTerm = searchInput.value.toLowerCase();
-
-    // 1. Filter Data
-    const filteredData = allHistoryData.filter(item => {
-        // Tab Filter
-        let matchesTab = true;
-        if (currentFilter === 'ALARM') matchesTab = item.event_type === 'ALARM';
-        else if (currentFilter === 'STATUS') matchesTab = item.event_type === 'STATUS_CHANGE' || item.event_type === 'MODE_CHANGE';
-        else if (currentFilter === 'SYSTEM') matchesTab = !item.event_type || (item.pump_name && (item.pump_name.includes('Pressure') || item.pump_name.includes('Battery') || item.pump_name.includes('Tank')));
-
-        // Search Filter
-        let matchesSearch = true;
-        if (searchTerm) {
-            const str = ((item.pump_name || '') + (item.event_type || '') + (item.message || '') + (item.date_formatted || '')).toLowerCase();
-            matchesSearch = str.includes(searchTerm);
-        }
-
-        return matchesTab && matchesSearch;
-    });
+    const filteredData = allHistoryData;
 
     if (filteredData.length === 0) {
         tableBody.innerHTML = '<tr><td colspan="4" class="empty-state">No matching records found.</td></tr>';
@@ -173,63 +167,45 @@ window.filterLogs = function (type) {
     if (type === 'STATUS') buttons[2].classList.add('active');
     if (type === 'SYSTEM') buttons[3].classList.add('active');
 
-    renderTable();
+    loadHistory();
 }
 
-searchInput.addEventListener('input', renderTable);
+let searchTimer = null;
+searchInput.addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => loadHistory(), 250);
+});
 
 // --- EXPORT CSV ---
+// The table only holds the latest records; the server streams the whole
+// log (paged from Firebase) as a CSV download.
 window.exportToCSV = function () {
-    if (allHistoryData.length === 0) {
-        alert("No data to export!");
-        return;
-    }
-
-    let csvContent = "data:text/csv;charset=utf-8,";
-    csvContent += "Date,Source,Event Type,Description,Duration (New/Old)\n";
-
-    allHistoryData.forEach(item => {
-        const timeVal = item.timestamp || item.start_time || 0;
-        const dateObj = new Date(timeVal);
-        const dateStr = dateObj.toLocaleString().replace(',', '');
-
-        let source, event, desc, dur = "";
-
-        if (item.event_type) {
-            source = item.pump_name;
-            event = item.event_type;
-            desc = item.message;
-        } else {
-            source = item.pump_name;
-            event = "RUN_CYCLE";
-            desc = "Run Duration";
-            dur = item.duration_seconds;
-        }
-
-        csvContent += `${dateStr},${source},${event},${desc},${dur}\n`;
-    });
-
-    const encodedUri = encodeURI(csvContent);
     const link = document.createElement("a");
-    link.setAttribute("href", encodedUri);
-    link.setAttribute("download", "pump_history_export.csv");
+    link.setAttribute("href", "/api/export/history");
+    link.setAttribute("download", "history_export.csv");
     document.body.appendChild(link); // Required for FF
     link.click();
     document.body.removeChild(link);
 }
 
 // --- LIVE ALERTS BADGE (Synced with Dashboard) ---
-const liveDataRef = query(ref(db, 'live_data'), limitToLast(1));
-
-onValue(liveDataRef, (snapshot) => {
-    const rawData = snapshot.val();
-    if (rawData) {
-        const keys = Object.keys(rawData);
-        const latestKey = keys[keys.length - 1];
-        const finalData = rawData[latestKey];
-        calculateAlarms(finalData);
+// Polls the same shared snapshot as the dashboard (ETag, so unchanged = 304)
+const ALARM_POLL_INTERVAL_MS = 5000;
+
+async function pollAlarms() {
+    try {
+        const response = await fetch('/api/live_data', { cache: 'no-cache', credentials: 'same-origin' });
+        if (response.ok) {
+            const data = await response.json();
+            if (data) calculateAlarms(data);
+        }
+    } catch (err) {
+        console.warn("⚠️ Live data request failed:", err);
     }
-});
+}
+
+pollAlarms();
+setInterval(pollAlarms, ALARM_POLL_INTERVAL_MS);
 
 function calculateAlarms(data) {
     let count = 0;
@@ -0,0 +1,126 @@
+"""Content-hashed static URLs, long-lived caching and precompressed variants.
+
+url_for('static', filename=...) gets a ?v=<content hash> query string. A
+request whose v matches the file's current hash is served with a one-year
+immutable Cache-Control, so browsers on slow plant-floor links never
+revalidate it. Any edit changes the hash and therefore the URL.
+
+Text assets (and any image that actually shrinks) are precompressed at
+build time by running this module:
+
+    python static_assets.py
+
+which writes .gz (and .br when the brotli package is installed) next to
+each file. The static view serves those to clients that accept them.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import request, send_from_directory
+
+# Configuration
+IMMUTABLE_MAX_AGE = 365 * 86400
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.html', '.png', '.ico')
+MIN_COMPRESSED_SAVING = 0.10  # Only keep a variant that is at least 10% smaller
+MIN_COMPRESS_SIZE = 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_hashes = {}  # path -> (mtime, hash)
+_hashes_lock = threading.Lock()
+
+
+def asset_hash(static_folder, filename):
+    """Short content hash of a static file (None if it doesn't exist)."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _hashes.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    with _hashes_lock:
+        _hashes[path] = (mtime, digest)
+    return digest
+
+
+def init_app(app):
+    static_folder = app.static_folder
+
+    @app.url_defaults
+    def add_asset_version(endpoint, values):
+        if endpoint == 'static' and 'v' not in values and 'filename' in values:
+            digest = asset_hash(static_folder, values['filename'])
+            if digest:
+                values['v'] = digest
+
+    serve_static = app.view_functions['static']
+
+    def static_with_variants(filename):
+        response = None
+        accepted = request.accept_encodings
+        for encoding, ext in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.isfile(os.path.join(static_folder, filename + ext)):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(static_folder, filename + ext, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = serve_static(filename=filename)
+        response.vary.add('Accept-Encoding')
+
+        version = request.args.get('v')
+        if version and version == asset_hash(static_folder, filename):
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
+
+    app.view_functions['static'] = static_with_variants
+
+
+def precompress(static_folder):
+    """Writes .gz/.br variants for every compressible file. Returns (written, skipped)."""
+    written = skipped = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                raw = f.read()
+            if len(raw) < MIN_COMPRESS_SIZE:
+                continue
+
+            variants = [('.gz', gzip.compress(raw, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(raw, quality=11)))
+
+            for ext, data in variants:
+                target = path + ext
+                if len(data) <= len(raw) * (1 - MIN_COMPRESSED_SAVING):
+                    with open(target, 'wb') as f:
+                        f.write(data)
+                    written += 1
+                else:
+                    # Already-compressed images: a variant would only cost CPU on the client
+                    if os.path.exists(target):
+                        os.remove(target)
+                    skipped += 1
+    return written, skipped
+
+
+if __name__ == '__main__':
+    folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    written, skipped = precompress(folder)
+    print(f"Precompressed {written} variants ({skipped} skipped: not worth it){'' if brotli else ' - brotli not installed, gzip only'}")
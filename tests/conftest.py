@@ -0,0 +1,169 @@
+"""Shared fixtures: an in-memory Realtime Database behind the real FirebaseClient.
+
+FakeDatabase answers the REST calls the app makes (GET with orderBy="$key"
+range queries, PUT/PATCH/POST/DELETE, ETag reads and if-match writes), so
+the code under test runs its own request building and paging unchanged.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from urllib.parse import unquote
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Local stores (history index, rollups, samples) must not touch the real data dir
+os.environ['EAGLE_DATA_DIR'] = tempfile.mkdtemp(prefix='eagle-test-')
+
+import firebase_client  # noqa: E402
+
+BASE_URL = 'https://test-factory.firebaseio.test'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(json.dumps(self._body))  # A fresh decode each time, like requests
+
+
+class FakeDatabase:
+    """A JSON tree plus a log of (method, path, params) for every request."""
+
+    def __init__(self, base_url=BASE_URL):
+        self.base_url = base_url
+        self.root = {}
+        self.requests = []
+        self.hooks = {}  # (method, path) -> fn(body) run before the request is applied
+
+    # --- TREE ---
+
+    def get(self, path):
+        node = self.root
+        for part in self._parts(path):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def set(self, path, value):
+        parts = self._parts(path)
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = json.loads(json.dumps(value))
+
+    def etag(self, path):
+        return hashlib.sha1(json.dumps(self.get(path), sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def _parts(path):
+        return [p for p in path.strip('/').split('/') if p]
+
+    # --- REST ---
+
+    def request(self, method, url, params=None, json=None, headers=None, timeout=None):
+        path = url[len(self.base_url):]
+        path = path[:-len('.json')] if path.endswith('.json') else path
+        path = unquote(path.strip('/'))
+        headers = headers or {}
+        self.requests.append((method, path, dict(params or {})))
+        hook = self.hooks.get((method, path))
+        if hook is not None:
+            hook(json)
+
+        if method == 'GET':
+            value = self.query(path, params or {})
+            extra = {'ETag': self.etag(path)} if headers.get('X-Firebase-ETag') else {}
+            return FakeResponse(200, value, extra)
+        if 'if-match' in headers and headers['if-match'] != self.etag(path):
+            return FakeResponse(412, {'error': 'ETag mismatch'}, {'ETag': self.etag(path)})
+        if method == 'PUT':
+            self.set(path, json)
+            return FakeResponse(200, json)
+        if method == 'PATCH':
+            for key, value in (json or {}).items():
+                self.set(f"{path}/{key}", value)
+            return FakeResponse(200, json)
+        if method == 'POST':
+            key = firebase_client.push_id()
+            self.set(f"{path}/{key}", json)
+            return FakeResponse(200, {'name': key})
+        if method == 'DELETE':
+            self.set(path, None)
+            return FakeResponse(200, None)
+        return FakeResponse(405)
+
+    def query(self, path, params):
+        value = self.get(path)
+        if params.get('orderBy') != '"$key"' or not isinstance(value, dict):
+            return value
+        keys = sorted(value)
+        if 'startAt' in params:
+            start = json.loads(params['startAt'])
+            keys = [k for k in keys if k >= start]  # Inclusive, like RTDB
+        if 'endAt' in params:
+            end = json.loads(params['endAt'])
+            keys = [k for k in keys if k <= end]
+        if 'limitToFirst' in params:
+            keys = keys[:int(params['limitToFirst'])]
+        if 'limitToLast' in params:
+            keys = keys[-int(params['limitToLast']):]
+        return {k: value[k] for k in keys}
+
+    def close(self):
+        pass
+
+
+def serve(monkeypatch, base_url):
+    """Registers a FakeDatabase as the process-wide client for base_url and returns it."""
+    db = FakeDatabase(base_url)
+    client = firebase_client.FirebaseClient(base_url)
+    client.session = db
+    monkeypatch.setitem(firebase_client._clients, base_url, client)
+    return db
+
+
+@pytest.fixture
+def fake_db(monkeypatch, tmp_path):
+    """FakeDatabase registered as the client for BASE_URL, with a history index of its own."""
+    import history_index
+    monkeypatch.setattr(history_index, '_index', history_index.HistoryIndex(str(tmp_path / 'history.sqlite3')))
+    return serve(monkeypatch, BASE_URL)
+
+
+@pytest.fixture
+def system_db(monkeypatch):
+    """FakeDatabase standing in for auth_db's system database, behind a fresh in-process auth cache."""
+    import auth_db
+    import cache_backend
+    monkeypatch.setattr(auth_db, 'AUTH_CACHE', cache_backend.MemoryCache(ttl=auth_db.AUTH_CACHE_TTL))
+    return serve(monkeypatch, auth_db.SYSTEM_DB_URL)
+
+
+@pytest.fixture
+def client(system_db, fake_db):
+    """Flask test client for app.py, with the current factory's database at BASE_URL."""
+    import app
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
+
+
+def login(client, **session_values):
+    """Puts a signed-in session on client (a viewer of the BASE_URL factory unless overridden)."""
+    values = {'user_id': 'u1', 'username': 'ann', 'role': 'viewer', 'factory_id': 'f1', 'factory_url': BASE_URL}
+    values.update(session_values)
+    with client.session_transaction() as sess:
+        sess.update(values)
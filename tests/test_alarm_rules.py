@@ -0,0 +1,117 @@
+import pytest
+
+import alarm_rules
+
+
+class LegacyChecks:
+    """The tracker's hard-coded sensor checks before alarm_rules, for comparison."""
+
+    def __init__(self):
+        self.status = {'tank': 'NORMAL', 'diesel': 'NORMAL', 'battery': 'NORMAL', 'pressure': 'NORMAL'}
+
+    def run(self, data):
+        events = []
+
+        def change(name, critical, alarm, clear):
+            current = 'CRITICAL' if critical else 'NORMAL'
+            if self.status[name] != current:
+                events.append(alarm if critical else clear)
+                self.status[name] = current
+
+        level = float(data.get('waterLevel') or data.get('tank_level') or 0)
+        change('tank', level < 95,
+               ("Water Tank", "ALARM", f"Critical Level Detected: {level}%", {"level": level, "threshold": 95}),
+               ("Water Tank", "STATUS_CHANGE", f"Level Restored to Normal: {level}%", {"level": level, "threshold": 95}))
+
+        level = float(data.get('dieselLevel') or data.get('diesel_level') or 0)
+        change('diesel', level < 95,
+               ("Diesel Tank", "ALARM", f"Critical Level Detected: {level}%", {"level": level}),
+               ("Diesel Tank", "STATUS_CHANGE", f"Level Restored to Normal: {level}%", {"level": level}))
+
+        volts = float(data.get('batteryVolts') or data.get('batteryVoltage') or data.get('battery_voltage') or 0)
+        msg = f"Low Voltage: {volts}V" if volts < 11.8 else f"High Voltage: {volts}V"
+        change('battery', volts < 11.8 or volts > 14.2,
+               ("Battery System", "ALARM", msg, {"voltage": volts}),
+               ("Battery System", "STATUS_CHANGE", f"Voltage Normal: {volts}V", {"voltage": volts}))
+
+        pressure = float(data.get('pressure') or 0)
+        change('pressure', pressure < 4.15,
+               ("System Pressure", "ALARM", f"Low Pressure Detected: {pressure} Bar", {"pressure": pressure}),
+               ("System Pressure", "STATUS_CHANGE", f"Pressure Normal: {pressure} Bar", {"pressure": pressure}))
+        return events
+
+
+NORMAL = {'waterLevel': 100, 'dieselLevel': 100, 'batteryVolts': 13.1, 'pressure': 5.2}
+
+SAMPLES = [
+    NORMAL,
+    dict(NORMAL, waterLevel=80.5),                        # tank alarm
+    dict(NORMAL, waterLevel=80.5),                        # no repeat
+    dict(NORMAL, waterLevel=95),                          # restored exactly at the threshold
+    dict(NORMAL, waterLevel=0, tank_level=99),            # 0 falls through to tank_level
+    dict(NORMAL, waterLevel=0, tank_level=0),             # both zero: critical
+    {'tank_level': '97.5', 'diesel_level': 50, 'batteryVoltage': 15, 'pressure': '4.2'},
+    {'tank_level': 97.5, 'diesel_level': 96, 'battery_voltage': 11.79, 'pressure': 4.14},
+    {},                                                   # nothing reported: everything reads 0
+    dict(NORMAL, batteryVolts=0, batteryVoltage=14.3),    # high voltage via the second field
+    NORMAL,
+    dict(NORMAL, pressure=None, dieselLevel=''),          # None / '' count as missing
+    NORMAL,
+    dict(NORMAL, waterLevel=80.1234567, pressure=4.1234567, batteryVolts=11.7999999),  # printed unrounded
+    dict(NORMAL, waterLevel=96.98765432, pressure=4.15000001, batteryVolts=13.0000004),
+    dict(NORMAL, dieselLevel=1 / 3),
+]
+
+
+def test_default_rules_match_legacy_checks():
+    legacy = LegacyChecks()
+    engine = alarm_rules.RuleEngine(alarm_rules.parse_rules(alarm_rules.DEFAULT_RULES))
+    for i, sample in enumerate(SAMPLES):
+        expected = legacy.run(sample)
+        got = engine.evaluate(i * 10000, sample)
+        assert sorted(got) == sorted(expected), f"sample {i}: {sample}"
+
+
+def test_default_rules_over_columns_match_legacy_checks():
+    legacy = LegacyChecks()
+    expected = [(i * 10000, e) for i, sample in enumerate(SAMPLES) for e in legacy.run(sample)]
+    engine = alarm_rules.RuleEngine(alarm_rules.parse_rules(alarm_rules.DEFAULT_RULES))
+    ts = [i * 10000 for i in range(len(SAMPLES))]
+    columns = {}
+    for rule in engine.rules:
+        column = []
+        for sample in SAMPLES:
+            value = next((float(sample[f]) for f in rule['fields'] if sample.get(f) not in (None, '', 0, '0')), None)
+            column.append(value if value is not None else float('nan'))
+        columns[rule['metric']] = column
+    assert sorted(engine.evaluate_columns(ts, columns)) == sorted(expected)
+
+
+def test_rate_message_and_details_agree():
+    rule = alarm_rules.validate_rule({'id': 'drain', 'metric': 'waterLevel', 'type': 'rate', 'below': -1,
+                                      'alarm_message': 'Draining at {rate}%/min (now {value}%)'})
+    engine = alarm_rules.RuleEngine([rule])
+    engine.evaluate(0, {'waterLevel': 90})
+    [(_, _, message, details)] = engine.evaluate(7000, {'waterLevel': 89.5})
+    assert details == {'rate': -4.286}
+    assert message == 'Draining at -4.286%/min (now 89.5%)'
+
+
+def test_hysteresis_and_min_duration():
+    rule = alarm_rules.validate_rule({'id': 'p', 'metric': 'pressure', 'below': 4, 'hysteresis': 0.5,
+                                      'min_duration': 30, 'details_key': 'pressure'})
+    engine = alarm_rules.RuleEngine([rule])
+    assert engine.evaluate(0, {'pressure': 3}) == []        # breach starts
+    assert engine.evaluate(20000, {'pressure': 3}) == []    # not long enough yet
+    [(source, event_type, _, details)] = engine.evaluate(30000, {'pressure': 3})
+    assert (source, event_type, details) == ('pressure', 'ALARM', {'pressure': 3.0})
+    assert engine.evaluate(40000, {'pressure': 4.2}) == []  # inside the hysteresis band
+    [(_, event_type, _, _)] = engine.evaluate(50000, {'pressure': 4.5})
+    assert event_type == 'STATUS_CHANGE'
+
+
+def test_validate_rule_rejects_bad_definitions():
+    with pytest.raises(ValueError):
+        alarm_rules.validate_rule({'id': 'x', 'metric': 'pressure'})
+    with pytest.raises(ValueError):
+        alarm_rules.validate_rule({'id': 'x', 'metric': 'pressure', 'below': 1, 'details': [1]})
@@ -0,0 +1,48 @@
+import analytics_series
+import firebase_client
+import rollup_store
+import sample_store
+from conftest import BASE_URL
+
+HOUR = 3600000
+
+
+def put_samples(db, start_ms, count, step_ms):
+    for i in range(count):
+        ms = start_ms + i * step_ms
+        db.set(f"live_data/{firebase_client.push_id(ms)}", {'lastUpdated': ms, 'pressure': i})
+
+
+def test_bucket_window_ends_with_the_current_local_bucket():
+    offset = analytics_series.DATA_UTC_OFFSET_MINUTES * 60000
+    now = 1_760_000_000_000
+    start, bucket_ms, count = analytics_series.bucket_window(3600, 86400, now)
+    assert (bucket_ms, count) == (HOUR, 24)
+    assert (start + offset) % HOUR == 0
+    assert start + (count - 1) * bucket_ms <= now < start + count * bucket_ms
+
+
+def test_fetch_entries_pages_through_the_whole_range(fake_db):
+    start = 1_760_000_000_000
+    put_samples(fake_db, start - 10000, 25, 1000)  # 10 before the range, 15 inside
+
+    entries = list(analytics_series.fetch_entries(BASE_URL, start, start + 60000, page_size=4))
+    assert [e['pressure'] for e in entries] == list(range(10, 25))
+    pages = [p for m, path, p in fake_db.requests if m == 'GET' and path == 'live_data']
+    assert len(pages) == 4  # 4 + 4 + 4 + 3
+
+
+def test_raw_fallback_is_not_capped(fake_db, monkeypatch):
+    def unavailable():
+        raise OSError("read-only filesystem")
+    monkeypatch.setattr(rollup_store, 'get_store', unavailable)
+    monkeypatch.setattr(sample_store, 'get_store', unavailable)
+
+    now = 1_760_000_000_000
+    start, _, _ = analytics_series.bucket_window(3600, 3 * 3600, now)
+    put_samples(fake_db, start, 3 * 3600 // 2, 2000)  # one sample every 2 s for 3 hours
+
+    result = analytics_series.build_series(BASE_URL, ['pressure'], '1h', '3h', now)
+    assert sum(result['series']['pressure']['count']) == 5400
+    assert result['series']['pressure']['count'] == [1800, 1800, 1800]
+    assert result['series']['pressure']['min'][1] == 1800
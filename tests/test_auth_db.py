@@ -0,0 +1,61 @@
+import auth_db
+
+
+def user_gets(db):
+    return [path for method, path, _ in db.requests if method == 'GET' and path.startswith('system_metadata/user')]
+
+
+def test_add_user_writes_the_record_and_its_index_entry_together(system_db):
+    assert auth_db.add_user('ann', 'pw', 'admin', factory_id='f1')
+    [(method, path, _)] = [r for r in system_db.requests if r[0] != 'GET']
+    assert (method, path) == ('PATCH', 'system_metadata')
+    user_id = system_db.get('system_metadata/usernames/ann')
+    assert system_db.get(f'system_metadata/users/{user_id}')['username'] == 'ann'
+    assert not auth_db.add_user('ann', 'other', 'viewer')
+
+
+def test_verify_user_reads_one_index_entry_and_one_record(system_db):
+    for i in range(20):
+        auth_db.add_user(f'user{i}', 'pw', 'viewer')
+    auth_db.invalidate_cache()
+    system_db.requests.clear()
+
+    user = auth_db.verify_user('user7', 'pw')
+    assert user['username'] == 'user7'
+    assert user_gets(system_db) == ['system_metadata/usernames/user7', f"system_metadata/users/{user['id']}"]
+    assert auth_db.verify_user('user7', 'wrong') is None
+    assert auth_db.verify_user('nobody', 'pw') is None
+
+
+def test_usernames_that_are_not_valid_keys_are_escaped(system_db):
+    assert auth_db.add_user('j.doe/ops', 'pw', 'viewer')
+    assert system_db.get('system_metadata/usernames/j%2Edoe%2Fops')
+    assert auth_db.verify_user('j.doe/ops', 'pw')['username'] == 'j.doe/ops'
+    assert auth_db.username_key('50%$#[]') == '50%25%24%23%5B%5D'
+
+
+def test_users_from_before_the_index_are_found_and_indexed(system_db):
+    system_db.set('system_metadata/users/old1', {'id': 'old1', 'username': 'legacy',
+                                                 'password_hash': auth_db.hash_password('pw'), 'role': 'admin'})
+    assert auth_db.verify_user('legacy', 'pw')['id'] == 'old1'
+    assert system_db.get('system_metadata/usernames/legacy') == 'old1'
+
+
+def test_get_user_by_id_is_cached_until_asked_for_fresh(system_db):
+    auth_db.add_user('ann', 'pw', 'admin')
+    user_id = system_db.get('system_metadata/usernames/ann')
+    assert auth_db.get_user_by_id(user_id)['role'] == 'admin'
+    system_db.set(f'system_metadata/users/{user_id}/role', 'viewer')
+    assert auth_db.get_user_by_id(user_id)['role'] == 'admin'
+    assert auth_db.get_user_by_id(user_id, fresh=True)['role'] == 'viewer'
+    assert auth_db.get_user_by_id(user_id)['role'] == 'viewer'
+    assert auth_db.get_user_by_id('missing') is None
+
+
+def test_delete_user_drops_the_index_entry(system_db):
+    auth_db.add_user('ann', 'pw', 'admin')
+    user_id = system_db.get('system_metadata/usernames/ann')
+    assert auth_db.delete_user(user_id)
+    assert system_db.get('system_metadata/usernames/ann') is None
+    assert auth_db.verify_user('ann', 'pw') is None
+    assert auth_db.add_user('ann', 'pw', 'viewer')  # The name is free again
@@ -0,0 +1,337 @@
+import os
+import socketserver
+import threading
+import time
+
+import pytest
+
+import cache_backend
+
+
+def start_blocked_load(cache, key, value):
+    """Runs get_or_load(key) in a thread whose loader waits until released."""
+    started, release, result = threading.Event(), threading.Event(), {}
+
+    def loader():
+        started.set()
+        release.wait(5)
+        return value
+
+    thread = threading.Thread(target=lambda: result.update(value=cache.get_or_load(key, loader)))
+    thread.start()
+    assert started.wait(5)
+
+    def finish():
+        release.set()
+        thread.join(5)
+        return result['value']
+    return finish
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return cache_backend.MemoryCache()
+    return cache_backend.SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+
+
+def test_load_overtaken_by_invalidate_is_not_stored(cache):
+    finish = start_blocked_load(cache, 'user:ann', {'role': 'admin'})
+    cache.invalidate('user:ann')  # e.g. the role was changed while the old record was being read
+    assert finish() == {'role': 'admin'}  # The caller still gets what was loaded
+    assert cache.get('user:ann') is None
+    assert cache.get_or_load('user:ann', lambda: {'role': 'viewer'}) == {'role': 'viewer'}
+    assert cache.get('user:ann') == {'role': 'viewer'}
+
+
+def test_full_invalidate_overtakes_loads_too(cache):
+    finish = start_blocked_load(cache, 'user:ann', 1)
+    cache.invalidate()
+    finish()
+    assert cache.get('user:ann') is None
+
+
+def test_invalidating_other_keys_leaves_the_load_alone():
+    cache = cache_backend.MemoryCache()
+    finish = start_blocked_load(cache, 'user:ann', 1)
+    cache.invalidate('user:bob')
+    finish()
+    assert cache.get('user:ann') == 1
+
+
+def test_invalidate_from_another_worker_overtakes_the_load(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a, worker_b = cache_backend.SQLiteCache(path), cache_backend.SQLiteCache(path)
+    finish = start_blocked_load(worker_a, 'user:ann', {'role': 'admin'})
+    worker_b.invalidate('user:ann')
+    assert finish() == {'role': 'admin'}
+    assert worker_a.get('user:ann') is None
+    assert worker_b.get('user:ann') is None
+
+
+def test_concurrent_misses_share_one_load():
+    cache = cache_backend.MemoryCache()
+    calls, release = [], threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'v'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ['v'] * 8
+    assert len(calls) == 1
+
+
+def test_failed_and_empty_loads_are_not_cached():
+    def down():
+        raise RuntimeError('down')
+
+    cache = cache_backend.MemoryCache()
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('k', down)
+    assert cache.get_or_load('k', lambda: None) is None
+    assert cache.get_or_load('k', lambda: 1) == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    cache = cache_backend.MemoryCache(ttl=60, stale_ttl=60)
+    cache.preload({'k': 'old'})  # Stored already due for a refresh
+    started, release = threading.Event(), threading.Event()
+
+    def loader():
+        started.set()
+        release.wait(5)
+        return 'new'
+
+    assert cache.get_or_load('k', loader) == 'old'
+    assert started.wait(5)
+    assert cache.get_or_load('k', lambda: pytest.fail('second refresh')) == 'old'
+    release.set()
+    for _ in range(100):
+        if cache.peek('k')[0] == 'new':
+            break
+        time.sleep(0.01)
+    assert cache.get('k') == 'new'
+    assert cache.stats()['stale_hits'] == 2
+
+# --- bounds and expiry ---
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_backend.time, 'time', clock)
+    return clock
+
+
+def test_ttl_and_stale_window(clock):
+    cache = cache_backend.MemoryCache(ttl=60, stale_ttl=30)
+    cache.set('k', 1)
+    clock.now += 59
+    assert cache.get('k') == 1
+    clock.now += 2
+    assert cache.get('k') is None          # Expired...
+    assert cache.peek('k') == (1, 61)      # ...but still inside the stale window
+    clock.now += 30
+    assert cache.peek('k') is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = cache_backend.MemoryCache(max_entries=3)
+    for key in 'abc':
+        cache.set(key, key)
+    cache.get('a')
+    cache.set('d', 'd')
+    assert [cache.get(k) for k in 'abcd'] == ['a', None, 'c', 'd']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_sqlite_cache_is_bounded_and_shared(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a = cache_backend.SQLiteCache(path, max_entries=3)
+    worker_b = cache_backend.SQLiteCache(path, max_entries=3)
+    assert oct(os.stat(path).st_mode & 0o777) == '0o600'  # Holds password hashes
+
+    for key in 'abc':
+        worker_a.set(key, key)
+        clock.now += cache_backend.LRU_TOUCH_INTERVAL + 1
+    assert worker_b.get('a') == 'a'  # Touches a, so b is now the oldest
+    worker_b.set('d', 'd')
+    assert [worker_a.get(k) for k in 'abcd'] == ['a', None, 'c', 'd']
+    assert worker_b.stats()['evictions'] == 1
+
+
+def test_sqlite_full_invalidate_reaches_every_worker_and_keeps_counters(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a, worker_b = cache_backend.SQLiteCache(path), cache_backend.SQLiteCache(path)
+    worker_a.set('user_1', 1)
+    assert worker_a.incr('perm_rev_1') == 1
+    worker_b.invalidate()
+    assert worker_a.get('user_1') is None
+    assert worker_a.counter('perm_rev_1') == 1
+    assert worker_b.incr('perm_rev_1') == 2
+
+
+def test_prefix_invalidation_is_literal(tmp_path):
+    cache = cache_backend.SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    for key in ('user_1', 'user_10', 'userX1', 'all_users'):
+        cache.set(key, key)
+    cache.invalidate('user_1')
+    assert [cache.get(k) for k in ('user_1', 'user_10', 'userX1', 'all_users')] == [None, None, 'userX1', 'all_users']
+
+
+def test_create_cache_picks_the_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('AUTH_CACHE_BACKEND', 'sqlite')
+    monkeypatch.setenv('AUTH_CACHE_PATH', str(tmp_path / 'auth.sqlite3'))
+    monkeypatch.setenv('AUTH_CACHE_MAX_ENTRIES', '7')
+    cache = cache_backend.create_cache()
+    assert (cache.name, cache.max_entries, cache.path) == ('sqlite', 7, str(tmp_path / 'auth.sqlite3'))
+    assert cache_backend.create_cache('memory').name == 'memory'
+    assert cache_backend.create_cache('redis', url='redis://cache.local:6380/2').port == 6380
+
+
+# --- Redis ---
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Just the RESP commands RedisCache sends, with PX expiry and a key limit."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, max_keys=100):
+        super().__init__(('127.0.0.1', 0), RedisHandler)
+        self.data, self.expires, self.evicted = {}, {}, 0
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.clock = time.time
+
+    def run(self, args):
+        cmd, args = args[0].upper(), args[1:]
+        now = self.clock()
+        for key in [k for k, t in self.expires.items() if t <= now]:
+            self.data.pop(key, None)
+            del self.expires[key]
+        if cmd == b'GET':
+            return self.data.get(args[0])
+        if cmd == b'SET':
+            self.data[args[0]] = args[1]
+            self.data[args[0]] = self.data.pop(args[0])  # Most recent last
+            if len(args) > 3 and args[2].upper() == b'PX':
+                self.expires[args[0]] = now + int(args[3]) / 1000
+            while len(self.data) > self.max_keys:
+                oldest = next(iter(self.data))
+                del self.data[oldest]
+                self.expires.pop(oldest, None)
+                self.evicted += 1
+            return 'OK'
+        if cmd == b'DEL':
+            return sum(self.data.pop(k, None) is not None for k in args)
+        if cmd == b'INCR':
+            self.data[args[0]] = b'%d' % (int(self.data.get(args[0], b'0')) + 1)
+            return int(self.data[args[0]])
+        if cmd == b'SCAN':
+            pattern = args[args.index(b'MATCH') + 1].rstrip(b'*')
+            return [b'0', [k for k in self.data if k.startswith(pattern)]]
+        if cmd == b'INFO':
+            return b'# Stats\r\nevicted_keys:%d\r\n' % self.evicted
+        if cmd == b'SELECT':
+            return 'OK'
+        raise ValueError(f"unsupported command {cmd!r}")
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            with self.server.lock:
+                try:
+                    reply = self.encode(self.server.run(args))
+                except ValueError as e:
+                    reply = f"-ERR {e}\r\n".encode()
+            self.wfile.write(reply)
+
+    def encode(self, value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(self.encode(v) for v in value)
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+@pytest.fixture
+def redis_server():
+    server = FakeRedis(max_keys=5)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def redis_cache(server, **kwargs):
+    return cache_backend.RedisCache(f"redis://127.0.0.1:{server.server_address[1]}/1", **kwargs)
+
+
+def test_redis_cache_round_trip_and_invalidation(redis_server):
+    worker_a, worker_b = redis_cache(redis_server), redis_cache(redis_server)
+    worker_a.set('user_1', {'role': 'admin'})
+    worker_a.set('user_10', 1)
+    worker_a.set('all_users', [1])
+    assert worker_b.get('user_1') == {'role': 'admin'}
+    worker_b.invalidate('user_1')
+    assert (worker_a.get('user_1'), worker_a.get('user_10'), worker_a.get('all_users')) == (None, None, [1])
+
+    assert worker_a.incr('perm_rev_1') == 1
+    worker_b.invalidate()
+    assert worker_a.get('all_users') is None
+    assert worker_b.counter('perm_rev_1') == 1
+
+
+def test_redis_entries_expire_after_the_stale_window(redis_server, clock):
+    redis_server.clock = clock
+    cache = redis_cache(redis_server, ttl=60, stale_ttl=30)
+    cache.set('k', 1)
+    clock.now += 89
+    assert cache.peek('k') == (1, 89)
+    clock.now += 2
+    assert cache.peek('k') is None
+    assert cache.get('k') is None
+
+
+def test_redis_bound_is_the_servers_eviction(redis_server):
+    cache = redis_cache(redis_server)
+    for i in range(8):
+        cache.set(f'k{i}', i)
+    assert cache.get('k0') is None and cache.get('k7') == 7
+    assert cache.stats()['evictions'] == 3
+
+
+def test_unreachable_redis_degrades_to_misses():
+    cache = cache_backend.RedisCache('redis://127.0.0.1:1/0')
+    cache.set('k', 1)
+    assert cache.get('k') is None
+    assert cache.get_or_load('k', lambda: 2) == 2
+    assert cache.counter('rev') is None
@@ -0,0 +1,90 @@
+import os
+import runpy
+import threading
+import time
+
+import pytest
+
+import cache_backend
+import firebase_client
+from conftest import ROOT
+
+
+def test_gather_overlaps_calls_and_keeps_their_order():
+    callers = []
+
+    def slow(value):
+        def call():
+            callers.append(threading.current_thread())
+            time.sleep(0.2)
+            return value
+        return call
+
+    start = time.perf_counter()
+    assert firebase_client.gather(slow(1), slow(2), slow(3)) == [1, 2, 3]
+    assert time.perf_counter() - start < 0.5
+    assert threading.current_thread() in callers  # The last call runs inline
+    assert firebase_client.gather() == []
+
+
+def test_gather_reraises_errors():
+    def down():
+        raise ValueError('down')
+    with pytest.raises(ValueError):
+        firebase_client.gather(down, lambda: 1)
+
+
+class Connection:
+    opened = []
+
+    def __init__(self):
+        self.closed = False
+        Connection.opened.append(self)
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool_caps_open_connections():
+    Connection.opened = []
+    pool = cache_backend.ConnectionPool(Connection, size=3)
+    in_use, peak, lock = set(), [0], threading.Lock()
+
+    def work():
+        for _ in range(20):
+            with pool.connection() as conn:
+                with lock:
+                    in_use.add(conn)
+                    peak[0] = max(peak[0], len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.discard(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert len(Connection.opened) <= 3
+    assert peak[0] <= 3
+
+
+def test_connection_that_raised_is_closed_not_reused():
+    Connection.opened = []
+    pool = cache_backend.ConnectionPool(Connection, size=1)
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError('half-read reply')
+    with pool.connection() as conn:
+        assert conn is Connection.opened[1]
+    assert Connection.opened[0].closed
+
+
+@pytest.mark.parametrize('env,expected', [({}, 'gevent'), ({'GUNICORN_WORKER_CLASS': 'sync'}, 'sync')])
+def test_gunicorn_worker_class(monkeypatch, env, expected):
+    pytest.importorskip('gevent')
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    config = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+    assert config['worker_class'] == expected
@@ -0,0 +1,125 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import exporter
+import firebase_client
+import sample_store
+from conftest import BASE_URL
+
+T0 = 1_760_000_000_000
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+
+
+# --- iter_children ---
+
+def test_iter_children_pages_in_key_order(fake_db):
+    for i in range(10):
+        fake_db.set(f"items/k{i:02d}", i)
+    client = firebase_client.get_client(BASE_URL)
+
+    assert [v for _, v in client.iter_children('items', page_size=3)] == list(range(10))
+    pages = [p for m, path, p in fake_db.requests if path == 'items']
+    # After the first page, startAt repeats the last key (inclusive), so one extra is asked for
+    assert [p['limitToFirst'] for p in pages] == [3, 4, 4, 4]
+    assert [p.get('startAt') for p in pages] == [None, '"k02"', '"k05"', '"k08"']
+
+
+def test_iter_children_bounds_are_inclusive(fake_db):
+    for i in range(10):
+        fake_db.set(f"items/k{i:02d}", i)
+    client = firebase_client.get_client(BASE_URL)
+    assert [k for k, _ in client.iter_children('items', 'k03', 'k07', page_size=2)] == \
+        ['k03', 'k04', 'k05', 'k06', 'k07']
+    assert list(client.iter_children('missing', page_size=2)) == []
+
+
+# --- history CSV ---
+
+def test_history_csv_columns(fake_db):
+    event_key = firebase_client.push_id(T0)
+    cycle_key = firebase_client.push_id(T0 + 1000)
+    fake_db.set(f"history/{event_key}", {
+        'timestamp': T0, 'date_formatted': '2025-10-09 14:23:20', 'pump_name': 'Main',
+        'event_type': 'STATUS_CHANGE', 'message': 'Status changed to ON', 'details': {'from': 'OFF', 'to': 'ON'}})
+    # Run cycles written by older firmware: only start_time + duration
+    fake_db.set(f"history/{cycle_key}", {'pump_name': 'Jockey', 'start_time': T0 + 1000, 'duration_seconds': 42})
+
+    chunks, mimetype, name = exporter.export('history', BASE_URL, None, None)
+    header, event, cycle = read_csv(chunks)
+    assert (mimetype, name) == ('text/csv', 'history_export.csv')
+    assert header == exporter.HISTORY_COLUMNS
+    row = dict(zip(header, event))
+    assert row['key'] == event_key
+    assert row['timestamp'] == str(T0)
+    assert (row['start_time'], row['duration_seconds']) == ('', '')
+    assert json.loads(row['details']) == {'from': 'OFF', 'to': 'ON'}
+    row = dict(zip(header, cycle))
+    assert row['timestamp'] == row['start_time'] == str(T0 + 1000)
+    assert row['date'] == exporter.format_time(T0 + 1000)
+    assert (row['event_type'], row['message'], row['duration_seconds']) == ('RUN_CYCLE', 'Run Duration', '42')
+
+
+# --- live_data ---
+
+def put_live(db, count):
+    for i in range(count):
+        ms = T0 + i * 10000
+        db.set(f"live_data/{firebase_client.push_id(ms)}",
+               {'lastUpdated': ms, 'pressure': 4 + i / 10, 'pumps': {'main': {'status': 'ON' if i % 2 else 'OFF'}}})
+
+
+@pytest.fixture
+def no_sample_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(sample_store, '_store', sample_store.SampleStore(str(tmp_path / 'samples')))
+
+
+def test_live_csv_columns_from_firebase(fake_db, no_sample_store):
+    put_live(fake_db, 5)
+    chunks, _, _ = exporter.export('live_data', BASE_URL, T0, T0 + 60000)
+    header, *rows = read_csv(chunks)
+    assert header == exporter.LIVE_COLUMNS
+    assert len(rows) == 5
+    first = dict(zip(header, rows[0]))
+    assert (first['ts'], first['pressure'], first['main_status'], first['main_mode']) == (str(T0), '4.0', '0', '')
+    assert first['waterLevel'] == ''
+
+
+def test_live_export_reads_the_sample_store_when_it_covers_the_range(fake_db, no_sample_store):
+    store = sample_store.get_store()
+    for i in range(5):
+        ms = T0 + i * 10000
+        store.append(BASE_URL, firebase_client.push_id(ms), {'lastUpdated': ms, 'pressure': 9})
+    store.flush()
+    put_live(fake_db, 5)  # Different values: the store must win
+
+    rows = list(exporter.live_rows(BASE_URL, T0, T0 + 40001))
+    assert [r['pressure'] for r in rows] == [9.0] * 5
+    assert not [r for r in fake_db.requests if r[1] == 'live_data']
+
+
+def test_live_gzip_and_columnar(fake_db, no_sample_store):
+    put_live(fake_db, 3)
+    chunks, mimetype, name = exporter.export('live_data', BASE_URL, T0, T0 + 60000, 'csv', compress=True)
+    assert (mimetype, name) == ('application/gzip', 'live_data_export.csv.gz')
+    assert len(list(csv.reader(io.StringIO(gzip.decompress(b''.join(chunks)).decode())))) == 4
+
+    chunks, _, name = exporter.export('live_data', BASE_URL, T0, T0 + 60000, 'columnar')
+    data = b''.join(chunks)
+    magic, header, body = data.split(b'\n', 2)
+    assert magic == b'EAGLECOL1' and name.endswith('.ecol')
+    assert [c for c, _ in json.loads(header)['columns']] == exporter.LIVE_COLUMNS
+    assert int.from_bytes(body[:4], 'little') == 3
+
+
+def test_export_rejects_bad_options():
+    with pytest.raises(ValueError):
+        exporter.export('history', BASE_URL, None, None, 'columnar')
+    with pytest.raises(ValueError):
+        exporter.export('live_data', BASE_URL, None, None)
@@ -0,0 +1,94 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import firebase_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Minimal RTDB stand-in over real HTTP/1.1, counting TCP connections."""
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    failures = {}  # path -> responses left to fail with 503
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if self.failures.get(path):
+            self.failures[path] -= 1
+            return self.reply(503, {'error': 'busy'})
+        self.reply(200, {'path': path})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.reply(503, {'error': 'busy'})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(firebase_client, 'RETRY_BACKOFF', 0)
+    Handler.connections, Handler.failures = 0, {}
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_reuse_one_keep_alive_connection(server):
+    client = firebase_client.FirebaseClient(server)
+    for i in range(5):
+        assert client.get_json(f"users/u{i}") == {'path': f"/users/u{i}.json"}
+    assert Handler.connections == 1
+    assert client.stats()['GET']['count'] == 5
+    client.close()
+
+
+def test_idempotent_requests_are_retried_but_posts_are_not(server):
+    client = firebase_client.FirebaseClient(server)
+    Handler.failures['/flaky.json'] = 2
+    assert client.get_json('flaky') == {'path': '/flaky.json'}
+    assert client.post('history', {'a': 1}).status_code == 503  # A retried push could duplicate the child
+    stats = client.stats()
+    assert (stats['GET']['errors'], stats['POST']['errors']) == (0, 1)
+    client.close()
+
+
+def test_get_json_returns_none_on_errors(server):
+    client = firebase_client.FirebaseClient(server)
+    Handler.failures['/down.json'] = firebase_client.MAX_RETRIES + 1
+    assert client.get_json('down') is None
+    assert client.stats()['GET']['errors'] == 1
+    client.close()
+
+
+def test_url_building():
+    client = firebase_client.FirebaseClient('https://db.example.test/')
+    assert client.url('') == 'https://db.example.test/.json'
+    assert client.url('/users/u1/') == 'https://db.example.test/users/u1.json'
+
+
+def test_one_client_per_database(monkeypatch):
+    monkeypatch.setattr(firebase_client, '_clients', {})
+    a = firebase_client.get_client('https://db.example.test')
+    assert firebase_client.get_client('https://db.example.test/') is a
+    assert firebase_client.get_client('https://other.example.test') is not a
+    firebase_client.close_all()
+    assert firebase_client._clients == {}
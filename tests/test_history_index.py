@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+import event_writer
+import firebase_client
+import history_index
+from conftest import BASE_URL
+
+MINUTE = 60000
+
+
+@pytest.fixture
+def index(fake_db, tmp_path):
+    return history_index.HistoryIndex(str(tmp_path / 'index.sqlite3'))
+
+
+def event(ms, pump='Main', event_type='STATUS_CHANGE', message='Status changed to ON'):
+    return {'timestamp': ms, 'date_formatted': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ms / 1000)),
+            'pump_name': pump, 'event_type': event_type, 'message': message}
+
+
+def seed(db):
+    now = int(time.time() * 1000) - 60 * MINUTE
+    records = [
+        event(now, 'Main'),
+        event(now + MINUTE, 'Jockey', 'MODE_CHANGE', 'Mode changed to MANUAL'),
+        event(now + 2 * MINUTE, 'System Pressure', 'ALARM', 'Low Pressure Detected: 3.9 Bar'),
+        event(now + 3 * MINUTE, 'Main', message='Status changed to OFF'),
+        event(now + 4 * MINUTE, 'Water Tank', 'ALARM', 'Critical Level Detected: 80.0%'),
+        {'pump_name': 'Jockey', 'start_time': now + 5 * MINUTE, 'duration_seconds': 30},  # Old run cycle
+        event(now + 6 * MINUTE, 'Diesel', 'ALARM', 'Engine fault'),
+    ]
+    keys = []
+    for record in records:
+        keys.append(firebase_client.push_id(record.get('timestamp') or record['start_time']))
+        db.set(f"history/{keys[-1]}", record)
+    return keys
+
+
+def all_pages(fetch, **filters):
+    pages, cursor = [], None
+    while True:
+        page = fetch(BASE_URL, before=cursor, limit=3, **filters)
+        pages.append([e['key'] for e in page['events']])
+        cursor = page['next']
+        if cursor is None:
+            return pages
+
+
+def test_sync_then_cursor_pages_newest_first(fake_db, index):
+    keys = seed(fake_db)
+    assert index.sync(BASE_URL, force=True) == 7
+    assert index.ready(BASE_URL)
+    assert all_pages(index.query) == [keys[6:3:-1], keys[3:0:-1], keys[:1]]
+    assert index.sync(BASE_URL, force=True) == 0  # Nothing new
+
+
+@pytest.mark.parametrize('filters,expected', [
+    ({'event_type': 'ALARM'}, [6, 4, 2]),
+    ({'event_type': 'STATUS'}, [3, 1, 0]),
+    ({'event_type': 'SYSTEM'}, [5, 4, 2]),
+    ({'pump': 'jockey'}, [5, 1]),
+    ({'q': 'pressure'}, [2]),
+    ({'q': 'status changed'}, [3, 0]),
+])
+def test_filters_match_the_firebase_fallback(fake_db, index, monkeypatch, filters, expected):
+    monkeypatch.setattr(history_index, 'SYNC_PAGE_SIZE', 2)
+    keys = seed(fake_db)
+    index.sync(BASE_URL, force=True)
+    flat = [k for page in all_pages(index.query, **filters) for k in page]
+    assert flat == [keys[i] for i in expected]
+    fallback = [k for page in all_pages(history_index.firebase_page, **filters) for k in page]
+    assert fallback == flat
+
+
+def test_budgeted_backfill_resumes(fake_db, index, monkeypatch):
+    monkeypatch.setattr(history_index, 'SYNC_PAGE_SIZE', 2)
+    seed(fake_db)
+    assert index.sync(BASE_URL, force=True, budget=0) == 2
+    assert not index.ready(BASE_URL)
+    while not index.ready(BASE_URL):
+        index.sync(BASE_URL, force=True, budget=0)
+    assert len(index.query(BASE_URL, limit=50)['events']) == 7
+
+
+def test_back_dated_event_written_after_backfill_is_synced(fake_db, index, tmp_path):
+    seed(fake_db)
+    index.sync(BASE_URL, force=True)
+    assert index.ready(BASE_URL)
+
+    # A catch-up / cron tick logs an event stamped three days ago
+    old_ms = int(time.time() * 1000) - 3 * 86400000
+    writer = event_writer.EventWriter(journal_dir=str(tmp_path / 'journal'))
+    key = writer.enqueue(BASE_URL, event(old_ms, 'Main', message='Status changed to ON (caught up)'))
+    writer.flush()
+    assert abs(firebase_client.push_id_time(key) - time.time() * 1000) < 60000  # Keyed by write time
+
+    assert index.sync(BASE_URL, force=True) == 1
+    events = index.query(BASE_URL, limit=50)['events']
+    assert events[-1]['key'] == key  # Still ordered by its own (event) time
+    assert events[-1]['timestamp'] == old_ms
+
+
+def test_purge_marker_reaches_other_indexes(fake_db, index, tmp_path):
+    keys = seed(fake_db)
+    index.sync(BASE_URL, force=True)
+    cutoff = firebase_client.push_id_time(keys[3])
+    # Another instance purged Firebase and left the marker
+    for key in keys[:3]:
+        fake_db.set(f"history/{key}", None)
+    fake_db.set(history_index.PURGE_MARKER_PATH, {'generation': 'g1', 'before': cutoff})
+    index.sync(BASE_URL, force=True)
+    assert [e['key'] for e in index.query(BASE_URL, limit=50)['events']] == keys[:2:-1]
+
+
+def test_bad_cursor_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.query(BASE_URL, before='not-a-cursor')
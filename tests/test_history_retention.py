@@ -0,0 +1,61 @@
+import time
+
+import firebase_client
+import history_index
+import history_retention
+from conftest import BASE_URL
+
+DAY = 86400000
+
+
+def seed(db, ages_days):
+    """history records aged ages_days (negative: dated in the future). Returns their keys."""
+    now = int(time.time() * 1000)
+    keys = []
+    for age in ages_days:
+        ms = now - int(age * DAY)
+        key = firebase_client.push_id(ms)
+        db.set(f"history/{key}", {'timestamp': ms, 'pump_name': 'Main', 'event_type': 'ALARM', 'message': f'{age}d'})
+        keys.append(key)
+    return keys
+
+
+def test_purge_before_deletes_only_older_records(fake_db, monkeypatch):
+    monkeypatch.setattr(history_retention, 'DELETE_CHUNK_SIZE', 4)
+    seed(fake_db, [40] * 10 + [20] * 3)
+    fake_db.set('history/manual_entry', {'message': 'not a push ID'})
+
+    pages = []
+    cutoff = int(time.time() * 1000) - 30 * DAY
+    deleted = history_retention.purge(BASE_URL, cutoff, progress=lambda d, p: pages.append((d, p)))
+    assert deleted == 10
+    assert pages == [(10, 1)]
+    assert sorted(r['message'] for r in fake_db.get('history').values()) == ['20d', '20d', '20d', 'not a push ID']
+    patches = [r for r in fake_db.requests if r[0] == 'PATCH']
+    assert len(patches) == 3  # 4 + 4 + 2
+    assert fake_db.get(history_index.PURGE_MARKER_PATH)['before'] == cutoff
+
+
+def test_clear_all_removes_non_push_and_future_keys(fake_db):
+    seed(fake_db, [3, 1, -365])  # The last one is dated a year ahead
+    fake_db.set('history/manual_entry', {'message': 'not a push ID'})
+    fake_db.set('history/0001', {'message': 'numeric key'})
+
+    assert history_retention.purge(BASE_URL) == 5
+    assert fake_db.get('history') in (None, {})
+    assert fake_db.get(history_index.PURGE_MARKER_PATH)['all'] is True
+
+
+def test_clear_all_resets_the_local_index(fake_db):
+    seed(fake_db, [2, 1, -30])
+    index = history_index.get_index()
+    index.sync(BASE_URL, force=True)
+    assert index.ready(BASE_URL)
+    assert len(index.query(BASE_URL)['events']) == 3
+
+    history_retention.purge(BASE_URL)
+    assert index.query(BASE_URL)['events'] == []
+    assert not index.ready(BASE_URL)  # Backfills again from what is left
+    index.sync(BASE_URL, force=True)
+    assert index.ready(BASE_URL)
+    assert index.query(BASE_URL)['events'] == []
@@ -0,0 +1,141 @@
+import json
+import time
+
+import firebase_client
+from history_tracker import CHECKPOINT_PATH, FactoryTracker
+from conftest import BASE_URL
+
+
+def sample(ms, main='OFF'):
+    # Every sensor in range, so only the pump produces events
+    return {'lastUpdated': ms, 'waterLevel': 100, 'dieselLevel': 100, 'batteryVolts': 13, 'pressure': 5,
+            'pumps': {'main': {'status': main, 'mode': 'AUTO'}}}
+
+
+def live_data(db, count, start_ms=None, step_ms=5000):
+    """count samples keyed by push IDs, oldest first. Returns the keys."""
+    start_ms = start_ms if start_ms is not None else int(time.time() * 1000) - count * step_ms
+    keys = []
+    for i in range(count):
+        ms = start_ms + i * step_ms
+        key = firebase_client.push_id(ms)
+        db.set(f"live_data/{key}", sample(ms, 'ON' if i % 2 else 'OFF'))
+        keys.append(key)
+    return keys
+
+
+def tracker():
+    return FactoryTracker('f1', BASE_URL, 'Factory 1')
+
+
+def test_catch_up_without_checkpoint_is_a_first_run(fake_db):
+    live_data(fake_db, 3)
+    t = tracker()
+    assert t.catch_up() is None
+    assert t.last_key is None
+
+
+def test_catch_up_resumes_after_checkpointed_key(fake_db, monkeypatch):
+    monkeypatch.setattr('history_tracker.CATCHUP_PAGE_SIZE', 4)
+    keys = live_data(fake_db, 10)
+    fake_db.set(CHECKPOINT_PATH, {'key': keys[2], 'pumps': {'main': {'status': 'OFF', 'mode': 'AUTO'}}})
+
+    t = tracker()
+    # startAt is inclusive: keys[2] comes back on the first page and is skipped
+    assert t.catch_up() == 7
+    assert t.last_key == keys[-1]
+    assert fake_db.get(CHECKPOINT_PATH)['key'] == keys[-1]
+    # keys[3..9] alternate ON/OFF starting ON: one status change per sample
+    history = fake_db.get('history') or {}
+    assert len(history) == 7
+
+
+def test_catch_up_stops_at_deadline_and_checkpoints(fake_db):
+    keys = live_data(fake_db, 5)
+    fake_db.set(CHECKPOINT_PATH, {'key': keys[0]})
+
+    t = tracker()
+    assert t.catch_up(deadline=0) == 1
+    assert t.behind
+    assert fake_db.get(CHECKPOINT_PATH)['key'] == keys[1]
+    assert t.catch_up() == 3
+    assert not t.behind
+
+
+def test_checkpoint_at_non_push_id_key_is_ignored(fake_db):
+    fake_db.set(CHECKPOINT_PATH, {'key': 'legacy', 'pumps': {'main': {'status': 'ON'}}})
+
+    t = tracker()
+    assert t.catch_up() is None  # Normal start instead of a TypeError
+    assert t.last_key is None
+    assert t.previous_states == {}
+
+
+def test_process_non_push_id_key_skips_lag(fake_db):
+    t = tracker()
+    t.process('legacy', sample(int(time.time() * 1000)))
+    assert t.last_key == 'legacy'
+    assert t.lag_ms is None
+    assert t.catch_up() is None
+
+
+def test_checkpoint_put_runs_outside_process_lock(fake_db):
+    keys = live_data(fake_db, 2)
+    t = tracker()
+    held = []
+    fake_db.hooks[('PUT', CHECKPOINT_PATH)] = lambda body: held.append(t._process_lock.locked())
+
+    t.process(keys[0], fake_db.get(f"live_data/{keys[0]}"))
+    t.save_checkpoint(force=True)
+    assert held == [False, False]
+    assert fake_db.get(CHECKPOINT_PATH)['key'] == keys[0]
+
+
+def messages(db):
+    return sorted(e['message'] for e in (db.get('history') or {}).values())
+
+
+def test_restart_restores_pump_and_alarm_state(fake_db):
+    now = int(time.time() * 1000) - 60000
+    first = tracker()
+    k1, k2 = firebase_client.push_id(now), firebase_client.push_id(now + 5000)
+    first.process(k1, sample(now, 'ON'))
+    first.process(k2, dict(sample(now + 5000, 'ON'), pressure=3.5))  # Alarm raised
+    first.save_checkpoint(force=True)
+    assert messages(fake_db) == ['Low Pressure Detected: 3.5 Bar']
+
+    # Still breached and still running after the restart: nothing new to log
+    k3 = firebase_client.push_id(now + 10000)
+    fake_db.set(f"live_data/{k3}", dict(sample(now + 10000, 'ON'), pressure=3.4))
+    second = tracker()
+    assert second.catch_up() == 1
+    assert second.previous_states == {'main': {'status': 'ON', 'mode': 'AUTO'}}
+    assert second.rules.active() == ['pressure_low']
+    assert messages(fake_db) == ['Low Pressure Detected: 3.5 Bar']
+
+    second.process(firebase_client.push_id(now + 15000), sample(now + 15000, 'ON'))
+    assert messages(fake_db) == ['Low Pressure Detected: 3.5 Bar', 'Pressure Normal: 5.0 Bar']
+
+
+def test_caught_up_events_carry_the_sample_time(fake_db):
+    start = int(time.time() * 1000) - 3600000  # An hour of downtime
+    keys = live_data(fake_db, 4, start_ms=start, step_ms=600000)
+    fake_db.set(CHECKPOINT_PATH, {'key': keys[0], 'pumps': {'main': {'status': 'OFF', 'mode': 'AUTO'}}})
+    tracker().catch_up()
+    stamps = sorted(e['timestamp'] for e in fake_db.get('history').values())
+    assert stamps == [start + i * 600000 for i in (1, 2, 3)]
+
+
+def test_gaps_longer_than_the_limit_are_skipped(fake_db, monkeypatch):
+    monkeypatch.setattr('history_tracker.CATCHUP_MAX_DAYS', 1)
+    day = 86400000
+    now = int(time.time() * 1000)
+    old = live_data(fake_db, 3, start_ms=now - 3 * day, step_ms=60000)
+    recent = live_data(fake_db, 2, start_ms=now - 60000, step_ms=5000)
+    fake_db.set(CHECKPOINT_PATH, {'key': old[0]})
+
+    t = tracker()
+    assert t.catch_up() == 2
+    assert t.last_key == recent[-1]
+    live_reads = [p for m, path, p in fake_db.requests if path == 'live_data']
+    assert live_reads[0]['startAt'] > json.dumps(old[-1])  # Paged from a day ago, not from the checkpoint
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+import cache_backend
+import firebase_client
+import live_snapshot
+from conftest import BASE_URL, FakeResponse, login
+
+
+@pytest.fixture(autouse=True)
+def live_cache(monkeypatch):
+    monkeypatch.setattr(live_snapshot, 'LIVE_CACHE', cache_backend.MemoryCache(ttl=60, max_entries=8))
+
+
+def reads(db):
+    return [r for r in db.requests if r[:2] == ('GET', 'live_data')]
+
+
+def test_clients_of_a_factory_share_one_read(fake_db):
+    key = firebase_client.push_id()
+    fake_db.set(f'live_data/{key}', {'pressure': 5})
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(live_snapshot.get_latest(BASE_URL))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert {(s.key, s.body) for s in results} == {(key, '{"pressure": 5}')}
+    assert len(reads(fake_db)) == 1
+    assert reads(fake_db)[0][2] == {'orderBy': '"$key"', 'limitToLast': 1}
+
+
+def test_publish_primes_newer_samples_only(fake_db):
+    old, new = firebase_client.push_id(1000), firebase_client.push_id(2000)
+    live_snapshot.publish(BASE_URL, new, {'pressure': 6})
+    live_snapshot.publish(BASE_URL, old, {'pressure': 1})
+    snapshot = live_snapshot.get_latest(BASE_URL)
+    assert (snapshot.key, snapshot.body) == (new, '{"pressure": 6}')
+    assert reads(fake_db) == []
+
+
+def test_upstream_errors_are_not_cached(fake_db, monkeypatch):
+    healthy = fake_db.request
+    monkeypatch.setattr(fake_db, 'request', lambda method, url, **kw: FakeResponse(503))
+    with pytest.raises(RuntimeError):
+        live_snapshot.get_latest(BASE_URL)
+    monkeypatch.setattr(fake_db, 'request', healthy)
+    assert live_snapshot.get_latest(BASE_URL).body == '{}'
+
+
+def test_api_live_data_revalidates_with_etag(client, fake_db):
+    assert client.get('/api/live_data').status_code == 302  # Signed out
+    login(client)
+    fake_db.set(f'live_data/{firebase_client.push_id()}', {'pressure': 5})
+
+    first = client.get('/api/live_data')
+    assert (first.status_code, first.get_json()) == (200, {'pressure': 5})
+    again = client.get('/api/live_data', headers={'If-None-Match': first.headers['ETag']})
+    assert (again.status_code, again.data) == (304, b'')
+    assert len(reads(fake_db)) == 1
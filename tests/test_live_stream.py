@@ -0,0 +1,86 @@
+import json
+import queue
+
+import pytest
+
+import cache_backend
+import firebase_client
+import live_snapshot
+import live_stream
+from conftest import BASE_URL, login
+
+
+@pytest.fixture
+def upstream(fake_db, monkeypatch):
+    """Scripted upstream for BASE_URL's channel: put (event, payload) pairs on the returned queue."""
+    monkeypatch.setattr(live_snapshot, 'LIVE_CACHE', cache_backend.MemoryCache(ttl=60))
+    monkeypatch.setattr(live_stream, '_channels', {})
+    feed = queue.Queue()
+
+    def stream(path, params=None):
+        while True:
+            yield feed.get()
+    monkeypatch.setattr(firebase_client.get_client(BASE_URL), 'stream', stream)
+    return feed
+
+
+def receive(q):
+    event, data = q.get(timeout=5).split('\n')[:2]
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+def put_sample(feed, key, sample):
+    feed.put(('put', {'path': f'/{key}', 'data': sample}))
+
+
+def test_diff_reports_changed_and_removed_fields():
+    old = {'pressure': 5, 'pumps': {'main': {'status': 'OFF', 'mode': 'AUTO'}}, 'note': 'x'}
+    new = {'pressure': 5, 'pumps': {'main': {'status': 'ON', 'mode': 'AUTO'}}, 'waterLevel': 90}
+    assert live_stream.diff(old, new) == {'pumps': {'main': {'status': 'ON'}}, 'waterLevel': 90, 'note': None}
+
+
+def test_subscribers_get_a_snapshot_then_only_deltas(upstream):
+    channel = live_stream.get_channel(BASE_URL)
+    first = channel.subscribe()
+    k1, k2, k3 = (firebase_client.push_id(ms) for ms in (1000, 2000, 3000))
+    put_sample(upstream, k1, {'pressure': 5, 'waterLevel': 100})
+    assert receive(first) == ('snapshot', {'pressure': 5, 'waterLevel': 100})
+
+    put_sample(upstream, k2, {'pressure': 5, 'waterLevel': 100})  # Nothing changed: nothing sent
+    put_sample(upstream, k3, {'pressure': 4, 'waterLevel': 100})
+    assert receive(first) == ('delta', {'pressure': 4})
+    assert live_snapshot.get_latest(BASE_URL).key == k3  # /api/live_data sees it too
+
+    late = channel.subscribe()
+    assert receive(late) == ('snapshot', {'pressure': 4, 'waterLevel': 100})
+    assert channel.stats()['subscribers'] == 2
+
+
+def test_slow_subscriber_is_resynced_with_a_snapshot(upstream, monkeypatch):
+    monkeypatch.setattr(live_stream, 'SUBSCRIBER_QUEUE_SIZE', 2)
+    channel = live_stream.get_channel(BASE_URL)
+    slow = channel.subscribe()
+    for i in range(4):
+        channel._on_sample(firebase_client.push_id(1000 + i), {'pressure': i})
+    # The third sample overflowed the queue: the backlog was replaced by a full snapshot
+    assert receive(slow) == ('snapshot', {'pressure': 2})
+    assert receive(slow) == ('delta', {'pressure': 3})
+    assert channel.resyncs == 1
+
+
+def test_event_generator_unsubscribes_when_closed(upstream):
+    body = live_stream.events(BASE_URL)
+    assert next(body) == 'retry: 3000\n\n'
+    put_sample(upstream, firebase_client.push_id(), {'pressure': 5})
+    assert next(body).startswith('event: snapshot\n')
+    body.close()  # The client went away
+    assert live_stream.get_channel(BASE_URL).subscriber_count() == 0
+
+
+def test_route_is_off_where_streaming_cannot_work(client, monkeypatch):
+    import app
+    login(client)
+    monkeypatch.setattr(app, 'LIVE_STREAM_ENABLED', False)
+    response = client.get('/api/live_stream')
+    assert response.status_code == 404
+    assert '/api/live_data' in response.get_json()['error']
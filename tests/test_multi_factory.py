@@ -0,0 +1,84 @@
+import time
+
+import pytest
+import requests
+
+import firebase_client
+import history_tracker
+from conftest import serve
+
+URLS = {'f1': 'https://plant-one.firebaseio.test', 'f2': 'https://plant-two.firebaseio.test'}
+
+
+@pytest.fixture
+def factories(system_db, monkeypatch, tmp_path):
+    """Two registered factories, each with its own fake database."""
+    import history_index
+    monkeypatch.setattr(history_index, '_index', history_index.HistoryIndex(str(tmp_path / 'history.sqlite3')))
+    for factory_id, url in URLS.items():
+        system_db.set(f'system_metadata/factories/{factory_id}', {'id': factory_id, 'name': factory_id.upper(), 'firebase_url': url})
+    system_db.set('system_metadata/factories/nourl', {'id': 'nourl', 'name': 'Not set up yet'})
+    return {factory_id: serve(monkeypatch, url) for factory_id, url in URLS.items()}
+
+
+def push_sample(db, main):
+    ms = int(time.time() * 1000)
+    db.set(f'live_data/{firebase_client.push_id(ms)}', {
+        'lastUpdated': ms, 'waterLevel': 100, 'dieselLevel': 100, 'batteryVolts': 13, 'pressure': 5,
+        'pumps': {'main': {'status': main, 'mode': 'AUTO'}}})
+
+
+def test_one_tracker_per_registered_factory(factories):
+    tracker = history_tracker.HistoryTracker(mode='poll')
+    tracker.sync_factories()
+    assert sorted(tracker.factories) == ['f1', 'f2']
+    assert {f.base_url for f in tracker.factories.values()} == set(URLS.values())
+
+
+def test_factories_keep_separate_state_and_history(factories):
+    tracker = history_tracker.HistoryTracker(mode='poll')
+    tracker.sync_factories()
+    push_sample(factories['f1'], 'OFF')
+    push_sample(factories['f2'], 'OFF')
+    for factory in tracker.factories.values():
+        factory.poll()
+    push_sample(factories['f1'], 'ON')  # Only f1's pump starts
+    for factory in tracker.factories.values():
+        factory.poll()
+    tracker.writer.flush()
+
+    [event] = factories['f1'].get('history').values()
+    assert event['message'] == 'Status changed to ON'
+    assert factories['f2'].get('history') is None
+    assert tracker.factories['f2'].previous_states == {'main': {'status': 'OFF', 'mode': 'AUTO'}}
+
+
+def test_sync_follows_deletions_and_url_changes(factories, system_db):
+    tracker = history_tracker.HistoryTracker(mode='poll')
+    tracker.sync_factories()
+    f1 = tracker.factories['f1']
+
+    system_db.set('system_metadata/factories/f2', None)
+    system_db.set('system_metadata/factories/f1/firebase_url', 'https://plant-one-new.firebaseio.test')
+    tracker.sync_factories()
+    assert list(tracker.factories) == ['f1']
+    assert tracker.factories['f1'] is not f1 and not f1.active
+    assert tracker.factories['f1'].base_url == 'https://plant-one-new.firebaseio.test'
+
+
+def test_unreachable_system_db_keeps_current_trackers(factories, system_db):
+    tracker = history_tracker.HistoryTracker(mode='poll')
+    tracker.sync_factories()
+
+    def down(body):
+        raise requests.ConnectionError('system database unreachable')
+    system_db.hooks[('GET', 'system_metadata/factories')] = down
+    tracker.sync_factories()
+    assert sorted(tracker.factories) == ['f1', 'f2']
+
+
+def test_no_registered_factories_watches_the_default_database(system_db):
+    tracker = history_tracker.HistoryTracker(mode='poll')
+    tracker.sync_factories()
+    [factory] = tracker.factories.values()
+    assert (factory.factory_id, factory.base_url) == ('default', history_tracker.FIREBASE_DB_URL)
@@ -0,0 +1,102 @@
+import gzip
+
+import pytest
+from flask import Flask, url_for
+
+import auth_db
+import cache_backend
+import page_cache
+import static_assets
+from conftest import login
+
+
+@pytest.fixture
+def renders(client, monkeypatch):
+    """Templates rendered by page_cache, in order."""
+    monkeypatch.setattr(page_cache, 'PAGE_CACHE', cache_backend.MemoryCache(ttl=600))
+    rendered = []
+    real = page_cache.render_template
+
+    def render(template):
+        rendered.append(template)
+        return real(template)
+    monkeypatch.setattr(page_cache, 'render_template', render)
+    return rendered
+
+
+def test_pages_are_rendered_once_and_revalidated_by_etag(client, renders):
+    login(client)
+    first = client.get('/alarms')
+    assert first.status_code == 200
+    assert client.get('/alarms').data == first.data
+    assert renders == ['alarms.html']
+    again = client.get('/alarms', headers={'If-None-Match': first.headers['ETag']})
+    assert (again.status_code, again.data) == (304, b'')
+
+
+def test_viewers_never_share_a_page(client, renders):
+    login(client, name='Ann')
+    assert b'Ann' in client.get('/alarms').data
+    login(client, name='Bob')
+    assert b'Bob' in client.get('/alarms').data
+    assert renders == ['alarms.html', 'alarms.html']
+
+
+def test_feature_changes_render_the_page_again(client, renders, system_db):
+    system_db.set('system_metadata/factories/f1', {'id': 'f1', 'name': 'Plant', 'features': {'beta_features': False}})
+    login(client)
+    client.get('/alarms')
+    assert auth_db.update_factory_features('f1', {'beta_features': True})
+    client.get('/alarms')
+    assert renders == ['alarms.html', 'alarms.html']
+
+
+def test_unreadable_revision_renders_fresh(client, renders, monkeypatch):
+    monkeypatch.setattr(auth_db, 'feature_revision', lambda factory_id: None)
+    login(client)
+    client.get('/alarms')
+    client.get('/alarms')
+    assert renders == ['alarms.html', 'alarms.html']
+    stats = page_cache.PAGE_CACHE.stats()
+    assert (stats['hits'], stats['misses']) == (0, 0)  # Never consulted
+
+
+# --- static assets ---
+
+@pytest.fixture
+def static_app(tmp_path):
+    folder = tmp_path / 'static'
+    folder.mkdir()
+    (folder / 'app.js').write_text('console.log("eagle");\n' * 200)
+    (folder / 'tiny.css').write_text('a{}')
+    app = Flask(__name__, static_folder=str(folder))
+    static_assets.init_app(app)
+    return app, folder
+
+
+def test_static_urls_carry_a_content_hash(static_app):
+    app, folder = static_app
+    with app.test_request_context():
+        first = url_for('static', filename='app.js')
+        (folder / 'app.js').write_text('changed')
+        static_assets._hashes.clear()
+        assert url_for('static', filename='app.js') != first
+        assert first.startswith('/static/app.js?v=')
+
+
+def test_versioned_assets_are_immutable_and_precompressed(static_app):
+    app, folder = static_app
+    assert static_assets.precompress(str(folder)) == (1, 0)  # tiny.css is below MIN_COMPRESS_SIZE
+    client = app.test_client()
+    with app.test_request_context():
+        url = url_for('static', filename='app.js')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == (folder / 'app.js').read_bytes()
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    stale = client.get('/static/app.js?v=old')
+    assert 'immutable' not in stale.headers.get('Cache-Control', '')
+    assert 'Content-Encoding' not in stale.headers
@@ -0,0 +1,38 @@
+import firebase_client
+from firebase_client import push_id, push_id_prefix, push_id_time
+
+
+def test_push_ids_sort_by_time():
+    times = [0, 1, 63, 64, 1_700_000_000_000, 1_700_000_000_001, 1_760_000_000_000]
+    keys = [push_id(ms) for ms in times]
+    assert keys == sorted(keys)
+    assert all(len(k) == 20 for k in keys)
+
+
+def test_same_millisecond_ids_stay_ordered_and_unique():
+    keys = [push_id(1_760_000_000_000) for _ in range(500)]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_random_part_carries_when_it_overflows(monkeypatch):
+    monkeypatch.setattr(firebase_client, '_last_rand_chars', [0] + [63] * 11)
+    monkeypatch.setattr(firebase_client, '_last_push_time', 1_760_000_000_000)
+    key = push_id(1_760_000_000_000)
+    assert key[8:] == '0' + '-' * 11
+
+
+def test_push_id_time_round_trips():
+    for ms in (0, 1, 1_700_000_000_123, 1_760_000_000_000):
+        assert push_id_time(push_id(ms)) == ms
+        assert push_id_time(push_id_prefix(ms)) == ms
+
+
+def test_prefix_bounds_keys_by_time():
+    ms = 1_760_000_000_000
+    assert push_id(ms - 1) < push_id_prefix(ms) <= push_id(ms)
+
+
+def test_push_id_time_rejects_non_push_ids():
+    for key in (None, '', 'abc', 'no spaces!', 12345678):
+        assert push_id_time(key) is None
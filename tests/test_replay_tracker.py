@@ -0,0 +1,81 @@
+import gzip
+import json
+import sys
+
+import alarm_rules
+import firebase_client
+import replay_tracker
+from conftest import BASE_URL
+from history_tracker import FactoryTracker
+
+T0 = 1_760_000_000_000
+
+
+def recorded(count):
+    """{key: sample}: the main pump toggles every 3rd sample, pressure dips on the 5th."""
+    samples = {}
+    for i in range(count):
+        ms = T0 + i * 10000
+        samples[firebase_client.push_id(ms)] = {
+            'lastUpdated': ms, 'waterLevel': 100, 'dieselLevel': 100, 'batteryVolts': 13,
+            'pressure': 3.9 if i % 5 == 4 else 5.0,
+            'pumps': {'main': {'status': 'ON' if (i // 3) % 2 else 'OFF', 'mode': 'AUTO'}}}
+    return samples
+
+
+def replay(samples):
+    events = []
+    tracker = FactoryTracker('f1', 'replay', 'Factory 1', sink=events.append,
+                             rules=alarm_rules.parse_rules(alarm_rules.DEFAULT_RULES))
+    for key, sample in samples:
+        tracker.process(key, sample)
+    return events
+
+
+def test_firebase_replay_pages_and_writes_nothing(fake_db, monkeypatch):
+    monkeypatch.setattr(replay_tracker, 'PAGE_SIZE', 7)
+    data = recorded(40)
+    fake_db.set('live_data', data)
+    keys = sorted(data)
+
+    samples = list(replay_tracker.firebase_samples(BASE_URL, keys[5], keys[34]))
+    assert [k for k, _ in samples] == keys[5:35]
+    assert {r[0] for r in fake_db.requests} == {'GET'}
+    assert len(fake_db.requests) == 5  # 7 + 7 + 7 + 7 + 2
+
+    events = replay(samples)
+    assert {(e['pump_name'], e['event_type']) for e in events} == \
+        {('Main', 'STATUS_CHANGE'), ('System pressure', 'ALARM'), ('System pressure', 'STATUS_CHANGE')}
+    # Stamped with the sample's own time, not the time of the replay
+    first_alarm = next(e for e in events if e['event_type'] == 'ALARM')
+    assert first_alarm['timestamp'] == T0 + 9 * 10000
+    assert fake_db.get('history') is None and fake_db.get('tracker_checkpoint') is None
+
+
+def test_dumps_of_every_format_replay_alike(tmp_path):
+    data = recorded(12)
+    keys = sorted(data)
+    (tmp_path / 'export.json').write_text(json.dumps({'settings': {}, 'live_data': data}))
+    with gzip.open(tmp_path / 'live.jsonl.gz', 'wt') as f:
+        for key in keys:
+            f.write(json.dumps({key: data[key]}) + '\n\n')
+
+    expected = [(k, data[k]) for k in keys[2:10]]
+    for name in ('export.json', 'live.jsonl.gz'):
+        assert list(replay_tracker.dump_samples(str(tmp_path / name), keys[2], keys[9])) == expected
+
+
+def test_cli_writes_events_keyed_by_their_time(tmp_path, monkeypatch, capsys):
+    data = recorded(12)
+    (tmp_path / 'live.json').write_text(json.dumps(data))
+    out = tmp_path / 'events.jsonl'
+    monkeypatch.setattr(sys, 'argv', ['replay_tracker.py', '--dump', str(tmp_path / 'live.json'), '--out', str(out)])
+    replay_tracker.main()
+
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    expected = replay(sorted(data.items()))
+    assert [record for line in lines for record in line.values()] == expected
+    for line in lines:
+        [(key, record)] = line.items()
+        assert firebase_client.push_id_time(key) == record['timestamp']
+    assert "12 samples" in capsys.readouterr().out
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+import analytics_series
+import firebase_client
+import sample_store
+
+T0 = 1_760_000_000_000
+FACTORY = 'https://plant.firebaseio.test'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return sample_store.SampleStore(str(tmp_path / 'samples'))
+
+
+def entry(ms, pressure=5.0, main='ON'):
+    return {'lastUpdated': ms, 'pressure': pressure, 'waterLevel': 90.5,
+            'pumps': {'main': {'status': main, 'mode': 'MANUAL'}}}
+
+
+def append_all(store, samples):
+    for ms, e in samples:
+        store.append(FACTORY, firebase_client.push_id(ms), e)
+
+
+def test_rows_round_trip_with_missing_values(store):
+    store.append(FACTORY, firebase_client.push_id(T0), entry(T0))
+    store.append(FACTORY, firebase_client.push_id(T0 + 1000), {'lastUpdated': T0 + 1000})
+    store.flush()
+    first, second = store.rows(FACTORY, T0, T0 + 2000, ['pressure', 'waterLevel', 'main_status', 'main_mode', 'jockey_status'])
+    assert first == {'ts': T0, 'pressure': 5.0, 'waterLevel': 90.5, 'main_status': 1, 'main_mode': 0, 'jockey_status': None}
+    assert second == {'ts': T0 + 1000, 'pressure': None, 'waterLevel': None, 'main_status': None,
+                      'main_mode': None, 'jockey_status': None}
+
+
+def test_each_key_is_stored_once(store):
+    key = firebase_client.push_id(T0)
+    assert store.append(FACTORY, key, entry(T0))
+    assert not store.append(FACTORY, key, entry(T0))
+    assert not store.append(FACTORY, firebase_client.push_id(T0 - 1), entry(T0 - 1))
+    store.flush()
+    assert len(list(store.rows(FACTORY, 0, T0 * 2))) == 1
+
+
+def test_rows_past_the_saved_index_are_replaced_after_a_crash(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(sample_store, 'INDEX_FLUSH_ROWS', 1000)
+    keys = [firebase_client.push_id(T0 + i * 1000) for i in range(5)]
+    for i, key in enumerate(keys[:3]):
+        store.append(FACTORY, key, entry(T0 + i * 1000, pressure=i))
+    store.flush()
+    for i, key in enumerate(keys[3:], 3):
+        store.append(FACTORY, key, entry(T0 + i * 1000, pressure=i))
+    for f in store._writers[FACTORY][1].values():
+        f.flush()  # On disk, but the index was never saved: the process dies here
+
+    reopened = sample_store.SampleStore(str(tmp_path / 'samples'))
+    assert reopened.index(FACTORY)['last_key'] == keys[2]
+    assert sum(d['rows'] for d in reopened.index(FACTORY)['days'].values()) == 3
+    for i, key in enumerate(keys[3:], 3):  # Ingested again from live_data
+        assert reopened.append(FACTORY, key, entry(T0 + i * 1000, pressure=i))
+    reopened.flush()
+    assert [r['pressure'] for r in reopened.rows(FACTORY, 0, T0 * 2, ['pressure'])] == [0, 1, 2, 3, 4]
+
+
+def test_series_matches_aggregating_the_raw_samples(store):
+    rng = random.Random(3)
+    samples = []
+    for i in range(3000):
+        ms = T0 + i * 60000  # Two days of minute samples, across a day boundary
+        e = {'lastUpdated': ms, 'pressure': round(rng.uniform(3, 6), 2)}
+        if i % 7:
+            e['waterLevel'] = rng.randrange(80, 101)
+        samples.append((ms, e))
+    append_all(store, samples)
+    store.flush()
+    assert len(store.index(FACTORY)['days']) >= 2
+
+    metrics = ['pressure', 'waterLevel']
+    start, bucket, count = T0 + 1800000, 3600000, 40
+    assert store.series(FACTORY, metrics, start, bucket, count) == \
+        analytics_series.aggregate([e for _, e in samples], metrics, start, bucket, count)
+
+
+def test_prune_and_coverage(store):
+    day = 86400000
+    append_all(store, [(T0 + i * day, entry(T0 + i * day)) for i in range(5)])
+    store.flush()
+    assert store.covers(FACTORY, T0, T0 + 4 * day, now_ms=T0 + 4 * day)
+    assert not store.covers(FACTORY, T0 - day, T0 + day)
+    assert not store.covers(FACTORY, T0, T0 + 10 * day, now_ms=T0 + 10 * day)  # Stopped receiving samples
+
+    assert store.prune(FACTORY, keep_days=2, now_ms=T0 + 4 * day) == 2
+    assert [r['ts'] for r in store.rows(FACTORY, 0, T0 * 2)] == [T0 + i * day for i in range(2, 5)]
+
+
+def test_another_process_sees_saved_samples(store, tmp_path):
+    reader = sample_store.SampleStore(str(tmp_path / 'samples'))
+    assert list(reader.rows(FACTORY, 0, T0 * 2)) == []
+    append_all(store, [(T0, entry(T0))])
+    store.flush()
+    assert [r['ts'] for r in reader.rows(FACTORY, 0, T0 * 2)] == [T0]
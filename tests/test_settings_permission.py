@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import auth_db
+import cache_backend
+from conftest import login
+
+
+@pytest.fixture
+def shared_cache(system_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(auth_db, 'AUTH_CACHE', cache_backend.SQLiteCache(str(tmp_path / 'auth.sqlite3')))
+
+
+@pytest.fixture
+def operator(system_db):
+    """A viewer with permanent settings access."""
+    auth_db.add_user('op', 'pw', 'viewer', factory_id='f1', can_access_settings=True)
+    return system_db.get('system_metadata/usernames/op')
+
+
+def sign_in(client, user_id):
+    login(client, user_id=user_id, username='op', can_access_settings=True,
+          settings_unlock_expiry=0, perm_rev=auth_db.permission_revision(user_id))
+
+
+def user_reads(db, user_id):
+    return len([r for r in db.requests if r[:2] == ('GET', f'system_metadata/users/{user_id}')])
+
+
+def allowed(client):
+    body = client.get('/settings').data
+    assert (b'id="manualPinInput"' in body) != (b'Access Denied' in body)
+    return b'id="manualPinInput"' in body
+
+
+def test_unchanged_revision_needs_no_user_read(client, system_db, shared_cache, operator):
+    sign_in(client, operator)
+    assert allowed(client) and allowed(client)
+    assert user_reads(system_db, operator) == 0
+
+
+def test_revoke_reaches_signed_in_sessions(client, system_db, shared_cache, operator):
+    sign_in(client, operator)
+    assert allowed(client)
+    assert auth_db.update_user_permission(operator, False)
+    assert not allowed(client)
+    assert user_reads(system_db, operator) == 1
+    assert not allowed(client)  # The session caught up with the new revision
+    assert user_reads(system_db, operator) == 1
+
+
+def test_temporary_unlock_reaches_signed_in_sessions(client, system_db, shared_cache):
+    auth_db.add_user('op', 'pw', 'viewer', factory_id='f1')
+    user_id = system_db.get('system_metadata/usernames/op')
+    sign_in(client, user_id)
+    with client.session_transaction() as sess:
+        sess['can_access_settings'] = False
+    assert not allowed(client)
+    assert auth_db.grant_temp_access(user_id, 60)
+    assert allowed(client)
+    with client.session_transaction() as sess:
+        assert sess['settings_unlock_expiry'] > time.time()
+
+
+def test_without_a_shared_cache_every_visit_rereads_the_record(client, system_db, operator):
+    assert auth_db.permission_revision(operator) is None
+    sign_in(client, operator)
+    assert allowed(client)
+    # Revoked by another worker, whose in-process cache invalidation never reaches this one
+    system_db.set(f'system_metadata/users/{operator}/can_access_settings', False)
+    assert not allowed(client)
+    assert user_reads(system_db, operator) == 2
+
+
+def test_admins_keep_access_without_reads(client, system_db, shared_cache):
+    login(client, role='admin', can_access_settings=True)
+    assert allowed(client)
+    assert not [r for r in system_db.requests if r[1].startswith('system_metadata/users')]
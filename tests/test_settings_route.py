@@ -0,0 +1,54 @@
+import time
+
+from flask import session
+
+from conftest import BASE_URL, login
+
+
+def delay_reads(db, paths, seconds):
+    for path in paths:
+        db.hooks[('GET', path)] = lambda body: time.sleep(seconds)
+
+
+def reads(db, path):
+    return len([r for r in db.requests if r[:2] == ('GET', path)])
+
+
+def test_settings_reads_run_concurrently_once_each(client, fake_db):
+    login(client, role='admin', can_access_settings=True)
+    fake_db.set('settings', {'tank_height_cm': 321, 'settings_pin': '123456'})
+    fake_db.set('phone_numbers/p1', {'name': 'Ops', 'number': '+100', 'recipient_type': 'sms'})
+    delay_reads(fake_db, ['settings', 'phone_numbers'], 0.25)
+
+    start = time.perf_counter()
+    response = client.get('/settings')
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert b'321' in response.data and b'+100' in response.data
+    assert elapsed < 0.45  # Both 0.25 s reads overlapped
+    assert (reads(fake_db, 'settings'), reads(fake_db, 'phone_numbers')) == (1, 1)
+
+
+def test_add_number_checks_the_limit_from_the_prefetched_list(client, fake_db):
+    login(client, role='admin', can_access_settings=True)
+    for i in range(4):
+        fake_db.set(f'phone_numbers/p{i}', {'name': f'n{i}', 'number': str(i)})
+    client.post('/settings', data={'action': 'add_number', 'holder_name': 'x', 'new_number': '9', 'recipient_type': 'sms'})
+    assert len(fake_db.get('phone_numbers')) == 4
+    assert reads(fake_db, 'phone_numbers') == 1
+
+    fake_db.set('phone_numbers/p3', None)
+    client.post('/settings', data={'action': 'add_number', 'holder_name': 'x', 'new_number': '9', 'recipient_type': 'sms'})
+    assert sorted(n['number'] for n in fake_db.get('phone_numbers').values()) == ['0', '1', '2', '9']
+
+
+def test_reads_after_a_write_in_the_same_request_are_fresh(client, fake_db):
+    import app
+    fake_db.set('settings', {'settings_pin': '111111'})
+    with app.app.test_request_context():
+        session['factory_url'] = BASE_URL
+        app.fb_prefetch('settings')
+        assert app.fb_get('settings') == {'settings_pin': '111111'}
+        app.fb_update('settings', {'settings_pin': '222222'})
+        assert app.fb_get('settings') == {'settings_pin': '222222'}
+    assert reads(fake_db, 'settings') == 2
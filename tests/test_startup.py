@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import auth_db
+import bench_startup
+from conftest import ROOT
+
+
+@pytest.mark.parametrize('entry', sorted(bench_startup.DEFERRED_MODULES))
+def test_entry_points_leave_feature_modules_unloaded(entry):
+    deferred = bench_startup.DEFERRED_MODULES[entry]
+    code = f"import json, sys, {entry}; print(json.dumps([m for m in {deferred!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, VERCEL='1'), timeout=60)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+@pytest.fixture
+def registry(system_db):
+    system_db.set('system_metadata/factories/f1', {'id': 'f1', 'name': 'Plant One', 'firebase_url': 'https://one.test'})
+    system_db.set('system_metadata/users/u1', {'id': 'u1', 'username': 'ann', 'password_hash': 'secret-hash'})
+    return system_db
+
+
+def test_snapshot_holds_factories_but_no_users(registry, tmp_path):
+    path = str(tmp_path / 'auth_snapshot.json')
+    assert auth_db.write_snapshot(path) == 2  # all_factories + factory_f1
+    text = open(path).read()
+    assert 'Plant One' in text
+    assert 'secret-hash' not in text and 'username' not in text
+
+
+def test_cold_process_answers_from_the_snapshot_then_refreshes(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(auth_db, 'AUTH_CACHE', auth_db.cache_backend.MemoryCache(ttl=300, stale_ttl=300))
+    path = str(tmp_path / 'auth_snapshot.json')
+    auth_db.write_snapshot(path)
+    registry.set('system_metadata/factories/f1/name', 'Plant One (renamed)')
+    registry.requests.clear()
+
+    assert auth_db.load_snapshot(path) == 2
+    assert auth_db.get_factory_by_id('f1')['name'] == 'Plant One'  # Served at once, stale
+    for _ in range(100):
+        if auth_db.get_factory_by_id('f1')['name'] == 'Plant One (renamed)':
+            break
+        time.sleep(0.01)
+    assert auth_db.get_factory_by_id('f1')['name'] == 'Plant One (renamed)'
+    assert [r[1] for r in registry.requests] == ['system_metadata/factories/f1']  # One background load
+
+
+def test_snapshot_for_another_system_database_is_ignored(registry, tmp_path, monkeypatch):
+    path = str(tmp_path / 'auth_snapshot.json')
+    auth_db.write_snapshot(path)
+    monkeypatch.setattr(auth_db, 'SYSTEM_DB_URL', 'https://other-system.test')
+    assert auth_db.load_snapshot(path) == 0
+    assert auth_db.load_snapshot(str(tmp_path / 'missing.json')) == 0
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import firebase_client
+import live_snapshot
+from history_tracker import FactoryTracker
+
+
+def sample(ms, main='OFF'):
+    return {'lastUpdated': ms, 'waterLevel': 100, 'dieselLevel': 100, 'batteryVolts': 13, 'pressure': 5,
+            'pumps': {'main': {'status': main, 'mode': 'AUTO'}}}
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """RTDB REST stand-in: event-stream GETs play server.script, other GETs are null."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.headers.get('Accept') != 'text/event-stream':
+            return self.reply(200, None)
+        self.server.streams.append({k: v[0] for k, v in parse_qs(url.query).items()})
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for chunk in self.server.script.pop(0) if self.server.script else []:
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(0.01)  # Separate reads, so events arrive split across chunks
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.posts.append((urlparse(self.path).path, body))
+        self.reply(200, {'name': firebase_client.push_id()})
+
+    def do_PUT(self):
+        self.reply(200, json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StreamHandler)
+    httpd.script, httpd.streams, httpd.posts = [], [], []
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setitem(firebase_client._clients, httpd.url, firebase_client.FirebaseClient(httpd.url))
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_stream_parses_events_split_across_reads(server):
+    payload = sse('put', {'path': '/', 'data': {'a': 1}}) + b'event: keep-alive\ndata: null\n\n' + \
+        sse('patch', {'path': '/a', 'data': {'b': 2}})
+    server.script.append([payload[i:i + 7] for i in range(0, len(payload), 7)])
+
+    events = []
+    with pytest.raises(ConnectionError):
+        for event in firebase_client.get_client(server.url).stream('live_data', params={'orderBy': '"$key"'}):
+            events.append(event)
+    assert events == [('put', {'path': '/', 'data': {'a': 1}}), ('keep-alive', None),
+                      ('patch', {'path': '/a', 'data': {'b': 2}})]
+    assert server.streams == [{'orderBy': '"$key"'}]
+
+
+def test_stream_samples_applies_puts_and_patches():
+    k1, k2 = firebase_client.push_id(1000), firebase_client.push_id(2000)
+    s1 = sample(1000)
+    assert live_snapshot.stream_samples('put', {'path': '/', 'data': {k2: sample(2000), k1: s1}}, None, None) == \
+        [(k1, s1), (k2, sample(2000))]
+    assert live_snapshot.stream_samples('put', {'path': '/', 'data': {k1: s1}}, k1, s1) == []  # Already held
+    assert live_snapshot.stream_samples('patch', {'path': f'/{k1}', 'data': {'pressure': 3}}, k1, s1) == \
+        [(k1, dict(s1, pressure=3))]
+    [(key, nested)] = live_snapshot.stream_samples('put', {'path': f'/{k1}/pumps/main/status', 'data': 'ON'}, k1, s1)
+    assert (key, nested['pumps']['main']['status'], s1['pumps']['main']['status']) == (k1, 'ON', 'OFF')
+    assert live_snapshot.stream_samples('put', {'path': f'/{k2}/pressure', 'data': 1}, k1, s1) == []  # Unknown sample
+
+
+def test_tracker_follows_the_stream_and_resumes_after_a_drop(server, monkeypatch):
+    monkeypatch.setattr(FactoryTracker, '_sleep', lambda self, seconds: None)
+    now = int(time.time() * 1000)
+    k1, k2 = firebase_client.push_id(now - 2000), firebase_client.push_id(now - 1000)
+    server.script.append([sse('put', {'path': '/', 'data': {k1: sample(now - 2000)}}),
+                          sse('put', {'path': f'/{k2}', 'data': sample(now - 1000, 'ON')})])
+    server.script.append([sse('put', {'path': f'/{k2}/pumps/main/status', 'data': 'OFF'})])
+
+    tracker = FactoryTracker('f1', server.url, 'Factory 1')
+    tracker.start_stream()
+    for _ in range(200):
+        if len(server.streams) >= 3:
+            break
+        time.sleep(0.01)
+    tracker.active = False
+
+    assert server.streams[0] == {'orderBy': '"$key"', 'limitToLast': '1'}
+    assert server.streams[1] == {'orderBy': '"$key"', 'startAt': json.dumps(k2)}  # Reconnects where it stopped
+    assert [body['message'] for path, body in server.posts if path == '/history.json'] == \
+        ['Status changed to ON', 'Status changed to OFF']
+    assert tracker.last_key == k2
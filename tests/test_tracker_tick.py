@@ -0,0 +1,78 @@
+import time
+
+import firebase_client
+import tracker_tick
+from conftest import BASE_URL
+from history_tracker import CHECKPOINT_PATH
+from tracker_tick import LEASE_PATH, acquire_lease, release_lease
+
+FACTORY = {'id': 'f1', 'name': 'Factory 1', 'firebase_url': BASE_URL}
+
+
+def client():
+    return firebase_client.get_client(BASE_URL)
+
+
+def test_lease_excludes_other_owners_until_it_expires(fake_db):
+    assert acquire_lease(client(), 'a', 60)
+    assert not acquire_lease(client(), 'b', 60)
+    assert acquire_lease(client(), 'a', 60)  # The holder may renew
+
+    fake_db.set(LEASE_PATH, {'owner': 'a', 'expires': int(time.time() * 1000) - 1})
+    assert acquire_lease(client(), 'b', 60)
+    assert fake_db.get(LEASE_PATH)['owner'] == 'b'
+
+
+def test_lease_write_conflict_loses(fake_db):
+    # Another tick takes the lease between our read and our conditional write
+    def rival(body):
+        fake_db.set(LEASE_PATH, {'owner': 'rival', 'expires': int(time.time() * 1000) + 60000})
+    fake_db.hooks[('PUT', LEASE_PATH)] = rival
+
+    assert not acquire_lease(client(), 'a', 60)
+    assert fake_db.get(LEASE_PATH)['owner'] == 'rival'
+
+
+def test_release_only_drops_our_own_lease(fake_db):
+    assert acquire_lease(client(), 'a', 60)
+    release_lease(client(), 'b')
+    assert fake_db.get(LEASE_PATH)['owner'] == 'a'
+    release_lease(client(), 'a')
+    assert fake_db.get(LEASE_PATH) is None
+
+
+def test_tick_factory_skips_while_another_tick_holds_the_lease(fake_db):
+    fake_db.set(LEASE_PATH, {'owner': 'other', 'expires': int(time.time() * 1000) + 60000})
+    result = tracker_tick.tick_factory(FACTORY, time.time() + 5, 'me')
+    assert result == {"skipped": "another tick holds the lease"}
+    assert not [r for r in fake_db.requests if r[1] == 'live_data']
+
+
+def test_tick_factory_catches_up_and_releases(fake_db):
+    start = int(time.time() * 1000) - 60000
+    keys = []
+    for i in range(4):
+        ms = start + i * 10000
+        keys.append(firebase_client.push_id(ms))
+        fake_db.set(f"live_data/{keys[-1]}", {'lastUpdated': ms, 'waterLevel': 100, 'dieselLevel': 100,
+                                              'batteryVolts': 13, 'pressure': 5,
+                                              'pumps': {'main': {'status': 'ON' if i % 2 else 'OFF', 'mode': 'AUTO'}}})
+    fake_db.set(CHECKPOINT_PATH, {'key': keys[0], 'pumps': {'main': {'status': 'OFF', 'mode': 'AUTO'}}})
+
+    result = tracker_tick.tick_factory(FACTORY, time.time() + 5, 'me')
+    assert result['samples'] == 3
+    assert result['events'] == 3
+    assert result['caught_up']
+    assert fake_db.get(CHECKPOINT_PATH)['key'] == keys[-1]
+    assert len(fake_db.get('history')) == 3
+    assert fake_db.get(LEASE_PATH) is None
+
+
+def test_handle_requires_the_token(monkeypatch):
+    monkeypatch.delenv('TRACKER_TICK_TOKEN', raising=False)
+    monkeypatch.delenv('CRON_SECRET', raising=False)
+    assert tracker_tick.handle('Bearer x')[0] == 404
+    monkeypatch.setenv('CRON_SECRET', 'secret')
+    assert tracker_tick.handle(None)[0] == 401
+    assert tracker_tick.handle('Bearer wrong')[0] == 401
+    assert tracker_tick.authorized('bearer secret')
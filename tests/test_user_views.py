@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import app
+import auth_db
+from conftest import login
+
+
+def legacy_visible(users, role, user_id):
+    """The /users filtering before the precomputed views."""
+    if role == 'developer':
+        return users
+    if role == 'superadmin':
+        return [u for u in users if u.get('role') != 'developer']
+    if role == 'admin':
+        return [u for u in users if (u.get('created_by') == user_id or u.get('id') == user_id)
+                and u.get('role') != 'developer']
+    return []
+
+
+def make_users(count, seed=7):
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        creator = rng.choice([None] + [u['id'] for u in users[:10]])
+        users.append({'id': f'{rng.randrange(16 ** 8):08x}', 'username': f'user{i}', 'name': f'User {i}',
+                      'role': rng.choice(['developer', 'superadmin', 'admin', 'admin', 'viewer', 'viewer']),
+                      'factory_id': rng.choice(['f1', 'f2', None]), 'created_by': creator})
+    return users
+
+
+@pytest.mark.parametrize('role', ['developer', 'superadmin', 'admin', 'viewer'])
+def test_views_match_the_old_filters(role):
+    users = make_users(300)
+    views = auth_db.build_user_views(users)
+    ordered = sorted(users, key=lambda u: u['id'])
+    for user in ordered[:25]:
+        got = app._visible_user_ids(views, role, user['id'])
+        assert got == [u['id'] for u in legacy_visible(ordered, role, user['id'])]
+
+
+def test_views_index_factory_creator_and_role():
+    users = [{'id': 'b', 'username': 'b', 'role': 'admin', 'factory_id': 'f1'},
+             {'id': 'a', 'username': 'a', 'role': 'viewer', 'factory_id': 'f1', 'created_by': 'b'},
+             {'id': 'c', 'username': 'c', 'role': 'viewer', 'created_by': 'b'},
+             {'username': 'no id'}]
+    views = auth_db.build_user_views(users)
+    assert views['order'] == ['a', 'b', 'c']
+    assert views['by_factory'] == {'f1': ['a', 'b'], '': ['c']}
+    assert views['by_creator'] == {'b': ['a', 'c']}
+    assert views['by_role'] == {'viewer': ['a', 'c'], 'admin': ['b']}
+
+
+def test_users_page_pages_filters_and_searches(client, system_db, monkeypatch):
+    monkeypatch.setattr(app, 'USERS_PER_PAGE', 2)
+    system_db.set('system_metadata/factories/f1', {'id': 'f1', 'name': 'Plant One', 'firebase_url': 'https://x.test'})
+    for i, (role, factory) in enumerate([('viewer', 'f1'), ('viewer', 'f1'), ('admin', None), ('developer', None), ('viewer', 'f1')]):
+        system_db.set(f'system_metadata/users/u{i}', {'id': f'u{i}', 'username': f'person{i}', 'name': f'Person {i}',
+                                                       'role': role, 'factory_id': factory})
+    login(client, user_id='boss', role='superadmin')
+
+    def listed(**args):
+        body = client.get('/users', query_string=args).get_data(as_text=True)
+        return [f'person{i}' for i in range(5) if f'person{i}' in body]
+
+    assert listed() == ['person0', 'person1']
+    assert listed(page=2) == ['person2', 'person4']  # The developer is never listed
+    assert listed(page=9) == ['person2', 'person4']  # Clamped to the last page
+    assert listed(factory='f1', page=2) == ['person4']
+    assert listed(q='PERSON 2') == ['person2']
+
+
+def test_user_writes_rebuild_the_views(system_db):
+    auth_db.add_user('ann', 'pw', 'viewer', factory_id='f1')
+    assert len(auth_db.get_user_views()['order']) == 1
+    auth_db.add_user('bob', 'pw', 'viewer', factory_id='f1')
+    assert len(auth_db.get_user_views()['by_factory']['f1']) == 2
@@ -0,0 +1,144 @@
+"""Stateless history tracking for serverless deployments.
+
+There is no long-running HistoryTracker on Vercel/Lambda, so a cron calls
+/internal/tracker/tick instead. Each tick, for every factory (in parallel):
+
+    1. takes a short lease in the factory's database, so overlapping ticks
+       never process the same samples twice;
+    2. restores the tracker checkpoint (last key + state machine, see
+       FactoryTracker.load_checkpoint);
+    3. runs every live_data sample since then through FactoryTracker.process;
+    4. writes the resulting events with batched multi-child PATCHes and saves
+       the checkpoint, before TICK_BUDGET runs out. A backlog larger than the
+       budget is finished by the following ticks.
+
+Callers authenticate with "Authorization: Bearer <token>", where the token is
+TRACKER_TICK_TOKEN or CRON_SECRET (which Vercel cron sends by itself).
+Without either set the endpoint is disabled.
+
+api/tracker_tick.py serves this as a bare WSGI app that imports only the
+tracker, not the Flask dashboard, so a cold start stays cheap.
+"""
+import hmac
+import json
+import os
+import time
+import uuid
+
+import auth_db
+import event_writer
+import firebase_client
+from history_tracker import FIREBASE_DB_URL, FactoryTracker
+
+# Configuration
+TICK_BUDGET = float(os.environ.get('TRACKER_TICK_BUDGET', 8))  # Seconds; keep under the platform's function timeout
+CLEANUP_MIN_BUDGET = 0.5  # Share of the budget that must be left to run the daily history cleanup
+LEASE_PATH = "tracker_lease"
+
+
+def tick_token():
+    return os.environ.get('TRACKER_TICK_TOKEN') or os.environ.get('CRON_SECRET')
+
+
+def authorized(authorization):
+    """True if the Authorization header carries the configured token."""
+    token = tick_token()
+    if not token or not authorization:
+        return False
+    scheme, _, value = authorization.partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip(), token)
+
+
+def acquire_lease(client, owner, seconds):
+    """Conditional write of {owner, expires}; False while another tick holds it."""
+    lease, etag = client.get_with_etag(LEASE_PATH)
+    now_ms = int(time.time() * 1000)
+    if isinstance(lease, dict) and lease.get('owner') != owner and (lease.get('expires') or 0) > now_ms:
+        return False
+    return client.put_if_match(LEASE_PATH, {"owner": owner, "expires": now_ms + int(seconds * 1000)}, etag)
+
+
+def release_lease(client, owner):
+    lease, etag = client.get_with_etag(LEASE_PATH)
+    if isinstance(lease, dict) and lease.get('owner') == owner:
+        client.put_if_match(LEASE_PATH, None, etag)
+
+
+def tick_factory(factory, deadline, owner):
+    """One factory's share of a tick. Returns its stats."""
+    started = time.time()
+    client = firebase_client.get_client(factory['firebase_url'])
+    # Held a little past the deadline so the final flush/checkpoint is covered too
+    if not acquire_lease(client, owner, deadline - started + 30):
+        return {"skipped": "another tick holds the lease"}
+
+    writer = event_writer.EventWriter()  # Never started: save_checkpoint flushes it synchronously
+    tracker = FactoryTracker(factory['id'], factory['firebase_url'], factory.get('name'), writer=writer)
+    try:
+        processed = tracker.catch_up(deadline)
+        if processed is None:
+            # Never tracked before: start from the newest sample, like the live tracker
+            key, data = tracker._get_latest_live_data()
+            processed = 0
+            if data:
+                tracker.process(key, data)
+                processed = 1
+        tracker.save_checkpoint(force=True)
+
+        remaining = deadline - time.time()
+        if time.time() - tracker.last_cleanup_time > 86400 and remaining > TICK_BUDGET * CLEANUP_MIN_BUDGET:
+            tracker.last_cleanup_time = time.time()
+            tracker._cleanup_old_history()
+            tracker.save_checkpoint(force=True)
+    finally:
+        writer.flush()
+        release_lease(client, owner)
+
+    stats = writer.stats()
+    return {
+        "samples": processed,
+        "events": stats["flushed_events"] + stats["journaled_events"],
+        "lag_seconds": round(tracker.lag_ms / 1000, 1) if tracker.lag_ms is not None else None,
+        "caught_up": not tracker.behind,
+        "elapsed_ms": round((time.time() - started) * 1000, 1)
+    }
+
+
+def tick(budget=TICK_BUDGET):
+    """Runs one tick over every factory. Returns per-factory stats."""
+    started = time.time()
+    deadline = started + budget
+    owner = uuid.uuid4().hex
+
+    factories = [f for f in auth_db.get_factories() if f.get('id') and f.get('firebase_url')]
+    if not factories:
+        factories = [{'id': 'default', 'name': 'Default', 'firebase_url': FIREBASE_DB_URL}]
+
+    futures = {f['id']: (f, firebase_client.submit(tick_factory, f, deadline, owner)) for f in factories}
+    results = {}
+    for factory_id, (factory, future) in futures.items():
+        try:
+            results[factory.get('name') or factory_id] = future.result()
+        except Exception as e:
+            print(f"Tracker tick failed ({factory.get('name') or factory_id}): {e}")
+            results[factory.get('name') or factory_id] = {"error": str(e)}
+    return {"factories": results, "elapsed_ms": round((time.time() - started) * 1000, 1)}
+
+
+def handle(authorization):
+    """(status, JSON body) for a tick request."""
+    if not tick_token():
+        return 404, json.dumps({"error": "Tracker tick is not enabled"})
+    if not authorized(authorization):
+        return 401, json.dumps({"error": "Unauthorized"})
+    return 200, json.dumps(tick())
+
+
+def wsgi_app(environ, start_response):
+    if environ.get('REQUEST_METHOD') not in ('GET', 'POST'):
+        status, body = 405, json.dumps({"error": "Method not allowed"})
+    else:
+        status, body = handle(environ.get('HTTP_AUTHORIZATION'))
+    reasons = {200: 'OK', 401: 'Unauthorized', 404: 'Not Found', 405: 'Method Not Allowed'}
+    start_response(f"{status} {reasons[status]}", [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')])
+    return [body.encode()]